@@ -0,0 +1,62 @@
+"""Compare the CLI's time to first result against grep, cold and with a cached index.
+
+Usage: python -m benchmarks.bench_cli [--size 100MB] [--runs N]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.generate import generate_log, parse_size
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def first_line_time(command, env=None) -> float:
+    """Seconds until the command writes its first line of output."""
+    started = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, cwd=ROOT, env=env)
+    process.stdout.readline()
+    elapsed = time.perf_counter() - started
+    process.kill()
+    process.wait()
+    process.stdout.close()
+    return elapsed
+
+
+def best_of(runs: int, label: str, command, env=None) -> None:
+    best = min(first_line_time(command, env) for _ in range(runs))
+    print(f"{label:<42} {best:8.3f} s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', default='100MB', help="size of the generated log")
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(temp_dir, 'app.log')
+        counts = generate_log(path, parse_size(args.size))
+        print(f"{counts['lines']} lines, {counts['bytes'] / 1e6:.1f} MB")
+        env = dict(os.environ, XDG_CACHE_HOME=os.path.join(temp_dir, 'cache'))
+        cli = [sys.executable, '-m', 'src.cli']
+
+        best_of(args.runs, "python startup", [sys.executable, '-c', 'print()'])
+        best_of(args.runs, "cli --help", cli + ['--help'])
+        if shutil.which('grep'):
+            best_of(args.runs, "grep, first match", ['grep', 'ERROR', path])
+        best_of(args.runs, "cli search, no index cache",
+                cli + ['search', '--no-cache', 'ERROR', path], env)
+        subprocess.run(cli + ['index', path], cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+        best_of(args.runs, "cli search, cached index", cli + ['search', 'ERROR', path], env)
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Compare opening compressed logs directly against decompress-then-open.
+
+Usage: python -m benchmarks.bench_compressed [--size 100MB] [--format gzip|bz2|xz]
+"""
+import argparse
+import bz2
+import gzip
+import lzma
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.generate import generate_log, parse_size
+from src.core.index_cache import IndexCache
+from src.core.log_processor import LogProcessor
+from src.core.result_cache import ResultCache
+
+_COMPRESS = {
+    'gzip': ('.gz', gzip.open, lambda data: gzip.compress(data, 6)),
+    'bz2': ('.bz2', bz2.open, bz2.compress),
+    'xz': ('.xz', lzma.open, lambda data: lzma.compress(data, preset=1)),
+}
+
+
+def timed(label: str, func):
+    started = time.perf_counter()
+    result = func()
+    print(f"{label:<42} {time.perf_counter() - started:8.3f} s")
+    return result
+
+
+def random_reads(processor: LogProcessor, count: int = 1000) -> None:
+    rng = random.Random(1)
+    for _ in range(count):
+        processor.get_line(rng.randrange(processor.total_lines))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', default='100MB', help="size of the generated log")
+    parser.add_argument('--format', choices=sorted(_COMPRESS), default='gzip')
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        suffix, open_compressed, compress = _COMPRESS[args.format]
+        plain_path = os.path.join(temp_dir, 'app.log')
+        packed_path = plain_path + suffix
+        counts = generate_log(plain_path, parse_size(args.size))
+        with open(plain_path, 'rb') as f:
+            data = f.read()
+        with open(packed_path, 'wb') as f:
+            f.write(compress(data))
+        print(f"{counts['lines']} lines, {len(data) / 1e6:.1f} MB, "
+              f"{os.path.getsize(packed_path) / 1e6:.1f} MB {args.format}")
+        del data
+        os.remove(plain_path)
+
+        def decompress_then_open():
+            with open_compressed(packed_path, 'rb') as src, open(plain_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            processor = LogProcessor(index_cache=IndexCache(max_bytes=0), result_cache=ResultCache(0))
+            processor.open_file(plain_path)
+            return processor
+
+        plain = timed("decompress to disk, then open", decompress_then_open)
+        timed("  search 'ERROR'", lambda: plain.search("ERROR", True))
+        timed("  1000 random get_line", lambda: random_reads(plain))
+        plain.close()
+
+        cache = IndexCache(os.path.join(temp_dir, 'cache'), min_file_size=0)
+        processor = LogProcessor(index_cache=cache, result_cache=ResultCache(0))
+        timed("open compressed (first pass)", lambda: processor.open_file(packed_path))
+        timed("  search 'ERROR'", lambda: processor.search("ERROR", True))
+        timed("  1000 random get_line", lambda: random_reads(processor))
+        processor.close()
+
+        timed("reopen compressed (sidecar)", lambda: processor.open_file(packed_path))
+        print(f"  {processor.compressed.segment_count} segments, "
+              f"{len(processor.compressed.restart_points())} restart points")
+        timed("  1000 random get_line", lambda: random_reads(processor))
+        timed("  search 'ERROR'", lambda: processor.search("ERROR", True))
+        processor.close()
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Benchmark indexing, searching and page reads on a synthetic log.
+
+Usage: python -m benchmarks.bench_core [--size 100MB] [--line-length lognormal]
+           [--timestamps iso8601] [--density 0.01] [--file PATH]
+           [--output results.json] [--baseline benchmarks/baseline.json] [--save-baseline]
+
+Exits with status 1 if a metric regressed past its threshold in the baseline.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks import report
+from benchmarks.generate import LINE_LENGTHS, TIMESTAMP_FORMATS, generate_log, parse_size
+from src.core.index_cache import IndexCache
+from src.core.log_processor import LogProcessor
+from src.core.result_cache import ResultCache
+
+# Queries against generated logs: (metric name, pattern, case sensitive, boolean query).
+QUERIES = [
+    ('literal', "ERROR", True, False),
+    ('regex', r"took 1[0-4]\d\dms", True, False),
+    ('ignorecase', "connection TIMEOUT", False, False),
+    ('query', "ERROR AND (timeout OR refused) AND NOT healthcheck", True, True),
+]
+
+# Lines read per page, as the log view shows them.
+PAGE_LINES = 100
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+def run(path: str, expected_matches=None, pages: int = 500, repeat: int = 3) -> report.Results:
+    size_mb = os.path.getsize(path) / 1e6
+    results = report.Results('core', file_mb=round(size_mb, 1))
+    cache_dir = tempfile.mkdtemp()
+    try:
+        processor = LogProcessor(index_cache=IndexCache(max_bytes=0), result_cache=ResultCache(0))
+        ok, elapsed = timed(lambda: processor.open_file(path))
+        if not ok:
+            raise SystemExit(f"Cannot open {path}")
+        results.add('index_mbps', size_mb / elapsed, 'MB/s', 'higher')
+        processor.close()
+
+        cache = IndexCache(cache_dir, min_file_size=0)
+        processor = LogProcessor(index_cache=cache, result_cache=ResultCache(0))
+        processor.open_file(path)
+        processor.close()
+        _, elapsed = timed(lambda: processor.open_file(path))
+        results.add('reopen_cached_ms', elapsed * 1000, 'ms')
+
+        for name, pattern, case_sensitive, query in QUERIES:
+            best = None
+            for _ in range(repeat):
+                found, elapsed = timed(lambda: sum(len(batch.line_numbers) for batch in
+                                                   processor.iter_search(pattern, case_sensitive,
+                                                                         query=query)))
+                best = elapsed if best is None else min(best, elapsed)
+            if name != 'regex' and expected_matches is not None and found != expected_matches:
+                raise SystemExit(f"{name} search found {found} lines, expected {expected_matches}")
+            results.add(f'search_{name}_mbps', size_mb / best, 'MB/s', 'higher')
+
+        rng = random.Random(0)
+        latencies = []
+        for _ in range(pages):
+            start = rng.randrange(max(1, processor.total_lines - PAGE_LINES))
+            _, elapsed = timed(lambda: processor.get_lines(start, start + PAGE_LINES))
+            latencies.append(elapsed * 1000)
+        results.add('page_p50_ms', report.percentile(latencies, 0.5), 'ms')
+        results.add('page_p99_ms', report.percentile(latencies, 0.99), 'ms')
+        processor.close()
+
+        peak = report.peak_rss_mb()
+        if peak is not None:
+            # Includes the pages of the memory map that were resident
+            results.add('peak_rss_mb', peak, 'MB')
+    finally:
+        shutil.rmtree(cache_dir)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', default='100MB', help="size of the generated log, e.g. 100MB or 50GB")
+    parser.add_argument('--line-length', choices=LINE_LENGTHS, default='lognormal')
+    parser.add_argument('--timestamps', choices=sorted(TIMESTAMP_FORMATS), default='iso8601')
+    parser.add_argument('--density', type=float, default=0.01, help="fraction of matching lines")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--file', help="benchmark this log instead of generating one")
+    parser.add_argument('--pages', type=int, default=500, help="random pages read")
+    report.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.file:
+        return report.finish(args, run(args.file, pages=args.pages))
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(temp_dir, 'bench.log')
+        counts = generate_log(path, parse_size(args.size), args.line_length,
+                              timestamp_format=args.timestamps, match_density=args.density,
+                              seed=args.seed)
+        print(f"{counts['lines']} lines, {counts['bytes'] / 1e6:.1f} MB, {counts['matches']} matches")
+        results = run(path, counts['matches'], args.pages)
+        results.context.update(size=args.size, line_length=args.line_length,
+                               timestamps=args.timestamps, density=args.density)
+        return report.finish(args, results)
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Benchmark the main window under offscreen Qt: opening, page flips and results population.
+
+Usage: python -m benchmarks.bench_ui [--size 100MB] [--density 0.01] [--file PATH]
+           [--output results.json] [--baseline benchmarks/baseline.json] [--save-baseline]
+
+Exits with status 1 if a metric regressed past its threshold in the baseline.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from array import array
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtWidgets import QApplication
+
+from benchmarks import report
+from benchmarks.generate import generate_log, parse_size
+from src.core.index_cache import IndexCache
+from src.core.log_processor import LogProcessor
+from src.core.result_cache import ResultCache
+from src.ui.main_window import MainWindow
+
+# Line numbers per results_found signal, about what a search batch carries.
+BATCH_LINES = 4096
+
+
+def run(app: QApplication, path: str, flips: int = 200) -> report.Results:
+    results = report.Results('ui', file_mb=round(os.path.getsize(path) / 1e6, 1))
+    window = MainWindow()
+    window.log_processor = window.file_processor = LogProcessor(index_cache=IndexCache(max_bytes=0),
+                                                                result_cache=ResultCache(0))
+    window.resize(1200, 800)
+    window.show()
+    app.processEvents()
+
+    # The first page shows while the rest of the file is indexed in the background
+    started = time.perf_counter()
+    window._process_file_open(path)
+    app.processEvents()
+    results.add('open_file_ms', (time.perf_counter() - started) * 1000, 'ms')
+    while window.index_pending:
+        app.processEvents()
+        time.sleep(0.001)
+    results.add('open_indexed_ms', (time.perf_counter() - started) * 1000, 'ms')
+
+    viewport = window.log_display.viewport()
+    latencies = []
+    for i in range(flips):
+        started = time.perf_counter()
+        if i < flips // 2:
+            window.show_next_page()
+        else:
+            window.show_previous_page()
+        viewport.repaint()
+        latencies.append((time.perf_counter() - started) * 1000)
+    results.add('page_flip_p50_ms', report.percentile(latencies, 0.5), 'ms')
+    results.add('page_flip_p99_ms', report.percentile(latencies, 0.99), 'ms')
+
+    # Every line a match: the worst case for streaming results into the list
+    total_lines = window.log_processor.total_lines
+    results_viewport = window.results_list.viewport()
+    started = time.perf_counter()
+    for start in range(0, total_lines, BATCH_LINES):
+        window.handle_search_results(array('I', range(start, min(total_lines, start + BATCH_LINES))))
+        app.processEvents()
+    results_viewport.repaint()
+    elapsed = time.perf_counter() - started
+    results.add('results_populate_ms_per_m', elapsed * 1000 * 1e6 / max(1, total_lines), 'ms')
+
+    window.results_model.clear()
+    window.search_input.setText("ERROR")
+    window.case_sensitive_checkbox.setChecked(True)
+    started = time.perf_counter()
+    window.search_logs()
+    while window.search_thread is not None:
+        app.processEvents()
+        time.sleep(0.001)
+    results_viewport.repaint()
+    results.add('search_to_results_ms', (time.perf_counter() - started) * 1000, 'ms')
+
+    window.close()
+    peak = report.peak_rss_mb()
+    if peak is not None:
+        results.add('peak_rss_mb', peak, 'MB')
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', default='100MB', help="size of the generated log")
+    parser.add_argument('--density', type=float, default=0.01, help="fraction of matching lines")
+    parser.add_argument('--file', help="benchmark this log instead of generating one")
+    parser.add_argument('--flips', type=int, default=200, help="page flips timed")
+    report.add_arguments(parser)
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    if args.file:
+        return report.finish(args, run(app, args.file, args.flips))
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(temp_dir, 'bench.log')
+        counts = generate_log(path, parse_size(args.size), match_density=args.density)
+        print(f"{counts['lines']} lines, {counts['bytes'] / 1e6:.1f} MB, {counts['matches']} matches")
+        results = run(app, path, args.flips)
+        results.context.update(size=args.size, density=args.density)
+        return report.finish(args, results)
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
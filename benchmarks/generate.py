@@ -0,0 +1,152 @@
+"""Deterministic synthetic log generator for the benchmarks.
+
+Usage: python -m benchmarks.generate PATH [--size 1GB] [--line-length lognormal]
+           [--timestamps iso8601|syslog|apache|epoch] [--density 0.01] [--seed 0]
+
+The same options always produce the same bytes.  A fraction ``density`` of
+the lines are "ERROR ... Connection timeout" lines; no other line contains
+"ERROR" or "timeout" in any case, so the benchmarks know exactly how many
+matches each query should find.
+"""
+import argparse
+import math
+import random
+import re
+import time
+from typing import Callable, Dict
+
+# Lines generated per block; the random draws for a block are made at once.
+BLOCK_LINES = 4096
+
+# Text that appears only on match lines, and the queries that find them.
+MATCH_LEVEL = b'ERROR'
+MATCH_MESSAGE = b'Connection timeout talking to db-%d'
+
+LINE_LENGTHS = ('fixed', 'uniform', 'lognormal')
+
+_START = 1672567200  # 2023-01-01 10:00:00 UTC
+_LEVELS = [b'INFO'] * 80 + [b'DEBUG'] * 15 + [b'WARN'] * 5
+_WORDS = (b"request served user session cache lookup query worker upstream payload bytes "
+          b"handler route config retry queue flush commit shard replica token batch").split()
+_MONTHS = [b'Jan', b'Feb', b'Mar', b'Apr', b'May', b'Jun',
+           b'Jul', b'Aug', b'Sep', b'Oct', b'Nov', b'Dec']
+
+
+def _iso(seconds: int, millis: int) -> bytes:
+    t = time.gmtime(seconds)
+    return b'%04d-%02d-%02dT%02d:%02d:%02d.%03dZ' % (t.tm_year, t.tm_mon, t.tm_mday,
+                                                      t.tm_hour, t.tm_min, t.tm_sec, millis)
+
+
+def _syslog(seconds: int, millis: int) -> bytes:
+    t = time.gmtime(seconds)
+    return b'%s %2d %02d:%02d:%02d' % (_MONTHS[t.tm_mon - 1], t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec)
+
+
+def _apache(seconds: int, millis: int) -> bytes:
+    t = time.gmtime(seconds)
+    return b'[%02d/%s/%04d:%02d:%02d:%02d +0000]' % (t.tm_mday, _MONTHS[t.tm_mon - 1], t.tm_year,
+                                                    t.tm_hour, t.tm_min, t.tm_sec)
+
+
+def _epoch(seconds: int, millis: int) -> bytes:
+    return b'%d.%03d' % (seconds, millis)
+
+
+TIMESTAMP_FORMATS: Dict[str, Callable[[int, int], bytes]] = {
+    'iso8601': _iso, 'syslog': _syslog, 'apache': _apache, 'epoch': _epoch,
+}
+
+_SIZE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)B?\s*$', re.IGNORECASE)
+
+
+def parse_size(text: str) -> int:
+    """Parse sizes such as '100MB', '1.5G' or '4096' into bytes (powers of 1000)."""
+    m = _SIZE_RE.match(text)
+    if not m:
+        raise ValueError(f"Invalid size: {text}")
+    number, unit = m.groups()
+    return int(float(number) * 1000 ** ' KMGT'.index(unit.upper() or ' '))
+
+
+def _filler(rng: random.Random, size: int = 1 << 16) -> bytes:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return b' '.join(words)
+
+
+def generate_log(path: str, size: int, line_length: str = 'lognormal', mean_length: int = 120,
+                 timestamp_format: str = 'iso8601', match_density: float = 0.01,
+                 seed: int = 0) -> Dict[str, int]:
+    """Write about ``size`` bytes of log lines to path; returns line and match counts.
+
+    ``line_length`` shapes the message lengths around ``mean_length``:
+    'fixed', 'uniform' (a quarter to nearly twice the mean), or
+    'lognormal' (mostly short lines with a long tail of very long ones,
+    like stack traces and dumped payloads).
+    """
+    if line_length not in LINE_LENGTHS:
+        raise ValueError(f"Unknown line length distribution: {line_length}")
+    stamp = TIMESTAMP_FORMATS[timestamp_format]
+    rng = random.Random(seed)
+    filler = _filler(rng)
+    sigma = 1.0
+    mu = math.log(mean_length) - sigma * sigma / 2
+
+    lines = matches = written = 0
+    with open(path, 'wb', buffering=1 << 20) as f:
+        while written < size:
+            levels = rng.choices(_LEVELS, k=BLOCK_LINES)
+            if line_length == 'fixed':
+                lengths = [mean_length] * BLOCK_LINES
+            elif line_length == 'uniform':
+                lengths = [rng.randrange(mean_length // 4, mean_length * 7 // 4 + 1)
+                           for _ in range(BLOCK_LINES)]
+            else:
+                lengths = [min(int(rng.lognormvariate(mu, sigma)), 64 * 1024)
+                           for _ in range(BLOCK_LINES)]
+            block = []
+            for i in range(BLOCK_LINES):
+                line_number = lines + i
+                match = rng.random() < match_density
+                # One line per millisecond
+                prefix = b'%s %s [worker-%d] request %d took %dms ' % (
+                    stamp(_START + line_number // 1000, line_number % 1000),
+                    MATCH_LEVEL if match else levels[i], line_number % 16, line_number,
+                    (line_number * 7919) % 2000)
+                if match:
+                    prefix += MATCH_MESSAGE % (line_number % 8)
+                    matches += 1
+                body = max(0, lengths[i] - len(prefix))
+                start = rng.randrange(len(filler) - body) if body < len(filler) else 0
+                block.append(prefix + filler[start:start + body])
+            data = b'\n'.join(block) + b'\n'
+            f.write(data)
+            written += len(data)
+            lines += BLOCK_LINES
+    return {'lines': lines, 'matches': matches, 'bytes': written}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--size', default='100MB', help="approximate file size, e.g. 100MB or 50GB")
+    parser.add_argument('--line-length', choices=LINE_LENGTHS, default='lognormal')
+    parser.add_argument('--mean-length', type=int, default=120)
+    parser.add_argument('--timestamps', choices=sorted(TIMESTAMP_FORMATS), default='iso8601')
+    parser.add_argument('--density', type=float, default=0.01, help="fraction of matching lines")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    started = time.perf_counter()
+    counts = generate_log(args.path, parse_size(args.size), args.line_length, args.mean_length,
+                          args.timestamps, args.density, args.seed)
+    print(f"{counts['lines']} lines ({counts['matches']} matches), {counts['bytes'] / 1e6:.1f} MB "
+          f"in {time.perf_counter() - started:.1f} seconds")
+
+
+if __name__ == '__main__':
+    main()
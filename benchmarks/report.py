@@ -0,0 +1,115 @@
+"""Benchmark results: collecting metrics, writing JSON, and checking a baseline.
+
+A results file holds one entry per metric::
+
+    {"suite": "core", "metrics": {"search_literal_mbps": {"value": 812.4, "unit": "MB/s",
+                                                          "better": "higher"}, ...}}
+
+The baseline (benchmarks/baseline.json) maps suite names to such metrics,
+plus "thresholds": the fraction by which a metric may get worse before it
+counts as a regression, per metric name or as a "default".
+"""
+import json
+import os
+import platform
+import sys
+import time
+from typing import Dict, List, Optional
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# A metric may be this much worse than its baseline before it is flagged.
+DEFAULT_THRESHOLD = 0.25
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, in MB (None where unknown)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Results:
+    """Metrics of one benchmark suite run."""
+
+    def __init__(self, suite: str, **context):
+        self.suite = suite
+        self.context = dict(context, python=platform.python_version(), machine=platform.machine(),
+                            cpus=os.cpu_count(), time=time.strftime('%Y-%m-%dT%H:%M:%S'))
+        self.metrics: Dict[str, dict] = {}
+
+    def add(self, name: str, value: float, unit: str, better: str = 'lower') -> None:
+        self.metrics[name] = {'value': round(value, 4), 'unit': unit, 'better': better}
+        print(f"{name:<36} {value:12.3f} {unit}")
+
+    def to_dict(self) -> dict:
+        return {'suite': self.suite, 'context': self.context, 'metrics': self.metrics}
+
+
+def compare(metrics: Dict[str, dict], baseline: Dict[str, dict],
+            thresholds: Optional[Dict[str, float]] = None) -> List[str]:
+    """Return a message for every metric that regressed past its threshold."""
+    thresholds = thresholds or {}
+    default = thresholds.get('default', DEFAULT_THRESHOLD)
+    regressions = []
+    for name, metric in metrics.items():
+        base = baseline.get(name)
+        if base is None or not base['value']:
+            continue
+        allowed = thresholds.get(name, default)
+        change = (metric['value'] - base['value']) / base['value']
+        if metric.get('better', 'lower') == 'higher':
+            change = -change
+        if change > allowed:
+            regressions.append(f"{name}: {metric['value']:.3f} {metric['unit']} vs baseline "
+                               f"{base['value']:.3f} ({change:+.0%} worse, {allowed:.0%} allowed)")
+    return regressions
+
+
+def add_arguments(parser) -> None:
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--baseline', default=BASELINE_PATH,
+                        help="baseline to compare against (default: benchmarks/baseline.json)")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="store these results as the suite's baseline instead of comparing")
+
+
+def finish(args, results: Results) -> int:
+    """Write and check the results; returns the exit status (1 on regressions)."""
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results.to_dict(), f, indent=2)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    if args.save_baseline:
+        baseline[results.suite] = {'context': results.context, 'metrics': results.metrics}
+        baseline.setdefault('thresholds', {'default': DEFAULT_THRESHOLD})
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+    suite = baseline.get(results.suite)
+    if suite is None:
+        print(f"No {results.suite} baseline in {args.baseline}; nothing to compare")
+        return 0
+    if suite.get('context', {}).get('file_mb') != results.context.get('file_mb'):
+        print(f"Note: the baseline was measured on a {suite['context'].get('file_mb')} MB log, "
+              f"this run on {results.context.get('file_mb')} MB")
+    regressions = compare(results.metrics, suite['metrics'], baseline.get('thresholds'))
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    if not regressions:
+        print(f"No regressions against {args.baseline}")
+    return 1 if regressions else 0
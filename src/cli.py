@@ -0,0 +1,334 @@
+"""Headless command-line interface to the LogExplorer engine.
+
+    python -m src.cli index app.log logs/
+    python -m src.cli search -n -C 2 "Timeout" app.log app.log.1
+    python -m src.cli search --query "ERROR AND (timeout OR refused) AND NOT healthcheck" logs/
+    python -m src.cli time "10:00" "10:05" app.log -e ERROR --ndjson
+    python -m src.cli fields --where "level=ERROR" app.log
+
+Nothing here imports Qt, and engine modules are only imported by the
+commands that use them, so starting up costs little more than the
+interpreter itself.  Results are written as they are found.
+"""
+import os
+import sys
+import argparse
+import contextlib
+
+from src.core.export import ContextLines, Output
+
+# Exit statuses, as grep: something found, nothing found, trouble.
+EXIT_FOUND = 0
+EXIT_NOT_FOUND = 1
+EXIT_ERROR = 2
+
+
+def build_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--backend', choices=('auto', 'thread', 'process'),
+                        help="search backend (default: $LOGEXPLORER_SEARCH_BACKEND or auto)")
+    common.add_argument('--workers', type=int, help="search worker count (default: CPU count)")
+    common.add_argument('--no-cache', action='store_true', help="do not read or write the index cache")
+    common.add_argument('--stats', action='store_true',
+                        help="print timings and cache hit rates as JSON to stderr when done")
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument('-n', '--line-number', action='store_true', help="prefix lines with their number")
+    output.add_argument('-c', '--count', action='store_true', help="print only a count per file")
+    output.add_argument('-H', '--with-filename', action='store_true', default=None,
+                        help="prefix lines with the file name (default with several files)")
+    output.add_argument('--no-filename', dest='with_filename', action='store_false')
+    formats = output.add_mutually_exclusive_group()
+    formats.add_argument('--json', dest='format', action='store_const', const='json',
+                         help="write a JSON array of records")
+    formats.add_argument('--ndjson', dest='format', action='store_const', const='ndjson',
+                         help="write one JSON record per line")
+    output.set_defaults(format='text')
+
+    parser = argparse.ArgumentParser(prog='python -m src.cli',
+                                     description="Index, search and filter log files without the GUI.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    index = commands.add_parser('index', parents=[common],
+                                help="index files (and cache the indexes) and print their sizes")
+    index.add_argument('paths', nargs='+', metavar='PATH', help="files, directories or glob patterns")
+    index.add_argument('--json', dest='format', action='store_const', const='json', default='text')
+
+    search = commands.add_parser('search', parents=[common, output], help="search files for a pattern")
+    search.add_argument('pattern', help="regular expression, or plain text")
+    search.add_argument('paths', nargs='+', metavar='PATH', help="files, directories or glob patterns")
+    search.add_argument('-i', '--ignore-case', action='store_true')
+    search.add_argument('-F', '--fixed-strings', action='store_true', help="treat the pattern as plain text")
+    search.add_argument('--query', action='store_true',
+                        help='treat the pattern as a boolean query of words, "phrases" and /regexes/, '
+                             'e.g. "ERROR AND (timeout OR refused) AND NOT healthcheck"')
+    search.add_argument('-A', '--after-context', type=int, default=0, metavar='NUM')
+    search.add_argument('-B', '--before-context', type=int, default=0, metavar='NUM')
+    search.add_argument('-C', '--context', type=int, metavar='NUM', help="same as -A NUM -B NUM")
+    search.add_argument('--order', choices=('file', 'time'), default='file',
+                        help="order results file by file, or merged by timestamp")
+    search.add_argument('--time-format', help="timestamp format for --order time (default: detect)")
+
+    time_filter = commands.add_parser('time', parents=[common, output],
+                                      help="print the lines stamped between two times")
+    time_filter.add_argument('start', help="start time (file format, ISO 8601, epoch, or HH:MM[:SS])")
+    time_filter.add_argument('end', help="end time, inclusive")
+    time_filter.add_argument('paths', nargs='+', metavar='PATH', help="files, directories or glob patterns")
+    time_filter.add_argument('-e', '--regexp', metavar='PATTERN', help="only lines matching PATTERN")
+    time_filter.add_argument('-i', '--ignore-case', action='store_true')
+    time_filter.add_argument('--time-format', help="timestamp format name or strptime string (default: detect)")
+
+    fields = commands.add_parser('fields', parents=[common, output],
+                                 help="count the values of structured fields, such as levels")
+    fields.add_argument('paths', nargs='+', metavar='PATH', help="files, directories or glob patterns")
+    fields.add_argument('--where', metavar='FILTER',
+                        help='only lines matching FILTER, e.g. "level=ERROR,WARN AND component=db"')
+    fields.add_argument('--field-format', metavar='FORMAT',
+                        help="'auto' (default), a template like '{time} {level} [{thread}] {logger}: "
+                             "{message}', or a regex with named groups")
+    fields.add_argument('--top', type=int, default=10, metavar='NUM', help="values shown per field")
+    fields.add_argument('-l', '--lines', action='store_true',
+                        help="print the matching lines instead of value counts")
+    return parser
+
+
+def open_session(args):
+    """The files named on the command line, as a LogSession; None if some are missing."""
+    from src.core.index_cache import IndexCache
+    from src.core.session import LogSession, expand_paths
+    from src.core.stats import Stats
+
+    paths = expand_paths(args.paths)
+    missing = [path for path in paths if not os.path.isfile(path)]
+    for path in missing:
+        print(f"logexplorer: {path}: No such file", file=sys.stderr)
+    if missing:
+        return None
+    # Empty files cannot be opened, and hold nothing to find
+    paths = [path for path in paths if os.path.getsize(path) > 0]
+    index_cache = IndexCache(max_bytes=0) if args.no_cache else None
+    return LogSession(paths, index_cache=index_cache, search_backend=args.backend,
+                      max_workers=args.workers, stats=Stats(True) if args.stats else None)
+
+
+def close_session(args, session) -> None:
+    if args.stats:
+        import json
+        json.dump(session.stats.snapshot(), sys.stderr, indent=2)
+        sys.stderr.write("\n")
+    session.close()
+
+
+def run_index(args, stream) -> int:
+    import time
+    started = time.perf_counter()
+    session = open_session(args)
+    if session is None:
+        return EXIT_ERROR
+    try:
+        if not session.open():
+            return EXIT_ERROR
+        elapsed = time.perf_counter() - started
+        out = Output(stream, args.format)
+        for member in session.files:
+            if args.format == 'json':
+                out.record({'file': member.name, 'lines': member.total_lines, 'bytes': member.size})
+            else:
+                stream.write(os.fsencode(member.name) +
+                             b': %d lines, %.1f MB\n' % (member.total_lines, member.size / 1e6))
+        if args.format == 'text':
+            stream.write(b'%d files, %d lines, %.1f MB indexed in %.3f seconds\n' %
+                         (len(session), session.total_lines, session.total_bytes / 1e6, elapsed))
+        out.close()
+        return EXIT_FOUND
+    finally:
+        close_session(args, session)
+
+
+def _output(args, session, stream) -> Output:
+    file_names = args.with_filename
+    if file_names is None:
+        file_names = len(session) > 1
+    return Output(stream, args.format, args.line_number, file_names)
+
+
+def run_search(args, stream) -> int:
+    if args.query:
+        from src.core.query import Query
+        try:
+            Query(args.pattern)
+        except ValueError as e:
+            print(f"logexplorer: {e}", file=sys.stderr)
+            return EXIT_ERROR
+    session = open_session(args)
+    if session is None:
+        return EXIT_ERROR
+    pattern = args.pattern
+    if args.fixed_strings and not args.query:
+        import re
+        pattern = re.escape(pattern)
+    before = args.before_context if args.context is None else args.context
+    after = args.after_context if args.context is None else args.context
+    if args.order == 'time' and (before or after):
+        print("logexplorer: context lines cannot be shown with --order time", file=sys.stderr)
+        session.close()
+        return EXIT_ERROR
+    out = _output(args, session, stream)
+    counts = [0] * len(session)
+    try:
+        if args.order == 'time':
+            hits = session.search(pattern, not args.ignore_case, order='time',
+                                  time_format=args.time_format, query=args.query)
+            for file_index, line in hits:
+                counts[file_index] += 1
+                if not args.count:
+                    out.line(session.files[file_index].name, line,
+                             session.get_line_bytes(file_index, line))
+        else:
+            context = None   # (file index, ContextLines) while showing context
+            for batch in session.iter_search(pattern, not args.ignore_case, query=args.query):
+                counts[batch.file_index] += len(batch.line_numbers)
+                if args.count or not len(batch.line_numbers):
+                    continue
+                name = session.files[batch.file_index].name
+                with session.pinned(batch.file_index) as processor:
+                    if not (before or after):
+                        for line in batch.line_numbers:
+                            out.line(name, line, processor.get_line_bytes(line))
+                    else:
+                        if context is None or context[0] != batch.file_index:
+                            if context is not None:
+                                _finish_context(out, session, *context)
+                                out.separator()
+                            context = (batch.file_index,
+                                       ContextLines(before, after, processor.total_lines))
+                        _write_context(out, name, processor, context[1].add(batch.line_numbers))
+                out.flush()
+            if context is not None:
+                _finish_context(out, session, *context)
+        if args.count:
+            for member, count in zip(session.files, counts):
+                out.count(member.name, count)
+        return EXIT_FOUND if any(counts) else EXIT_NOT_FOUND
+    finally:
+        out.close()
+        close_session(args, session)
+
+
+def _write_context(out: Output, name: str, processor, items) -> None:
+    for item in items:
+        if item is None:
+            out.separator()
+        else:
+            line, is_match = item
+            out.line(name, line, processor.get_line_bytes(line), is_match)
+
+
+def _finish_context(out: Output, session, file_index: int, context: ContextLines) -> None:
+    with session.pinned(file_index) as processor:
+        _write_context(out, session.files[file_index].name, processor, context.finish())
+
+
+def run_time(args, stream) -> int:
+    session = open_session(args)
+    if session is None:
+        return EXIT_ERROR
+    out = _output(args, session, stream)
+    found = 0
+    try:
+        for file_index, member in enumerate(session.files):
+            with session.pinned(file_index) as processor:
+                try:
+                    lines = processor.filter_by_time(args.start, args.end, args.time_format)
+                except ValueError as e:
+                    print(f"{member.name}: {e}", file=sys.stderr)
+                    return EXIT_ERROR
+                if args.regexp:
+                    matches = (line for batch in processor.iter_search(
+                                   args.regexp, not args.ignore_case, exclusive=False,
+                                   start_line=lines.start, end_line=lines.end)
+                               for line in batch.line_numbers)
+                else:
+                    matches = range(lines.start, lines.end)
+                count = 0
+                for line in matches:
+                    count += 1
+                    if not args.count:
+                        out.line(member.name, line, processor.get_line_bytes(line))
+                found += count
+                if args.count:
+                    out.count(member.name, count)
+                out.flush()
+        return EXIT_FOUND if found else EXIT_NOT_FOUND
+    finally:
+        out.close()
+        close_session(args, session)
+
+
+def run_fields(args, stream) -> int:
+    from collections import Counter
+    from src.core.fields import parse_filter
+    try:
+        filters = parse_filter(args.where) if args.where else {}
+    except ValueError as e:
+        print(f"logexplorer: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    session = open_session(args)
+    if session is None:
+        return EXIT_ERROR
+    out = _output(args, session, stream)
+    totals = {}
+    found = 0
+    try:
+        for file_index, member in enumerate(session.files):
+            with session.pinned(file_index) as processor:
+                try:
+                    index = processor.fields(args.field_format)
+                    count = index.count(filters)
+                    if args.lines and not args.count:
+                        for line in index.filter(filters):
+                            out.line(member.name, line, processor.get_line_bytes(line))
+                    elif not args.count:
+                        for name, pairs in index.facets(filters).items():
+                            totals.setdefault(name, Counter()).update(dict(pairs))
+                except ValueError as e:
+                    print(f"logexplorer: {member.name}: {e}", file=sys.stderr)
+                    return EXIT_ERROR
+                found += count
+                if args.count:
+                    out.count(member.name, count)
+                out.flush()
+        for name, counts in totals.items():
+            for value, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:args.top]:
+                if args.format == 'text':
+                    stream.write(f"{name}={value}\t{count}\n".encode('utf-8'))
+                else:
+                    out.record({'field': name, 'value': value, 'lines': count})
+        return EXIT_FOUND if found else EXIT_NOT_FOUND
+    finally:
+        out.close()
+        close_session(args, session)
+
+
+def main(argv=None, stream=None) -> int:
+    args = build_parser().parse_args(argv)
+    stream = stream if stream is not None else sys.stdout.buffer
+    commands = {'index': run_index, 'search': run_search, 'time': run_time, 'fields': run_fields}
+    try:
+        # The engine reports problems on stderr; keep anything else printed out of the results
+        with contextlib.redirect_stdout(sys.stderr):
+            return commands[args.command](args, stream)
+    except BrokenPipeError:
+        # Output piped into head and the like; silence the final flush
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return EXIT_FOUND
+    except (OSError, ValueError) as e:
+        # Such as a file of a session that could not be searched
+        print(f"logexplorer: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    except KeyboardInterrupt:
+        return EXIT_ERROR
+
+
+if __name__ == '__main__':
+    sys.exit(main())
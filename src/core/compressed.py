@@ -0,0 +1,497 @@
+import zlib
+import struct
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from src.core.index_cache import FileIdentity, IndexCache
+from src.core.line_index import LineIndex
+from src.core.search_engine import SearchPattern, scan_range
+
+FORMATS = ('gzip', 'bz2', 'xz')
+
+_MAGICS = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+)
+
+# Compressed bytes fed to a decompressor at a time.
+INPUT_BYTES = 256 * 1024
+
+# Uncompressed distance between in-memory gzip checkpoints (decompressor
+# snapshots).  Each costs about 40 KB, so 8 MB keeps them near 0.5% of
+# the data while bounding a random read to 8 MB of inflating.
+CHECKPOINT_BYTES = 8 * 1024 * 1024
+
+# Decompressed pages kept for random access (get_line and the viewer).
+PAGE_BYTES = 1024 * 1024
+CACHE_PAGES = 32
+
+# Search ranges are cut at restart points at least this far apart.
+MIN_RANGE_BYTES = 4 * 1024 * 1024
+
+# format, segments, uncompressed size
+_HEADER = struct.Struct('<4sQQ')
+_FORMAT_CODES = {'gzip': b'gz\x00\x00', 'bz2': b'bz2\x00', 'xz': b'xz\x00\x00'}
+
+_XZ_MAGIC = b'\xfd7zXZ\x00'
+_XZ_FILTER_LZMA2 = 0x21
+
+
+def detect_compression(buf) -> Optional[str]:
+    """Return the compression format of a file from its first bytes, if any."""
+    head = bytes(buf[:6])
+    for magic, name in _MAGICS:
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def _xz_varint(buf, pos: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+        if shift > 63:
+            raise ValueError("Invalid xz integer")
+
+
+def _lzma2_dict_size(prop: int) -> int:
+    bits = prop & 0x3F
+    if bits > 40:
+        raise ValueError("Invalid LZMA2 dictionary size")
+    if bits == 40:
+        return 0xFFFFFFFF
+    return (2 | (bits & 1)) << (bits // 2 + 11)
+
+
+def xz_blocks(buf) -> Optional[List[Tuple[int, int, int]]]:
+    """List the blocks of an xz file from the indexes at the end of its streams.
+
+    Returns (compressed data offset, uncompressed size, LZMA2 dictionary
+    size) per block, or None if the file uses anything other than plain
+    LZMA2 blocks (which are then decoded a whole stream at a time).
+    """
+    blocks = []
+    end = len(buf)
+    try:
+        while end > 0:
+            while end >= 4 and buf[end - 4:end] == b'\x00\x00\x00\x00':
+                end -= 4  # stream padding
+            if end == 0:
+                break
+            footer = buf[end - 12:end]
+            if end < 24 or footer[10:12] != b'YZ':
+                return None
+            index_size = (struct.unpack_from('<I', footer, 4)[0] + 1) * 4
+            index_start = end - 12 - index_size
+            if index_start < 12 or buf[index_start] != 0:
+                return None
+            count, pos = _xz_varint(buf, index_start + 1)
+            records = []
+            for _ in range(count):
+                unpadded, pos = _xz_varint(buf, pos)
+                size, pos = _xz_varint(buf, pos)
+                records.append((unpadded, size))
+            stream_start = index_start - sum((u + 3) & ~3 for u, _ in records) - 12
+            if stream_start < 0 or buf[stream_start:stream_start + 6] != _XZ_MAGIC:
+                return None
+
+            stream_blocks = []
+            pos = stream_start + 12
+            for unpadded, size in records:
+                header_size = (buf[pos] + 1) * 4
+                flags = buf[pos + 1]
+                if flags & 0x3F:
+                    return None  # several filters, or reserved bits
+                field = pos + 2
+                if flags & 0x40:
+                    _, field = _xz_varint(buf, field)
+                if flags & 0x80:
+                    _, field = _xz_varint(buf, field)
+                filter_id, field = _xz_varint(buf, field)
+                props_size, field = _xz_varint(buf, field)
+                if filter_id != _XZ_FILTER_LZMA2 or props_size != 1:
+                    return None
+                stream_blocks.append((pos + header_size, size, _lzma2_dict_size(buf[field])))
+                pos += (unpadded + 3) & ~3
+            blocks[:0] = stream_blocks
+            end = stream_start
+    except (IndexError, ValueError, struct.error):
+        return None
+    return blocks
+
+
+class CompressedFile:
+    """Random access to the uncompressed contents of a gzip, bz2 or xz file.
+
+    The file is split into independently decodable segments: gzip
+    members, bz2 streams, and xz blocks (or streams).  Their positions are
+    found on the first pass and can be saved next to the line index, so a
+    later open seeks straight to the segment holding any byte.  Inside a
+    gzip member, decompressor snapshots taken every CHECKPOINT_BYTES as
+    data is decoded bound the cost of a seek further.
+
+    Slicing (``cf[start:end]``) returns uncompressed bytes, which is all
+    LogProcessor needs for reading lines.
+    """
+
+    def __init__(self, raw, fmt: str):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported compression format: {fmt}")
+        self.raw = raw
+        self.format = fmt
+        self.size = 0
+        # Per segment: compressed start, uncompressed start, and for xz
+        # blocks the LZMA2 dictionary size (0 for a whole xz stream)
+        self.comp_starts = array('Q')
+        self.starts = array('Q')
+        self.params = array('Q')
+        self.complete = False
+        self._checkpoints = {}
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, item) -> bytes:
+        if not isinstance(item, slice):
+            raise TypeError("CompressedFile only supports slicing")
+        start, stop, step = item.indices(self.size)
+        if step != 1:
+            raise ValueError("CompressedFile slices do not support steps")
+        return self.read(start, stop)
+
+    @property
+    def segment_count(self) -> int:
+        return len(self.starts)
+
+    def build(self, line_index: LineIndex,
+              progress: Optional[Callable[[int, int], None]] = None) -> None:
+        """Decompress the whole file once, finding segments and indexing lines."""
+        blocks = xz_blocks(self.raw) if self.format == 'xz' else None
+        self.comp_starts = array('Q')
+        self.starts = array('Q')
+        self.params = array('Q')
+        if blocks is not None:
+            pos = 0
+            for comp_start, size, dict_size in blocks:
+                self._add_segment(comp_start, pos, dict_size)
+                pos += size
+            self.size = pos
+            self.complete = True
+        else:
+            self._add_segment(0, 0, 0)
+            self.complete = False
+
+        def chunks():
+            for _, data in self._decode(0, progress):
+                yield data
+
+        line_index.build_from_chunks(chunks())
+        self.size = line_index.size
+        self.complete = True
+
+    def _add_segment(self, comp_start: int, start: int, param: int) -> None:
+        self.comp_starts.append(comp_start)
+        self.starts.append(start)
+        self.params.append(param)
+
+    def _decompressor(self, segment: int):
+        # bz2 and lzma are only imported for files that need them
+        if self.format == 'gzip':
+            return zlib.decompressobj(zlib.MAX_WBITS | 16)
+        if self.format == 'bz2':
+            import bz2
+            return bz2.BZ2Decompressor()
+        import lzma
+        if self.params[segment]:
+            return lzma.LZMADecompressor(lzma.FORMAT_RAW, filters=[
+                {'id': lzma.FILTER_LZMA2, 'dict_size': self.params[segment]}])
+        return lzma.LZMADecompressor(lzma.FORMAT_XZ)
+
+    def _next_segment(self, comp_pos: int, out_pos: int) -> bool:
+        """While building, register the member or stream starting at comp_pos."""
+        raw = self.raw
+        if self.format == 'xz':
+            while raw[comp_pos:comp_pos + 4] == b'\x00\x00\x00\x00':
+                comp_pos += 4  # stream padding
+        if detect_compression(raw[comp_pos:comp_pos + 6]) != self.format:
+            return False  # trailing garbage is ignored, as gzip does
+        self._add_segment(comp_pos, out_pos, 0)
+        return True
+
+    def _restart(self, pos: int):
+        """Return (segment, compressed pos, uncompressed pos, decompressor) to decode pos."""
+        segment = max(0, bisect_right(self.starts, pos) - 1)
+        with self._lock:
+            points = self._checkpoints.get(segment)
+            if points:
+                k = bisect_right(points[0], pos) - 1
+                if k >= 0:
+                    out_pos, comp_pos, state = points[1][k]
+                    return segment, comp_pos, out_pos, state.copy()
+        return segment, self.comp_starts[segment], self.starts[segment], self._decompressor(segment)
+
+    def _restart_offset(self, pos: int) -> int:
+        """The uncompressed offset decoding pos would start from."""
+        segment = max(0, bisect_right(self.starts, pos) - 1)
+        offset = self.starts[segment] if self.starts else 0
+        with self._lock:
+            points = self._checkpoints.get(segment)
+            if points:
+                k = bisect_right(points[0], pos) - 1
+                if k >= 0:
+                    offset = points[0][k]
+        return offset
+
+    def _add_checkpoint(self, segment: int, out_pos: int, comp_pos: int, decompressor) -> None:
+        with self._lock:
+            positions, states = self._checkpoints.setdefault(segment, (array('Q'), []))
+            k = bisect_right(positions, out_pos)
+            if k and out_pos - positions[k - 1] < CHECKPOINT_BYTES // 2:
+                return
+            if k < len(positions) and positions[k] - out_pos < CHECKPOINT_BYTES // 2:
+                return
+            positions.insert(k, out_pos)
+            states.insert(k, (out_pos, comp_pos, decompressor.copy()))
+
+    def _decode(self, pos: int,
+                progress: Optional[Callable[[int, int], None]] = None) -> Iterator[Tuple[int, bytes]]:
+        """Yield (offset, data) consecutive pieces from a restart point at or before pos."""
+        if not self.starts:
+            return
+        segment, comp_pos, out_pos, decompressor = self._restart(pos)
+        raw = self.raw
+        raw_size = len(raw)
+        checkpoints = self.format == 'gzip'
+        last_checkpoint = out_pos
+        while True:
+            comp_end = raw_size
+            if segment + 1 < len(self.starts):
+                comp_end = self.comp_starts[segment + 1]
+            while not decompressor.eof and comp_pos < comp_end:
+                chunk = raw[comp_pos:min(comp_pos + INPUT_BYTES, comp_end)]
+                comp_pos += len(chunk)
+                data = decompressor.decompress(chunk)
+                if data:
+                    yield out_pos, data
+                    out_pos += len(data)
+                if progress:
+                    progress(comp_pos, raw_size)
+                if (checkpoints and out_pos - last_checkpoint >= CHECKPOINT_BYTES and
+                        not decompressor.eof):
+                    self._add_checkpoint(segment, out_pos, comp_pos, decompressor)
+                    last_checkpoint = out_pos
+            if not decompressor.eof:
+                return  # truncated file: whatever could be decoded is kept
+            segment += 1
+            if segment >= len(self.starts):
+                if self.complete:
+                    return
+                unused = len(decompressor.unused_data)
+                if not self._next_segment(comp_pos - unused, out_pos):
+                    return
+            comp_pos = self.comp_starts[segment]
+            decompressor = self._decompressor(segment)
+            last_checkpoint = out_pos
+
+    def iter_range(self, start: int, end: int) -> Iterator[Tuple[int, bytes]]:
+        """Yield (offset, data) pieces covering exactly [start, end)."""
+        if start >= end:
+            return
+        decoder = self._decode(start)
+        try:
+            for offset, data in decoder:
+                if offset + len(data) <= start:
+                    continue
+                if offset < start or offset + len(data) > end:
+                    data = data[max(0, start - offset):end - offset]
+                    offset = max(offset, start)
+                yield offset, data
+                if offset + len(data) >= end:
+                    return
+        finally:
+            decoder.close()
+
+    def read(self, start: int, end: int) -> bytes:
+        """Return the uncompressed bytes [start, end), through the page cache."""
+        end = min(end, self.size)
+        if start >= end:
+            return b''
+        first, last = start // PAGE_BYTES, (end - 1) // PAGE_BYTES
+        pages = [self._page(p) for p in range(first, last + 1)]
+        data = pages[0] if len(pages) == 1 else b''.join(pages)
+        base = first * PAGE_BYTES
+        return data[start - base:end - base]
+
+    def _page(self, page: int) -> bytes:
+        with self._lock:
+            data = self._pages.get(page)
+            if data is not None:
+                self._pages.move_to_end(page)
+                return data
+
+        # Each thread keeps decoding where its last miss left off, so reading
+        # on through a file costs one pass even without restart points
+        page_start = page * PAGE_BYTES
+        cursor = getattr(self._local, 'cursor', None)
+        self._local.cursor = None
+        if cursor is None or not (self._restart_offset(page_start) <= cursor.position and
+                                  cursor.buffered_start <= page_start):
+            if cursor is not None:
+                cursor.close()
+            cursor = _Cursor(self._decode(page_start))
+
+        for complete_page, data in cursor.pages():
+            self._store_page(complete_page, data)
+            if complete_page == page:
+                self._local.cursor = cursor
+                return data
+        cursor.close()
+        return b''
+
+    def _store_page(self, page: int, data: bytes) -> None:
+        with self._lock:
+            self._pages[page] = data
+            self._pages.move_to_end(page)
+            while len(self._pages) > CACHE_PAGES:
+                self._pages.popitem(last=False)
+
+    def restart_points(self) -> List[int]:
+        """Uncompressed offsets decoding can start from: segments and checkpoints."""
+        points = list(self.starts)
+        with self._lock:
+            for positions, _ in self._checkpoints.values():
+                points.extend(positions)
+        return sorted(points)
+
+    def save(self, cache: IndexCache, identity: FileIdentity, line_index: LineIndex) -> None:
+        """Store the segment table and line index in the index cache."""
+        offsets = line_index.offsets
+        typecode = offsets.typecode if hasattr(offsets, 'typecode') else offsets.format
+        cache.write_entry(identity, 'zidx', typecode, line_index.partial,
+                          [_HEADER.pack(_FORMAT_CODES[self.format], len(self.starts), self.size),
+                           memoryview(self.comp_starts).cast('B'), memoryview(self.starts).cast('B'),
+                           memoryview(self.params).cast('B'), memoryview(offsets).cast('B')],
+                          data_size=self.size)
+
+    @classmethod
+    def load(cls, cache: IndexCache, identity: FileIdentity, raw, fmt: str,
+             backend: Optional[str] = None) -> Optional[Tuple['CompressedFile', LineIndex]]:
+        """Return the file and its line index from the cache, if it is up to date."""
+        entry = cache.read_entry(identity, 'zidx', raw)
+        if entry is None:
+            return None
+        cached_identity, typecode, partial, payload = entry
+        if cached_identity.size != identity.size or typecode not in ('I', 'L', 'Q'):
+            return None
+        code, count, size = _HEADER.unpack_from(payload)
+        itemsize = array(typecode).itemsize
+        offsets_start = _HEADER.size + 3 * 8 * count
+        if code != _FORMAT_CODES[fmt] or (len(payload) - offsets_start) % itemsize:
+            return None
+        source = cls(raw, fmt)
+        tables = payload[_HEADER.size:offsets_start].cast('Q')
+        source.comp_starts = array('Q', tables[:count])
+        source.starts = array('Q', tables[count:2 * count])
+        source.params = array('Q', tables[2 * count:])
+        source.size = size
+        source.complete = True
+        index = LineIndex(backend)
+        index.offsets = payload[offsets_start:].cast(typecode)
+        index.size = size
+        index.partial = partial
+        return source, index
+
+
+class _Cursor:
+    """A decoder paused at a page boundary, with the bytes it decoded past it."""
+
+    def __init__(self, decoder: Iterator[Tuple[int, bytes]]):
+        self.decoder = decoder
+        self.buffered = bytearray()
+        self.buffered_start = None
+
+    @property
+    def position(self) -> int:
+        """Offset of the next byte the decoder produces."""
+        return self.buffered_start + len(self.buffered)
+
+    def pages(self) -> Iterator[Tuple[int, bytes]]:
+        """Yield (page, data) for each page completed from here on, then the last one."""
+        while True:
+            # The first page starting in the buffer, if it is complete
+            if self.buffered_start is not None:
+                start = -(-self.buffered_start // PAGE_BYTES) * PAGE_BYTES
+                skip = start - self.buffered_start
+                if len(self.buffered) >= skip + PAGE_BYTES:
+                    page = bytes(self.buffered[skip:skip + PAGE_BYTES])
+                    del self.buffered[:skip + PAGE_BYTES]
+                    self.buffered_start = start + PAGE_BYTES
+                    yield start // PAGE_BYTES, page
+                    continue
+            chunk = next(self.decoder, None)
+            if chunk is None:
+                break
+            offset, data = chunk
+            if self.buffered_start is None:
+                self.buffered_start = offset
+            self.buffered += data
+        if self.buffered_start is not None and self.buffered_start % PAGE_BYTES == 0 and self.buffered:
+            page = self.buffered_start // PAGE_BYTES
+            data = bytes(self.buffered)
+            self.buffered = bytearray()
+            yield page, data
+
+    def close(self) -> None:
+        self.decoder.close()
+
+
+def compressed_ranges(source: CompressedFile, line_index: LineIndex, start: int,
+                      end: int) -> List[Tuple[int, int]]:
+    """Split [start, end) at restart points into line-aligned ranges.
+
+    Each range can be decoded without decoding the ones before it, so
+    they can be searched in parallel.
+    """
+    offsets = line_index.offsets
+    bounds = [start]
+    for point in source.restart_points():
+        if point <= start:
+            continue
+        if point >= end:
+            break
+        line = line_index.line_at(point)
+        aligned = offsets[line] if offsets[line] == point else offsets[line + 1]
+        if aligned - bounds[-1] >= MIN_RANGE_BYTES and aligned < end:
+            bounds.append(aligned)
+    bounds.append(end)
+    return list(zip(bounds, bounds[1:]))
+
+
+def scan_compressed_range(source: CompressedFile, start: int, end: int,
+                          pattern: SearchPattern) -> array:
+    """Pool task: scan_range over a line-aligned range of a compressed file."""
+    found = array('Q')
+    carry = b''
+    carry_start = start
+    for offset, data in source.iter_range(start, end):
+        data = carry + data if carry else data
+        cut = data.rfind(b'\n') + 1
+        if cut:
+            found.extend(carry_start + hit for hit in scan_range(data, 0, cut, pattern))
+        carry = data[cut:]
+        carry_start += cut
+    if carry:
+        found.extend(carry_start + hit for hit in scan_range(carry, 0, len(carry), pattern))
+    return found
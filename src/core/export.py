@@ -0,0 +1,305 @@
+"""Writing matching lines out, with grep-style context lines.
+
+ContextLines merges matches with the lines around them into runs of
+consecutive lines, and Output writes lines as grep-style text, a JSON
+array or NDJSON records; the command line uses both.
+
+export_lines streams matches and their context from a view of an open
+file (see LogProcessor.export).  As plain text, each run of lines is
+copied from the memory map as one byte range, without splitting or
+decoding it; with line numbers or as NDJSON, lines are written one by
+one.  Only one run is held at a time, so memory stays flat however many
+lines match.
+"""
+import os
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+# Most bytes copied from the file per write, and most lines read at once
+# when they are written one by one.
+COPY_BYTES = 4 * 1024 * 1024
+COPY_LINES = 65536
+
+# Bytes buffered in front of the file (and the compressor) when exporting.
+WRITE_BUFFER = 1024 * 1024
+
+# gzip level of compressed exports: the fastest, which still shrinks logs
+# several times over.
+GZIP_LEVEL = 1
+
+# Bytes of the file scanned between progress reports.
+PROGRESS_BYTES = 16 * 1024 * 1024
+
+EXPORT_FORMATS = ('text', 'ndjson')
+
+
+class ContextLines:
+    """Surrounds one file's matches with context lines, as grep -A/-B does.
+
+    Matches arrive in batches, in line order.  The after-context of a
+    batch's last match is held back until the next batch (or finish())
+    shows whether it holds matches of its own.
+    """
+
+    def __init__(self, before: int, after: int, total_lines: int):
+        self.before = before
+        self.after = after
+        self.total_lines = total_lines
+        self.last = -1    # last line yielded
+        self.until = -1   # the previous match's context runs through this line
+
+    def segments(self, matches: Iterable[int]) -> Iterator[Optional[Tuple[int, int, bool]]]:
+        """Yield (first, end, is_match) for runs of lines first..end-1, and None
+        between groups of lines that are not adjacent."""
+        pending = None   # the run being extended, as [first, end, is_match]
+        for match in matches:
+            if match <= self.last:
+                continue
+            items = []
+            stop = min(self.until, match - 1) + 1
+            if stop > self.last + 1:
+                items.append((self.last + 1, stop, False))
+                self.last = stop - 1
+            start = max(self.last + 1, match - self.before)
+            if self.last >= 0 and start > self.last + 1:
+                items.append(None)
+            if start < match:
+                items.append((start, match, False))
+            items.append((match, match + 1, True))
+            self.last = match
+            self.until = min(self.total_lines - 1, match + self.after)
+            for item in items:
+                if pending is not None and item is not None and (pending[1], pending[2]) == (item[0], item[2]):
+                    pending[1] = item[1]
+                    continue
+                if pending is not None:
+                    yield tuple(pending)
+                    pending = None
+                if item is None:
+                    yield None
+                else:
+                    pending = list(item)
+        if pending is not None:
+            yield tuple(pending)
+
+    def finish_segments(self) -> Iterator[Tuple[int, int, bool]]:
+        if self.until > self.last:
+            yield self.last + 1, self.until + 1, False
+            self.last = self.until
+
+    def add(self, matches: Iterable[int]) -> Iterator[Optional[Tuple[int, bool]]]:
+        """Yield (line, is_match) pairs, and None between groups of lines that are not adjacent."""
+        return _lines(self.segments(matches))
+
+    def finish(self) -> Iterator[Tuple[int, bool]]:
+        return _lines(self.finish_segments())
+
+
+def _lines(segments) -> Iterator[Optional[Tuple[int, bool]]]:
+    for segment in segments:
+        if segment is None:
+            yield None
+            continue
+        first, end, is_match = segment
+        for line in range(first, end):
+            yield line, is_match
+
+
+class Output:
+    """Writes result lines as text (grep style), a JSON array, or NDJSON."""
+
+    def __init__(self, stream, fmt: str = 'text', line_numbers: bool = False,
+                 file_names: bool = False):
+        self.stream = stream
+        self.format = fmt
+        self.line_numbers = line_numbers
+        self.file_names = file_names
+        self.records = 0
+
+    def line(self, name: str, line_number: int, data: bytes, is_match: bool = True) -> None:
+        if self.format == 'text':
+            mark = b':' if is_match else b'-'
+            prefix = b''
+            if self.file_names:
+                prefix += os.fsencode(name) + mark
+            if self.line_numbers:
+                prefix += b'%d' % (line_number + 1) + mark
+            self.stream.write(prefix + data + b'\n')
+            return
+        self.record({'file': name, 'line': line_number + 1,
+                     'text': data.decode('utf-8', errors='replace'),
+                     'type': 'match' if is_match else 'context'})
+
+    def separator(self) -> None:
+        if self.format == 'text':
+            self.stream.write(b'--\n')
+
+    def count(self, name: str, count: int) -> None:
+        if self.format == 'text':
+            prefix = os.fsencode(name) + b':' if self.file_names else b''
+            self.stream.write(prefix + b'%d\n' % count)
+            return
+        self.record({'file': name, 'count': count})
+
+    def record(self, record: dict) -> None:
+        import json
+        data = json.dumps(record, ensure_ascii=False).encode('utf-8')
+        if self.format == 'json':
+            data = (b'[' if not self.records else b',\n') + data
+        else:
+            data += b'\n'
+        self.stream.write(data)
+        self.records += 1
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+    def close(self) -> None:
+        if self.format == 'json':
+            self.stream.write(b']\n' if self.records else b'[]\n')
+        self.stream.flush()
+
+
+class ExportResult(NamedTuple):
+    """What an export wrote: matching lines, all lines, and the bytes of the file they span."""
+    matches: int
+    lines: int
+    bytes: int
+    cancelled: bool = False
+
+
+def export_format(path: str, fmt: Optional[str] = None,
+                  compress: Optional[bool] = None) -> Tuple[str, bool]:
+    """The (format, compress) of an export to path; unset ones follow its extension.
+
+    "matches.ndjson.gz" is gzipped NDJSON; anything not ending in .ndjson
+    or .jsonl (before any .gz) is text.
+    """
+    name = path.lower()
+    if compress is None:
+        compress = name.endswith('.gz')
+    if name.endswith('.gz'):
+        name = name[:-3]
+    if fmt is None:
+        fmt = 'ndjson' if name.endswith(('.ndjson', '.jsonl')) else 'text'
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    return fmt, compress
+
+
+def open_export(path: str, compress: bool = False):
+    """A buffered binary stream writing to path, through gzip if compress."""
+    if not compress:
+        return open(path, 'wb', buffering=WRITE_BUFFER)
+    import gzip
+    import io
+    return io.BufferedWriter(gzip.open(path, 'wb', compresslevel=GZIP_LEVEL), WRITE_BUFFER)
+
+
+def export_lines(view, matches: Iterable[int], stream, fmt: str = 'text', before: int = 0,
+                 after: int = 0, numbered: bool = False, name: str = '',
+                 cancel=None, progress: Optional[Callable[[int, int], None]] = None) -> ExportResult:
+    """Write the lines in matches (sorted line numbers) and their context from a LogProcessor view.
+
+    Groups of lines that are not adjacent are separated by "--" when
+    context is asked for, as grep does.  progress(bytes, total) reports
+    how far into the file the export is.  Stops early once cancel is set.
+    """
+    total_lines = view.total_lines
+    context = ContextLines(before, after, total_lines)
+    segments = context.segments(line for line in matches if line < total_lines)
+    if before or after:
+        segments = _chain(segments, context.finish_segments())
+    else:
+        segments = (segment for segment in segments if segment is not None)
+    tally = _Tally(view.line_index.offsets, total_lines, cancel, progress)
+    if fmt == 'text' and not numbered:
+        _copy_runs(view, tally.count(segments), stream)
+    else:
+        _write_lines(view, tally.count(segments), Output(stream, fmt, numbered), name)
+    if progress and not tally.cancelled:
+        progress(tally.end_byte, tally.end_byte)
+    return ExportResult(tally.matches, tally.lines, tally.bytes, tally.cancelled)
+
+
+def _chain(*iterables):
+    for iterable in iterables:
+        yield from iterable
+
+
+class _Tally:
+    """Counts the segments passing through count(), which ends early once cancelled."""
+
+    def __init__(self, offsets, total_lines: int, cancel, progress):
+        self.offsets = offsets
+        self.end_byte = offsets[total_lines]
+        self.cancel = cancel
+        self.progress = progress
+        self.matches = self.lines = self.bytes = 0
+        self.cancelled = False
+
+    def count(self, segments):
+        offsets = self.offsets
+        reported = 0
+        for segment in segments:
+            if self.cancel is not None and self.cancel.cancelled:
+                self.cancelled = True
+                return
+            if segment is not None:
+                first, end, is_match = segment
+                self.lines += end - first
+                if is_match:
+                    self.matches += end - first
+                self.bytes += offsets[end] - offsets[first]
+                if self.progress and offsets[end] - reported >= PROGRESS_BYTES:
+                    reported = offsets[end]
+                    self.progress(reported, self.end_byte)
+            yield segment
+
+
+def _copy_runs(view, segments, stream) -> None:
+    """Copy runs of adjacent lines from the map as single byte ranges."""
+    file_map = view.file_map
+    offsets = view.line_index.offsets
+    end_byte = offsets[view.total_lines]
+    # The last line has no newline yet if it is still being written
+    unterminated = view.line_index.partial and end_byte == view.file_size
+    
+    def copy(start: int, stop: int) -> None:
+        for pos in range(start, stop, COPY_BYTES):
+            stream.write(file_map[pos:min(stop, pos + COPY_BYTES)])
+        if stop == end_byte and stop > start and unterminated:
+            stream.write(b'\n')
+    
+    start = stop = 0   # byte range waiting to be copied
+    for segment in segments:
+        if segment is None:
+            copy(start, stop)
+            start = stop
+            stream.write(b'--\n')
+            continue
+        first, end, _ = segment
+        if offsets[first] != stop:
+            copy(start, stop)
+            start = offsets[first]
+        stop = offsets[end]
+        if stop - start >= COPY_BYTES:
+            copy(start, stop)
+            start = stop
+    copy(start, stop)
+
+
+def _write_lines(view, segments, out: Output, name: str) -> None:
+    """Write each line of the runs through out, reading COPY_LINES lines at a time."""
+    file_map = view.file_map
+    offsets = view.line_index.offsets
+    for segment in segments:
+        if segment is None:
+            out.separator()
+            continue
+        first, end, is_match = segment
+        for block in range(first, end, COPY_LINES):
+            block_end = min(end, block + COPY_LINES)
+            data = file_map[offsets[block]:offsets[block_end]]
+            for line, text in enumerate(data.split(b'\n')[:block_end - block], block):
+                out.line(name, line, text, is_match)
+    out.flush()
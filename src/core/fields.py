@@ -0,0 +1,321 @@
+import re
+from array import array
+from collections import Counter
+from itertools import compress
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from src.core.line_index import typecode_for
+from src.core.workers import map_file
+
+# Distinct values a field may take before it is dropped as free text (ids,
+# durations, messages); the rest are stored as one- or two-byte codes.
+MAX_VALUES = 65535
+
+# Columns kept at most; further key=value keys are ignored.
+MAX_FIELDS = 32
+
+LEVELS = (b'TRACE', b'DEBUG', b'INFO', b'NOTICE', b'WARN', b'WARNING', b'ERROR', b'SEVERE',
+          b'FATAL', b'CRITICAL')
+
+# Level anywhere in the line, then an optional [thread] and an optional
+# "component:" or "component -" right after it
+DEFAULT_PATTERN = (rb'\b(?P<level>' + b'|'.join(LEVELS) + rb')\b'
+                   rb'(?:\s+\[(?P<thread>[^\]]+)\])?'
+                   rb'(?:\s+(?P<component>[\w.$/-]+)(?::|\s+-)\s)?')
+
+_KEY_VALUE = re.compile(rb'(?<![\w.=-])([A-Za-z_][\w.-]*)=("[^"]*"|[^\s,;"]+)')
+_PLACEHOLDER = re.compile(r'\{(\w*)\}')
+
+
+class FieldFormat:
+    """Named groups of a regex, plus optionally key=value pairs, taken as fields of a line."""
+
+    def __init__(self, name: str, pattern: Optional[bytes], key_values: bool = False):
+        self.name = name
+        self.regex = re.compile(pattern) if pattern is not None else None
+        self.key_values = key_values
+        if self.regex is not None and not self.regex.groupindex:
+            raise ValueError("A field pattern needs named groups, such as (?P<level>\\w+)")
+
+    @property
+    def fields(self) -> List[str]:
+        """The fields named by the pattern (key=value fields are found in the lines)."""
+        return list(self.regex.groupindex) if self.regex is not None else []
+
+    def extract(self, line: bytes) -> Dict[str, bytes]:
+        values = {}
+        if self.key_values and b'=' in line:
+            for key, value in _KEY_VALUE.findall(line):
+                values[key.decode('utf-8', errors='replace')] = value.strip(b'"')
+        if self.regex is not None:
+            m = self.regex.search(line)
+            if m is not None:
+                values.update((name, value) for name, value in m.groupdict().items()
+                              if value is not None)
+        return values
+
+
+def template_format(template: str) -> FieldFormat:
+    """Build a FieldFormat from a line template such as "{time} {level} [{thread}] {logger}: {message}".
+
+    Each ``{name}`` becomes a field; ``{}`` skips a part without keeping it.
+    Spaces match any run of whitespace, everything else matches itself.
+    The last placeholder takes the rest of the line; the others stop at
+    the text that follows them (or the next space).
+    """
+    pattern = b'^'
+    pos = 0
+    placeholders = list(_PLACEHOLDER.finditer(template))
+    if not placeholders:
+        raise ValueError("A field template needs {name} placeholders")
+    for i, m in enumerate(placeholders):
+        pattern += _template_literal(template[pos:m.start()])
+        last = i == len(placeholders) - 1
+        follows = template[m.end():placeholders[i + 1].start() if not last else len(template)]
+        if last and not follows:
+            body = rb'.*'
+        elif follows[:1] in ('', ' '):
+            body = rb'\S+'
+        else:
+            body = rb'.+?'
+        name = m.group(1).encode('ascii')
+        pattern += b'(?P<' + name + b'>' + body + b')' if name else b'(?:' + body + b')'
+        pos = m.end()
+    pattern += _template_literal(template[pos:])
+    return FieldFormat(template, pattern)
+
+
+def _template_literal(text: str) -> bytes:
+    return b''.join(rb'\s+' if part == ' ' else re.escape(part).encode('utf-8')
+                    for part in re.split(r'( )', re.sub(r' +', ' ', text)) if part)
+
+
+def resolve_field_format(field_format: Optional[str]) -> FieldFormat:
+    """Map None/'auto', a line template, or a regex with named groups to a FieldFormat.
+
+    'auto' finds the level, thread and component of common log layouts
+    and every key=value pair; a template or regex gives exactly its fields.
+    """
+    if not field_format or field_format == 'auto':
+        return FieldFormat('auto', DEFAULT_PATTERN, key_values=True)
+    if '(?P<' in field_format:
+        return FieldFormat(field_format, field_format.encode('utf-8'))
+    return template_format(field_format)
+
+
+def extract_range(buf, start: int, end: int, fmt: FieldFormat) -> Tuple[int, Dict[str, tuple]]:
+    """Pool task: the fields of the lines in buf[start:end], which ends after a newline.
+
+    Returns (line count, {field: (values, codes)}), where codes holds one
+    entry per line, 0 for lines without the field and i + 1 for values[i].
+    A field with more than MAX_VALUES values in the range comes back as
+    None: it is free text, not worth a column.
+    """
+    lines = buf[start:end].split(b'\n')
+    if lines and not lines[-1]:
+        lines.pop()
+    count = len(lines)
+    columns: Dict[str, list] = {}
+    dropped = set()
+    extract = fmt.extract
+    for i, line in enumerate(lines):
+        for name, value in extract(line).items():
+            column = columns.get(name)
+            if column is None:
+                if name in dropped or len(columns) >= MAX_FIELDS:
+                    continue
+                column = columns[name] = [{}, array('B', bytes(count))]
+            codes_by_value = column[0]
+            code = codes_by_value.get(value)
+            if code is None:
+                if len(codes_by_value) >= MAX_VALUES:
+                    del columns[name]
+                    dropped.add(name)
+                    continue
+                code = codes_by_value[value] = len(codes_by_value) + 1
+                if code == 256:
+                    column[1] = array('H', column[1])
+            column[1][i] = code
+    result = {name: (list(codes_by_value), codes) for name, (codes_by_value, codes) in columns.items()}
+    result.update((name, None) for name in dropped)
+    return count, result
+
+
+def extract_file_range(path: str, inode: int, size: int, start: int, end: int,
+                       fmt: FieldFormat) -> Tuple[int, Dict[str, tuple]]:
+    """Process-pool task: like extract_range, on a file mapped by the worker."""
+    return extract_range(map_file(path, inode, size), start, end, fmt)
+
+
+class Column:
+    """The values of one field for every covered line, dictionary-encoded.
+
+    ``codes`` has one byte per line while the field has at most 255
+    distinct values, two bytes per line after that; code 0 means the line
+    has no value for the field.
+    """
+
+    def __init__(self, name: str, lines: int = 0):
+        self.name = name
+        self.values: List[bytes] = [b'']
+        self.codes_by_value: Dict[bytes, int] = {}
+        self.codes = array('B', bytes(lines))
+        self.counts = [lines]
+
+    def append(self, values: Optional[List[bytes]], codes: Optional[array], count: int) -> bool:
+        """Add the codes of count more lines, in a range's own numbering; False on overflow."""
+        if values is None:
+            self.codes.frombytes(bytes(count * self.codes.itemsize))
+            self.counts[0] += count
+            return True
+        table = [0]
+        for value in values:
+            code = self.codes_by_value.get(value)
+            if code is None:
+                if len(self.values) > MAX_VALUES:
+                    return False
+                code = self.codes_by_value[value] = len(self.values)
+                self.values.append(value)
+                self.counts.append(0)
+            table.append(code)
+        if len(self.values) > 256 and self.codes.typecode == 'B':
+            self.codes = array('H', self.codes)
+        if self.codes.typecode == 'B' and codes.typecode == 'B':
+            # Both sides fit a byte: renumber in C
+            added = array('B', codes.tobytes().translate(bytes(table).ljust(256, b'\0')))
+        else:
+            added = array(self.codes.typecode, map(table.__getitem__, codes))
+        self.codes.extend(added)
+        for code, n in Counter(added).items():
+            self.counts[code] += n
+        return True
+
+    def mask(self, values: Set[bytes]) -> bytes:
+        """One byte per line: 1 where the line has one of values, else 0."""
+        wanted = {self.codes_by_value[v] for v in values if v in self.codes_by_value}
+        if self.codes.typecode == 'B':
+            return self.codes.tobytes().translate(bytes(code in wanted for code in range(256)))
+        return bytes(code in wanted for code in self.codes)
+
+    def value_counts(self, mask: Optional[bytes] = None) -> List[Tuple[str, int]]:
+        """(value, lines) pairs, most frequent first, counting lines selected by mask."""
+        if mask is None:
+            counts = enumerate(self.counts)
+        else:
+            counts = Counter(compress(self.codes, mask)).items()
+        pairs = [(self.values[code].decode('utf-8', errors='replace'), n)
+                 for code, n in counts if code and n]
+        pairs.sort(key=lambda pair: (-pair[1], pair[0]))
+        return pairs
+
+
+def _and(a: bytes, b: bytes) -> bytes:
+    return (int.from_bytes(a, 'little') & int.from_bytes(b, 'little')).to_bytes(len(a), 'little')
+
+
+def parse_filter(text: str) -> Dict[str, Set[str]]:
+    """Parse "level=ERROR AND component=db" into {'level': {'ERROR'}, 'component': {'db'}}.
+
+    Terms are joined by AND (or just spaces); ``level=ERROR,WARN`` accepts
+    either value.  Values may be quoted to hold spaces.
+    """
+    filters: Dict[str, Set[str]] = {}
+    for term in re.findall(r'[^\s"]*(?:"[^"]*"[^\s"]*)*', text):
+        if not term or term.upper() == 'AND':
+            continue
+        name, sep, values = term.partition('=')
+        if not sep or not name:
+            raise ValueError(f"Expected field=value, got: {term}")
+        filters.setdefault(name, set()).update(v.strip('"') for v in values.split(','))
+    return filters
+
+
+class FieldIndex:
+    """Columns of structured fields over the first covered_lines lines of a file.
+
+    Facet counts and field filters are answered from the columns, without
+    reading the text again.  Fields whose values turn out to be free text
+    are listed in ``dropped`` instead.
+    """
+
+    def __init__(self, fmt: FieldFormat):
+        self.format = fmt
+        self.columns: Dict[str, Column] = {}
+        self.dropped: Set[str] = set()
+        self.covered_lines = 0
+        # End offset of the covered lines
+        self.size = 0
+
+    @property
+    def fields(self) -> List[str]:
+        return list(self.columns)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(c.codes) * c.codes.itemsize for c in self.columns.values())
+
+    def append(self, count: int, columns: Dict[str, tuple], size: int) -> None:
+        """Add the result of extract_range for the count lines after covered_lines, up to size."""
+        for name, column in columns.items():
+            if name in self.dropped:
+                continue
+            if name not in self.columns:
+                if len(self.columns) >= MAX_FIELDS:
+                    continue
+                self.columns[name] = Column(name, self.covered_lines)
+            if column is None or not self.columns[name].append(*column, count):
+                del self.columns[name]
+                self.dropped.add(name)
+        for name, column in self.columns.items():
+            if name not in columns:
+                column.append(None, None, count)
+        self.covered_lines += count
+        self.size = size
+
+    def truncate(self, lines: int, size: int) -> None:
+        """Forget the lines from lines on (which start at size), to parse them again."""
+        for column in self.columns.values():
+            for code in column.codes[lines:]:
+                column.counts[code] -= 1
+            del column.codes[lines:]
+        self.covered_lines = min(self.covered_lines, lines)
+        self.size = size
+
+    def mask(self, filters: Dict[str, Iterable[str]]) -> Optional[bytes]:
+        """One byte per covered line, 1 where every filter holds; None without filters."""
+        result = None
+        for name, values in filters.items():
+            column = self.columns.get(name)
+            if column is None:
+                if name in self.dropped:
+                    raise ValueError(f"Field {name} has too many values to filter on")
+                return bytes(self.covered_lines)
+            mask = column.mask({v.encode('utf-8') for v in values})
+            result = mask if result is None else _and(result, mask)
+        return result
+
+    def filter(self, filters: Dict[str, Iterable[str]]) -> array:
+        """Numbers of the covered lines matching every filter (values of a field are alternatives)."""
+        typecode = typecode_for(self.covered_lines)
+        mask = self.mask(filters)
+        if mask is None:
+            return array(typecode, range(self.covered_lines))
+        return array(typecode, (m.start() for m in re.finditer(b'\x01', mask)))
+
+    def count(self, filters: Dict[str, Iterable[str]]) -> int:
+        mask = self.mask(filters)
+        return self.covered_lines if mask is None else mask.count(1)
+
+    def facets(self, filters: Optional[Dict[str, Iterable[str]]] = None,
+               limit: Optional[int] = None) -> Dict[str, List[Tuple[str, int]]]:
+        """Per field, (value, lines) pairs among the lines matching filters, most frequent first.
+
+        As in a facet sidebar, a field's own filter is left out of its
+        counts, so its other values can still be picked.
+        """
+        filters = filters or {}
+        result = {}
+        for name, column in self.columns.items():
+            others = {field: values for field, values in filters.items() if field != name}
+            result[name] = column.value_counts(self.mask(others))[:limit]
+        return result
@@ -0,0 +1,243 @@
+import os
+import mmap
+import struct
+import sys
+import zlib
+import hashlib
+from array import array
+from typing import List, Optional
+
+from src.core.line_index import LineIndex
+
+CACHE_DIR_ENV = 'LOGEXPLORER_CACHE_DIR'
+
+# Bytes hashed at each end of the file to tell a rewritten file from the
+# one an index was built for without reading the whole thing.
+CHECK_BYTES = 64 * 1024
+
+_MAGIC = b'LXIDX\x00\x04\x00'
+# magic, payload typecode, flag, dev, inode, size, mtime_ns, head crc,
+# tail crc, payload length, payload crc (see _payload_crc), header crc
+_HEADER = struct.Struct('<8s1s?QQQqIIQII')
+
+
+def default_cache_dir() -> str:
+    """Return the per-user directory where sidecar indexes are kept."""
+    path = os.environ.get(CACHE_DIR_ENV)
+    if path:
+        return path
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'logexplorer')
+
+
+# Pages of a payload checksummed when an entry is loaded: its head, its
+# tail and evenly spaced pages between, so loading the index of a huge
+# file reads a few hundred KB of it rather than all of it.
+PAYLOAD_SAMPLES = 64
+PAYLOAD_SAMPLE_BYTES = 4096
+
+
+def _crc(buf, start: int, end: int) -> int:
+    return zlib.crc32(buf[start:end]) if end > start else 0
+
+
+def _payload_crc(payload) -> int:
+    """CRC of the sampled pages of payload (all of it, if it is small)."""
+    length = len(payload)
+    if length <= PAYLOAD_SAMPLES * PAYLOAD_SAMPLE_BYTES:
+        return zlib.crc32(payload)
+    step = (length - PAYLOAD_SAMPLE_BYTES) // (PAYLOAD_SAMPLES - 1)
+    crc = 0
+    for start in range(0, step * PAYLOAD_SAMPLES, step):
+        start = min(start, length - PAYLOAD_SAMPLE_BYTES)
+        crc = zlib.crc32(payload[start:start + PAYLOAD_SAMPLE_BYTES], crc)
+    return crc
+
+
+class FileIdentity:
+    """Stat and content fingerprint used to key and validate cache entries."""
+
+    def __init__(self, path: str, dev: int, inode: int, size: int, mtime_ns: int,
+                 head_crc: int, tail_crc: int):
+        self.path = path
+        self.dev = dev
+        self.inode = inode
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.head_crc = head_crc
+        self.tail_crc = tail_crc
+
+    @classmethod
+    def from_buffer(cls, path: str, buf, size: int) -> 'FileIdentity':
+        st = os.stat(path)
+        return cls(os.path.realpath(path), st.st_dev, st.st_ino, size, st.st_mtime_ns,
+                   _crc(buf, 0, min(CHECK_BYTES, size)),
+                   _crc(buf, max(0, size - CHECK_BYTES), size))
+
+    @property
+    def key(self) -> str:
+        return hashlib.sha1(self.path.encode('utf-8', 'surrogateescape')).hexdigest()
+
+    def is_prefix_of(self, other: 'FileIdentity', buf) -> bool:
+        """True if other is this same file, unchanged up to this identity's size."""
+        if (self.dev, self.inode) != (other.dev, other.inode) or self.size > other.size:
+            return False
+        if self.size == other.size:
+            return (self.mtime_ns, self.head_crc, self.tail_crc) == \
+                   (other.mtime_ns, other.head_crc, other.tail_crc)
+        return (self.head_crc == _crc(buf, 0, min(CHECK_BYTES, self.size)) and
+                self.tail_crc == _crc(buf, max(0, self.size - CHECK_BYTES), self.size))
+
+
+class IndexCache:
+    """On-disk LRU cache of per-file indexes, memory-mapped when reused.
+
+    Entries are keyed by the file's real path and the kind of index, and
+    validated against the file's device, inode, size, mtime and head/tail
+    checksums.  A file that only grew reuses its cached prefix.  Setting
+    ``max_bytes`` to 0 disables writing new entries.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = 1024 ** 3,
+                 min_file_size: int = 16 * 1024 * 1024):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.min_file_size = min_file_size
+
+    def entry_path(self, identity: FileIdentity, kind: str = 'lines') -> str:
+        return os.path.join(self.cache_dir, f"{identity.key}.{kind}")
+
+    def load(self, identity: FileIdentity, buf,
+             backend: Optional[str] = None) -> Optional[LineIndex]:
+        """Return the cached index for a file, possibly covering only a prefix.
+
+        Stale or corrupt entries (whose header checksum, payload page
+        checksums or end offsets are wrong) are removed and None is returned.
+        """
+        entry = self.read_entry(identity, 'lines', buf)
+        if entry is None:
+            return None
+        cached_identity, typecode, partial, payload = entry
+        offsets = None
+        if typecode in ('I', 'L', 'Q') and len(payload) and not len(payload) % array(typecode).itemsize:
+            offsets = payload.cast(typecode)
+        # Only pages of the payload are checksummed; the ends must at least fit the file
+        if offsets is None or offsets[0] != 0 or offsets[-1] > cached_identity.size:
+            self._remove(self.entry_path(identity, 'lines'))
+            return None
+        index = LineIndex(backend)
+        index.offsets = offsets
+        index.size = cached_identity.size
+        index.partial = partial
+        return index
+
+    def store(self, identity: FileIdentity, index: LineIndex) -> None:
+        """Write an index for the file described by identity."""
+        offsets = index.offsets
+        typecode = offsets.typecode if hasattr(offsets, 'typecode') else offsets.format
+        self.write_entry(identity, 'lines', typecode, index.partial,
+                         [memoryview(offsets).cast('B')])
+
+    def read_entry(self, identity: FileIdentity, kind: str, buf):
+        """Map a cache entry built for this file or a prefix of it.
+
+        Returns (cached identity, typecode, flag, payload memoryview), or
+        None after removing a stale or corrupt entry.
+        """
+        path = self.entry_path(identity, kind)
+        try:
+            with open(path, 'rb') as f:
+                cache_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        cached = self._read_header(cache_map)
+        payload = memoryview(cache_map)[_HEADER.size:]
+        if (cached is None or not cached[0].is_prefix_of(identity, buf) or
+                _payload_crc(payload) != cached[3]):
+            payload.release()
+            cache_map.close()
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)  # mtime doubles as the LRU timestamp
+        except OSError:
+            pass
+        cached_identity, typecode, flag, _ = cached
+        return cached_identity, typecode, flag, payload
+
+    def _read_header(self, cache_map):
+        if len(cache_map) < _HEADER.size:
+            return None
+        (magic, typecode, flag, dev, inode, size, mtime_ns, head_crc, tail_crc,
+         length, payload_crc, header_crc) = _HEADER.unpack_from(cache_map)
+        if magic != _MAGIC or header_crc != zlib.crc32(cache_map[:_HEADER.size - 4]):
+            return None
+        if len(cache_map) != _HEADER.size + length:
+            return None
+        identity = FileIdentity(None, dev, inode, size, mtime_ns, head_crc, tail_crc)
+        return identity, typecode.decode('ascii', 'replace'), flag, payload_crc
+
+    def write_entry(self, identity: FileIdentity, kind: str, typecode: str, flag: bool,
+                    payload: List, data_size: Optional[int] = None) -> None:
+        """Atomically write a cache entry made of the given buffers.
+
+        data_size is the amount of data the entry indexes, compared against
+        min_file_size; it defaults to the file's size, but differs for
+        compressed files.
+        """
+        if data_size is None:
+            data_size = identity.size
+        if self.max_bytes <= 0 or data_size < self.min_file_size:
+            return
+        length = sum(memoryview(part).nbytes for part in payload)
+
+        path = self.entry_path(identity, kind)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, 'w+b') as f:
+                f.seek(_HEADER.size)
+                for part in payload:
+                    f.write(part)
+                f.flush()
+                # The payload crc samples the payload as written, across parts
+                with mmap.mmap(f.fileno(), 0) as written:
+                    with memoryview(written) as view:
+                        payload_crc = _payload_crc(view[_HEADER.size:])
+                header = _HEADER.pack(_MAGIC, typecode.encode('ascii'), flag, identity.dev,
+                                      identity.inode, identity.size, identity.mtime_ns,
+                                      identity.head_crc, identity.tail_crc, length, payload_crc, 0)
+                f.seek(0)
+                f.write(header[:-4] + struct.pack('<I', zlib.crc32(header[:-4])))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self._remove(tmp_path)
+            print(f"Error writing index cache: {e}", file=sys.stderr)
+            return
+        self._evict(keep=path)
+
+    def _evict(self, keep: str) -> None:
+        """Delete least recently used entries until the cache fits max_bytes."""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, entry.path))
+            total += st.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path != keep:
+                self._remove(path)
+                total -= size
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,174 @@
+import re
+import time
+from array import array
+from bisect import bisect_right
+from importlib.util import find_spec
+from typing import Callable, Iterable, Optional, Tuple
+
+# NumPy is an optional accelerator.  It is imported on first use, since
+# importing it takes longer than indexing a small file.
+HAVE_NUMPY = find_spec('numpy') is not None
+np = None
+
+# Below this many bytes an automatically chosen NumPy backend scans with
+# the array backend, so small files never pay for the import.
+NUMPY_MIN_BYTES = 1024 * 1024
+
+# Bytes scanned per step; large enough to amortize per-call overhead,
+# small enough to keep progress callbacks responsive.
+BLOCK_SIZE = 16 * 1024 * 1024
+
+_NEWLINE = re.compile(b'\n')
+_NARROW = 'I' if array('I').itemsize == 4 else 'L'
+_WIDE = 'Q'
+
+
+def _numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
+
+
+def typecode_for(size: int) -> str:
+    """Return the narrowest array typecode able to hold offsets up to size."""
+    return _NARROW if size < 2 ** 32 else _WIDE
+
+
+class LineIndex:
+    """Packed index of line start offsets.
+
+    ``offsets`` holds the start of every line followed by an end sentinel, so
+    line ``i`` spans ``offsets[i]:offsets[i + 1]`` (newline included).  A
+    trailing newline does not start an extra empty line.
+    """
+
+    def __init__(self, backend: Optional[str] = None):
+        self.auto_backend = backend is None
+        if backend is None:
+            backend = 'numpy' if HAVE_NUMPY else 'array'
+        if backend == 'numpy' and not HAVE_NUMPY:
+            raise ValueError("NumPy backend requested but NumPy is not installed")
+        if backend not in ('numpy', 'array'):
+            raise ValueError(f"Unknown index backend: {backend}")
+        self.backend = backend
+        self.offsets = array(_NARROW, [0])
+        self.size = 0
+        self.partial = False  # True when the last line has no newline yet
+        self.build_seconds = 0.0
+
+    @property
+    def line_count(self) -> int:
+        return len(self.offsets) - 1
+
+    def __len__(self) -> int:
+        return self.line_count
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.offsets) * self.offsets.itemsize
+
+    @property
+    def throughput(self) -> float:
+        """Indexing throughput in GB/s of the last build or extension."""
+        if self.build_seconds <= 0:
+            return 0.0
+        return self.size / self.build_seconds / 1e9
+
+    def build(self, buf, size: int,
+              progress: Optional[Callable[[int, int], None]] = None) -> None:
+        """Index buf[0:size] from scratch."""
+        self.offsets = array(typecode_for(size), [0])
+        self.size = 0
+        self.partial = False
+        self.extend(buf, size, progress)
+
+    def extend(self, buf, new_size: int,
+               progress: Optional[Callable[[int, int], None]] = None) -> None:
+        """Index the bytes appended between the current size and new_size."""
+        if new_size < self.size:
+            raise ValueError("Cannot extend an index to a smaller size")
+        started = time.perf_counter()
+        if not isinstance(self.offsets, array):
+            # Offsets loaded from a memory-mapped cache are read-only.
+            offsets = array(self.offsets.format)
+            offsets.frombytes(self.offsets.cast('B'))
+            self.offsets = offsets
+        if typecode_for(new_size) != self.offsets.typecode:
+            self.offsets = array(typecode_for(new_size), self.offsets)
+        # While the last line is unfinished, new offsets are collected apart
+        # and replace its end in one step, so concurrent readers never miss it
+        offsets = self.offsets
+        out = array(offsets.typecode) if self.partial else offsets
+
+        scan = self._scanner(new_size - self.size)
+        pos = self.size
+        while pos < new_size:
+            end = min(pos + BLOCK_SIZE, new_size)
+            scan(out, buf, pos, end)
+            pos = end
+            self.size = pos
+            if progress:
+                progress(pos, new_size)
+
+        partial = (out[-1] if out else offsets[-2]) != new_size
+        if partial:
+            out.append(new_size)
+        if out is not offsets:
+            offsets[-1:] = out
+        self.partial = partial
+        self.size = new_size
+        self.build_seconds = time.perf_counter() - started
+
+    def build_from_chunks(self, chunks: Iterable[bytes]) -> None:
+        """Index a stream of consecutive chunks, for data that cannot be mapped."""
+        started = time.perf_counter()
+        self.offsets = array(_NARROW, [0])
+        self.size = 0
+        self.partial = False
+        scan = self._scanner(NUMPY_MIN_BYTES)
+        for chunk in chunks:
+            if typecode_for(self.size + len(chunk)) != self.offsets.typecode:
+                self.offsets = array(typecode_for(self.size + len(chunk)), self.offsets)
+            scan(self.offsets, chunk, 0, len(chunk), self.size)
+            self.size += len(chunk)
+        if self.offsets[-1] != self.size:
+            self.offsets.append(self.size)
+            self.partial = True
+        self.build_seconds = time.perf_counter() - started
+
+    def _scanner(self, size: int) -> Callable:
+        if self.backend == 'numpy' and not (self.auto_backend and size < NUMPY_MIN_BYTES):
+            return self._scan_numpy
+        return self._scan_array
+
+    @staticmethod
+    def _scan_array(out: array, buf, start: int, end: int, base: int = 0) -> None:
+        if base:
+            out.extend(base + m.end() for m in _NEWLINE.finditer(buf, start, end))
+        else:
+            out.extend(m.end() for m in _NEWLINE.finditer(buf, start, end))
+
+    @staticmethod
+    def _scan_numpy(out: array, buf, start: int, end: int, base: int = 0) -> None:
+        np = _numpy()
+        view = np.frombuffer(buf, dtype=np.uint8, count=end - start, offset=start)
+        hits = np.flatnonzero(view == 10)
+        del view
+        if len(hits):
+            hits += base + start + 1
+            dtype = np.uint32 if out.itemsize == 4 else np.uint64
+            out.frombytes(hits.astype(dtype).tobytes())
+
+    def span(self, line_number: int) -> Tuple[int, int]:
+        """Return the (start, end) byte range of a line, excluding its newline."""
+        start = self.offsets[line_number]
+        end = self.offsets[line_number + 1]
+        if not (self.partial and line_number == self.line_count - 1):
+            end -= 1
+        return start, end
+
+    def line_at(self, offset: int) -> int:
+        """Return the number of the line containing byte offset."""
+        return bisect_right(self.offsets, offset, 0, self.line_count) - 1
@@ -1,127 +1,956 @@
 import os
-import re
 import mmap
-from typing import List, Dict, Optional, Tuple
-from concurrent.futures import ThreadPoolExecutor
+import sys
+import time
+import threading
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Iterator, List, Dict, NamedTuple, Optional, Tuple
+
+from src.core.compressed import (CompressedFile, compressed_ranges, detect_compression,
+                                 scan_compressed_range)
+from src.core.line_index import BLOCK_SIZE, LineIndex, typecode_for
+from src.core.index_cache import FileIdentity, IndexCache
+from src.core.query import Query
+from src.core.result_cache import ResultCache
+from src.core.search_engine import SearchPattern, scan_range
+from src.core.stats import Stats, profiled
+from src.core.workers import (CancelToken, byte_ranges, default_backend, get_pool,
+                               ordered_results, resolve_backend, scan_file_range, timed_task)
+
+if TYPE_CHECKING:
+    from src.core.export import ExportResult
+    from src.core.fields import FieldIndex
+    from src.core.timestamps import LineRange, TimestampIndex
+
+# Lines checked between progress reports when refining a result set.
+REFINE_CHUNK_LINES = 65536
+
+# Bytes indexed before a background open first reports progress; later
+# steps double up to the line index's block size.
+FIRST_INDEX_STEP = 1024 * 1024
+
+class SearchBatch(NamedTuple):
+    """Matching line numbers from one scanned range, with overall progress."""
+    line_numbers: array
+    bytes_scanned: int
+    total_bytes: int
+
+class FileChange(NamedTuple):
+    """Result of LogProcessor.refresh.
+
+    kind is 'unchanged', 'grown', 'truncated', 'rotated' or 'missing';
+    lines from first_line onwards are new or changed.
+    """
+    kind: str
+    first_line: int
+
+def _slice_lines(line_numbers, first_line: int, end_line: int, typecode: str) -> array:
+    """The sorted line numbers in [first_line, end_line), as an array of typecode."""
+    return array(typecode, line_numbers[bisect_left(line_numbers, first_line):
+                                        bisect_left(line_numbers, end_line)])
+
+def _compile_pattern(pattern: str, case_sensitive: bool, query: bool):
+    """A SearchPattern, or with query a Query (which raises ValueError if it does not parse)."""
+    return Query(pattern, case_sensitive) if query else SearchPattern(pattern, case_sensitive)
+
+def _task_args(item) -> tuple:
+    return tuple(item) if isinstance(item, tuple) else (item,)
+
+def _index_step(index: LineIndex, file_map, size: int, step: int) -> None:
+    """Extend index by about step bytes, ending after a newline so every line is complete."""
+    target = min(size, index.size + step)
+    if target < size:
+        newline = file_map.find(b'\n', target - 1)
+        target = newline + 1 if newline >= 0 else size
+    index.extend(file_map, target)
+
+def _release_map(file_map) -> None:
+    try:
+        file_map.close()
+    except BufferError:
+        pass  # still being scanned; freed once the last user drops it
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+class _SharedMap:
+    """Counts the readers holding a file's map, so it is closed after the last one.
+
+    A map replaced by a grown or reopened file, or by close(), is retired:
+    searches still scanning it finish on it, and the last one closes it.
+    """
+
+    def __init__(self, file_map):
+        self.file_map = file_map
+        self.users = 0
+        self.retired = False
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        """Count one more reader; False if the map is already closed."""
+        with self._lock:
+            if self.closed:
+                return False
+            self.users += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.users -= 1
+            self.closed = close = self.retired and not self.users
+        if close:
+            _release_map(self.file_map)
+
+    def retire(self) -> None:
+        with self._lock:
+            self.retired = True
+            self.closed = close = not self.users
+        if close:
+            _release_map(self.file_map)
+
+class FileView(NamedTuple):
+    """The open file as one reader sees it.
+
+    A LogProcessor publishes its map, line index and line count together
+    and replaces them as a whole when the file grows, is reopened or is
+    closed, so a reader that takes the view once never pairs an index with
+    the wrong map.  The line index may grow in place behind a view; the
+    lines below its total_lines keep their offsets.
+    """
+    file_map: object
+    raw_map: object
+    compressed: Optional[CompressedFile]
+    line_index: LineIndex
+    total_lines: int
+    file_size: int
+    file_identity: Optional[FileIdentity]
+    shared: Optional[_SharedMap]
+
+def _empty_view(index_backend: Optional[str]) -> FileView:
+    return FileView(None, None, None, LineIndex(index_backend), 0, 0, None, None)
+
+def _read_line(view: FileView, line_number: int, start: int = 0, end: Optional[int] = None) -> bytes:
+    if view.file_map is None or line_number < 0 or line_number >= view.total_lines:
+        return b""
+    line_start, line_end = view.line_index.span(line_number)
+    if end is not None:
+        line_end = min(line_end, line_start + end)
+    return view.file_map[line_start + start:line_end]
 
 class LogProcessor:
-    def __init__(self):
+    def __init__(self, index_backend: Optional[str] = None,
+                 index_cache: Optional[IndexCache] = None,
+                 search_backend: Optional[str] = None,
+                 max_workers: Optional[int] = None,
+                 ngram_index: bool = False,
+                 result_cache: Optional[ResultCache] = None,
+                 stats: Optional[Stats] = None):
+        self.file_path = None
         self.current_file = None
-        self.file_map = None
-        self.file_size = 0
-        self.line_offsets = []
-        self.total_lines = 0
+        self.index_backend = index_backend
+        self.index_cache = index_cache if index_cache is not None else IndexCache()
+        # The map, line index and line count, replaced as a whole (see FileView)
+        self._view = _empty_view(index_backend)
+        # Bytes whose lines are indexed; less than file_size while a
+        # background open is still indexing
+        self.indexed_bytes = 0
+        # Why a background index stopped short; the indexed lines stay
+        # readable, but the file is not complete
+        self.index_error: Optional[str] = None
+        self._index_token = None
+        self._index_thread = None
+        # 'thread', 'process', or 'auto' (processes for large files)
+        self.search_backend = search_backend or default_backend()
+        self.max_workers = max_workers
+        self._search_token = None
+        self.result_cache = result_cache if result_cache is not None else ResultCache()
+        self.timestamp_index = None
+        # Structured fields, extracted on demand by fields()
+        self.field_index = None
+        # Optional trigram index, built in the background after opening
+        self.ngram_enabled = ngram_index
+        self.ngram_index = None
+        self._ngram_token = None
+        self._ngram_ready = None
+        # Timings and counters, collected while stats.enabled is set
+        self.stats = stats if stats is not None else Stats()
+
+    @property
+    def file_map(self):
+        return self._view.file_map
+
+    @property
+    def raw_map(self):
+        """The mapped file itself; file_map is a CompressedFile over it for
+        gzip, bz2 and xz files, and the same map otherwise."""
+        return self._view.raw_map
+
+    @property
+    def compressed(self) -> Optional[CompressedFile]:
+        return self._view.compressed
 
-    def open_file(self, file_path: str) -> bool:
-        """Open a log file and prepare it for processing."""
+    @property
+    def line_index(self) -> LineIndex:
+        return self._view.line_index
+
+    @property
+    def total_lines(self) -> int:
+        return self._view.total_lines
+
+    @property
+    def file_size(self) -> int:
+        return self._view.file_size
+
+    @property
+    def file_identity(self) -> Optional[FileIdentity]:
+        return self._view.file_identity
+
+    @contextmanager
+    def reading(self) -> Iterator[FileView]:
+        """Take the current view, keeping its map open until the block ends.
+
+        For a run of reads that must all see the same file, and must not
+        fail halfway when another thread refreshes, reopens or closes it.
+        """
+        view = self._acquire()
         try:
-            if self.file_map:
-                self.file_map.close()
-            
-            self.current_file = open(file_path, 'rb')
-            self.file_size = os.path.getsize(file_path)
-            
+            yield view
+        finally:
+            self._release(view)
+
+    def _acquire(self) -> FileView:
+        while True:
+            view = self._view
+            # A map only closes once it is retired, after its view is replaced
+            if view.shared is None or view.shared.acquire():
+                return view
+
+    @staticmethod
+    def _release(view: FileView) -> None:
+        if view.shared is not None:
+            view.shared.release()
+
+    @property
+    def line_offsets(self):
+        """Packed array of line start offsets (plus the end sentinel)."""
+        return self.line_index.offsets
+
+    @property
+    def indexing(self) -> bool:
+        """True while a background open is still indexing the file."""
+        return self._index_token is not None
+
+    def open_file(self, file_path: str, background: bool = False,
+                  progress: Optional[Callable[[int, int], None]] = None) -> bool:
+        """Open a log file and prepare it for processing.
+
+        With background, a file without an up-to-date cached index is
+        indexed by a thread and the call returns at once.  Lines can be read
+        and searched as they are indexed (total_lines grows), and
+        progress(indexed_bytes, file_size) is called from that thread after
+        each step and when it stops; if indexing fails, index_error says why.
+        Compressed files are always indexed before returning.
+        """
+        try:
+            self.close()
+            with profiled('open'), self.stats.phase('open') as span:
+                self._open(file_path, background, progress)
+                span.bytes = self.file_size
+                span.lines = self.total_lines
             if self.file_size > 0:
-                self.file_map = mmap.mmap(self.current_file.fileno(), 0, access=mmap.ACCESS_READ)
-                self._index_lines()
                 return True
-            else:
-                self.current_file.close()
-                self.current_file = None
-                return False
+            self.close()
+            return False
         except Exception as e:
-            if self.current_file:
-                self.current_file.close()
-                self.current_file = None
-            print(f"Error opening file: {e}")
+            self.close()
+            print(f"Error opening file: {e}", file=sys.stderr)
             return False
 
-    def _index_lines(self) -> None:
-        """Create an index of line positions for fast access."""
-        self.line_offsets = [0]
-        self.file_map.seek(0)
+    def _open(self, file_path: str, background: bool = False,
+              progress: Optional[Callable[[int, int], None]] = None) -> None:
+        """Open and index a file; an empty file is opened but left unmapped."""
+        self.file_path = file_path
+        self.current_file = open(file_path, 'rb')
+        size = os.fstat(self.current_file.fileno()).st_size
+        if size == 0:
+            return
+        raw_map = mmap.mmap(self.current_file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = FileView(raw_map, raw_map, None, LineIndex(self.index_backend), 0, size,
+                        FileIdentity.from_buffer(file_path, raw_map, size), _SharedMap(raw_map))
+        # Published with no lines yet, so close() releases the map if indexing fails
+        self._view = view
+        fmt = detect_compression(raw_map)
+        if fmt is None:
+            self._index_lines(view, background, progress)
+        else:
+            self._index_compressed(view, fmt)
+        if self.ngram_enabled and not self.indexing:
+            self.start_ngram_index()
+
+    def refresh(self) -> FileChange:
+        """Pick up changes to the open file, for following a live log.
+
+        Appended bytes are mapped and indexed incrementally.  If the file
+        was truncated, rewritten, or replaced by rotation, it is reopened
+        from the start.  If the path has disappeared, the old contents are
+        kept until a new file shows up.  Nothing changes while the file is
+        still being indexed in the background.  Readers of the old map are
+        not disturbed: it is closed once the last of them is done.
+        """
+        if self.current_file is None or self.indexing:
+            return FileChange('unchanged', self.total_lines)
+        try:
+            st = os.stat(self.file_path)
+        except OSError:
+            return FileChange('missing', self.total_lines)
+        
+        view = self._view
+        current = os.fstat(self.current_file.fileno())
+        if (st.st_dev, st.st_ino) != (current.st_dev, current.st_ino):
+            return self._reopen('rotated')
+        if view.compressed is not None:
+            # A compressed file cannot be extended in place; any change to
+            # it means reading it again
+            if (st.st_size, st.st_mtime_ns) == (view.file_identity.size, view.file_identity.mtime_ns):
+                return FileChange('unchanged', view.total_lines)
+            return self._reopen('truncated')
+        if st.st_size < view.file_size:
+            return self._reopen('truncated')
+        if st.st_size == view.file_size:
+            return FileChange('unchanged', view.total_lines)
         
-        pos = self.file_map.find(b'\n')
-        while pos != -1:
-            self.line_offsets.append(pos + 1)  # Position after newline
-            pos = self.file_map.find(b'\n', pos + 1)
+        new_map = mmap.mmap(self.current_file.fileno(), 0, access=mmap.ACCESS_READ)
+        new_size = len(new_map)
+        identity = FileIdentity.from_buffer(self.file_path, new_map, new_size)
+        if view.file_identity is not None and not view.file_identity.is_prefix_of(identity, new_map):
+            _release_map(new_map)
+            return self._reopen('truncated')
         
-        self.total_lines = len(self.line_offsets)
+        # A line that had no newline yet may have been completed
+        index = view.line_index
+        first_line = view.total_lines - 1 if index.partial else view.total_lines
+        index.extend(new_map, new_size)
+        self._view = FileView(new_map, new_map, None, index, index.line_count, new_size, identity,
+                              _SharedMap(new_map))
+        self.indexed_bytes = new_size
+        if view.shared is not None:
+            view.shared.retire()
+        return FileChange('grown', first_line)
+
+    def _reopen(self, kind: str) -> FileChange:
+        path = self.file_path
+        if self.file_identity is not None:
+            self.result_cache.invalidate(self.file_identity)
+        self.close()
+        try:
+            self._open(path)
+        except OSError as e:
+            self.close()
+            self.file_path = path
+            print(f"Error reopening file: {e}", file=sys.stderr)
+            return FileChange('missing', 0)
+        return FileChange(kind, 0)
+
+    def _index_lines(self, view: FileView, background: bool = False,
+                     progress: Optional[Callable[[int, int], None]] = None) -> None:
+        """Create an index of line positions for fast access, and publish the view with it.
+
+        A cached index is reused when the file is unchanged, and extended
+        over the appended bytes when the file has only grown.
+        """
+        with self.stats.phase('index_cache.load'):
+            index = self.index_cache.load(view.file_identity, view.file_map, self.index_backend)
+        self.stats.count('index_cache.miss' if index is None else 'index_cache.hit')
+        indexed = index.size if index is not None else 0
+        if background and indexed + FIRST_INDEX_STEP < view.file_size:
+            # More than a first step to go: index the rest in the background
+            self._start_indexer(view, index if index is not None else LineIndex(self.index_backend),
+                                progress)
+            return
+        if index is None:
+            index = LineIndex(self.index_backend)
+            with self.stats.phase('index') as span:
+                index.build(view.file_map, view.file_size)
+                span.bytes, span.lines = view.file_size, index.line_count
+            self.index_cache.store(view.file_identity, index)
+        elif index.size < view.file_size:
+            with self.stats.phase('index') as span:
+                span.bytes = view.file_size - index.size
+                index.extend(view.file_map, view.file_size)
+            self.index_cache.store(view.file_identity, index)
+        self._view = view._replace(line_index=index, total_lines=index.line_count)
+        self.indexed_bytes = view.file_size
+
+    def _start_indexer(self, view: FileView, index: LineIndex,
+                       progress: Optional[Callable[[int, int], None]]) -> None:
+        """Index the first lines now and the rest in a thread, publishing lines as it goes."""
+        started = time.perf_counter()
+        first_byte = index.size
+        first_line = index.line_count - 1 if index.partial else index.line_count
+        _index_step(index, view.file_map, view.file_size, FIRST_INDEX_STEP)
+        view = self._view = view._replace(line_index=index, total_lines=index.line_count)
+        self.indexed_bytes = index.size
+        token = self._index_token = CancelToken()
+        self._index_thread = threading.Thread(
+            target=self._index_rest, name='logexplorer-index', daemon=True,
+            args=(token, view, progress, started, first_byte, first_line))
+        self._index_thread.start()
+
+    def _index_rest(self, token: CancelToken, view: FileView,
+                    progress: Optional[Callable[[int, int], None]],
+                    started: float, first_byte: int, first_line: int) -> None:
+        # close() cancels and joins this thread before retiring the view's
+        # map, and refresh() leaves the file alone meanwhile, so the view
+        # is only ever replaced here
+        index, size = view.line_index, view.file_size
+        step = FIRST_INDEX_STEP
+        try:
+            while index.size < size:
+                step = min(step * 2, BLOCK_SIZE)
+                _index_step(index, view.file_map, size, step)
+                if token.cancelled:
+                    return
+                self._view = view._replace(total_lines=index.line_count)
+                self.indexed_bytes = index.size
+                if progress and index.size < size:
+                    progress(index.size, size)
+            index.build_seconds = time.perf_counter() - started
+            self.index_cache.store(view.file_identity, index)
+            if self.stats.enabled:
+                self.stats.record('index', index.build_seconds, size - first_byte,
+                                  index.line_count - first_line, started)
+        except Exception as e:
+            print(f"Error indexing file: {e}", file=sys.stderr)
+            self.index_error = str(e) or type(e).__name__
+        if token.cancelled:
+            return
+        self._index_token = None
+        if self.ngram_enabled and self.index_error is None:
+            self.start_ngram_index()
+        if progress:
+            progress(self.indexed_bytes, size)
+
+    def wait_indexed(self, timeout: Optional[float] = None) -> bool:
+        """Wait for a background open to finish indexing; True once the whole file is.
+
+        False if it timed out or indexing failed (see index_error).
+        """
+        thread = self._index_thread
+        if thread is not None:
+            thread.join(timeout)
+        return not self.indexing and self.index_error is None
+
+    def _index_compressed(self, view: FileView, fmt: str) -> None:
+        """Index the uncompressed lines of a gzip, bz2 or xz file.
+
+        The first open decompresses the whole file once; the segment table
+        saved alongside the line index lets later opens skip that.
+        """
+        cached = CompressedFile.load(self.index_cache, view.file_identity, view.raw_map, fmt,
+                                     self.index_backend)
+        self.stats.count('index_cache.miss' if cached is None else 'index_cache.hit')
+        if cached is not None:
+            source, index = cached
+        else:
+            source = CompressedFile(view.raw_map, fmt)
+            index = LineIndex(self.index_backend)
+            with self.stats.phase('index') as span:
+                source.build(index)
+                span.bytes, span.lines = source.size, index.line_count
+            source.save(self.index_cache, view.file_identity, index)
+        self._view = view._replace(file_map=source, compressed=source, line_index=index,
+                                   total_lines=index.line_count, file_size=source.size)
+        self.indexed_bytes = source.size
 
     def get_line(self, line_number: int) -> str:
         """Get a specific line by line number."""
-        if not self.file_map or line_number < 0 or line_number >= self.total_lines:
-            return ""
-        
-        start = self.line_offsets[line_number]
-        end = self.file_size if line_number == self.total_lines - 1 else self.line_offsets[line_number + 1] - 1
-        
-        self.file_map.seek(start)
-        line_bytes = self.file_map.read(end - start)
-        return line_bytes.decode('utf-8', errors='replace')
+        return self.get_line_bytes(line_number).decode('utf-8', errors='replace')
+
+    def get_line_bytes(self, line_number: int, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Get the raw bytes of a line, without its newline.
+
+        start and end select a slice of the line, so a part of a very long
+        line can be read without copying all of it.  Safe to call from any
+        thread, also while the file is refreshed, reopened or closed.
+        """
+        view = self._view
+        try:
+            return _read_line(view, line_number, start, end)
+        except ValueError:
+            # The map was closed under us; read from whatever replaced it
+            if self._view is view:
+                return b""
+            return _read_line(self._view, line_number, start, end)
+
+    def line_length(self, line_number: int) -> int:
+        """Length of a line in bytes, without its newline."""
+        view = self._view
+        if view.file_map is None or line_number < 0 or line_number >= view.total_lines:
+            return 0
+        start, end = view.line_index.span(line_number)
+        return end - start
 
     def get_lines(self, start_line: int, end_line: int) -> List[str]:
-        """Get a range of lines."""
-        if not self.file_map:
-            return []
+        """Get a range of lines, all read from the same view of the file."""
+        with self.reading() as view:
+            if view.file_map is None:
+                return []
+            start_line = max(0, start_line)
+            end_line = min(view.total_lines, end_line)
+            with self.stats.phase('get_lines') as span:
+                span.lines = max(0, end_line - start_line)
+                return [_read_line(view, i).decode('utf-8', errors='replace')
+                        for i in range(start_line, end_line)]
+
+    def search(self, pattern: str, case_sensitive: bool = False,
+               cancel: Optional[CancelToken] = None, start_line: int = 0,
+               end_line: Optional[int] = None, query: bool = False,
+               exclusive: bool = False) -> Optional[List[Tuple[int, str]]]:
+        """Search for a pattern (or with query, a boolean query) in the log file.
+
+        Other searches are left running unless ``exclusive`` (see iter_search).
+        Returns None if the search was cancelled, rather than the matches
+        found before it stopped.
+        """
+        cancel = cancel or CancelToken()
+        line_numbers = []
+        for batch in self.iter_search(pattern, case_sensitive, cancel, exclusive, start_line=start_line,
+                                      end_line=end_line, query=query):
+            line_numbers.extend(batch.line_numbers)
+        if cancel.cancelled:
+            return None
         
+        # Only lines that matched are ever decoded
+        return [(i, self.get_line(i)) for i in line_numbers]
+
+    def iter_search(self, pattern: str, case_sensitive: bool = False,
+                    cancel: Optional[CancelToken] = None,
+                    exclusive: bool = True, start_line: int = 0,
+                    end_line: Optional[int] = None, query: bool = False) -> Iterator[SearchBatch]:
+        """Search for a pattern, yielding matches in file order as they are found.
+
+        Every scanned range produces a batch, possibly empty, so callers can
+        report progress.  Only lines from ``start_line`` up to ``end_line``
+        are searched, which lets a followed file be searched only where it
+        grew.  Unless ``exclusive`` is False, starting a search cancels the
+        previous exclusive search on this processor.  With ``query``, the
+        pattern is a boolean query of several terms (see query.Query),
+        scanned for in one pass.  Searches may run in several threads at
+        once, alongside reads; each scans the view of the file it started
+        on to the end, even if the file is refreshed or closed meanwhile.
+        """
+        batches = self._iter_search(pattern, case_sensitive, cancel, exclusive, start_line, end_line,
+                                    query)
+        last = self.total_lines if end_line is None else min(end_line, self.total_lines)
+        return self.stats.timed('search', batches, lambda batch: batch.bytes_scanned,
+                                max(0, last - max(0, start_line)))
+
+    def _iter_search(self, pattern: str, case_sensitive: bool, cancel: Optional[CancelToken],
+                     exclusive: bool, start_line: int, end_line: Optional[int],
+                     query: bool = False) -> Iterator[SearchBatch]:
+        with self.reading() as view:
+            yield from self._search_view(view, pattern, case_sensitive, cancel, exclusive,
+                                         start_line, end_line, query)
+
+    def _search_view(self, view: FileView, pattern: str, case_sensitive: bool,
+                     cancel: Optional[CancelToken], exclusive: bool, start_line: int,
+                     end_line: Optional[int], query: bool) -> Iterator[SearchBatch]:
+        if end_line is None or end_line > view.total_lines:
+            end_line = view.total_lines
         start_line = max(0, start_line)
-        end_line = min(self.total_lines, end_line)
+        if view.file_map is None or not pattern or start_line >= end_line:
+            return
         
-        return [self.get_line(i) for i in range(start_line, end_line)]
-
-    def search(self, pattern: str, case_sensitive: bool = False) -> List[Tuple[int, str]]:
-        """Search for a pattern in the log file."""
-        if not self.file_map or not pattern:
-            return []
+        compiled_pattern = _compile_pattern(pattern, case_sensitive, query)
+        cancel = cancel or CancelToken()
+        if exclusive:
+            if self._search_token is not None:
+                self._search_token.cancel()
+            self._search_token = cancel
+        
+        line_index = view.line_index
+        offsets = line_index.offsets
+        typecode = typecode_for(view.total_lines)
+        found = array(typecode)
         
-        flags = 0 if case_sensitive else re.IGNORECASE
+        # Cached results (or, for a case-sensitive search, the case-insensitive
+        # superset to refine) answer the lines they cover without a scan.  Queries
+        # and negating regexes get no superset: a NOT term or [^a] can match
+        # fewer lines ignoring case.
+        key = ('query', pattern) if query else pattern
+        cached = self.result_cache.lookup(view.file_identity, view.raw_map, key, case_sensitive)
+        superset = None
+        if (cached is None and case_sensitive and not query and
+                compiled_pattern.ignoring_case_matches_more()):
+            superset = self.result_cache.lookup(view.file_identity, view.raw_map, pattern, False)
+        source = cached or superset
+        if self.stats.enabled:
+            self.stats.count('result_cache.hit' if cached is not None else
+                             'result_cache.superset' if superset is not None else 'result_cache.miss')
+        known_end = start_line
+        if source is not None:
+            known_end = max(start_line, min(end_line, source.covered_lines))
+        
+        # Lines before start_line come from the cache too when it has them,
+        # so the complete result can be stored again
+        keep = None
+        if start_line == 0:
+            keep = array(typecode)
+        elif cached is not None and cached.covered_lines >= start_line:
+            keep = _slice_lines(cached.line_numbers, 0, start_line, typecode)
+        
+        known_bytes = offsets[known_end] - offsets[start_line]
+        scan_from = offsets[known_end]
+        last_byte = offsets[end_line]
+        workers = self.max_workers or os.cpu_count() or 1
+        
+        # The trigram index, when ready, narrows the scan to candidate blocks
+        spans = None
+        ngram_index = self.ngram_index
+        if ngram_index is not None and scan_from < last_byte:
+            spans = ngram_index.candidate_ranges(compiled_pattern, scan_from, last_byte)
+        if spans is None:
+            spans = [(scan_from, last_byte)] if scan_from < last_byte else []
+        elif self.stats.enabled:
+            self.stats.count('ngram.skipped_bytes',
+                             (last_byte - scan_from) - sum(hi - lo for lo, hi in spans))
+        timed = self.stats.enabled
+        if timed:
+            self.stats.start_chunks()
+        if view.compressed is not None:
+            # Ranges must start at restart points to be decoded independently
+            ranges = [r for lo, hi in spans
+                      for r in compressed_ranges(view.compressed, line_index, lo, hi)]
+            submit = self._submitter(view, scan_compressed_range, None, compiled_pattern, timed=timed)
+        else:
+            ranges = [r for lo, hi in spans for r in byte_ranges(line_index, lo, hi, workers)]
+            # Workers only send back the start offsets of matching lines
+            submit = self._submitter(view, scan_range, scan_file_range, compiled_pattern, timed=timed)
+        total = known_bytes + sum(hi - lo for lo, hi in spans)
+        
+        line_at = line_index.line_at
         try:
-            compiled_pattern = re.compile(pattern.encode('utf-8'), flags)
-        except re.error:
-            # If regex fails, search as plain text
-            escaped = re.escape(pattern).encode('utf-8')
-            compiled_pattern = re.compile(escaped, flags)
-        
-        results = []
-        
-        # Use multiple threads for searching large files
-        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
-            chunk_size = max(1, self.total_lines // os.cpu_count())
-            futures = []
-            
-            for i in range(0, self.total_lines, chunk_size):
-                end = min(i + chunk_size, self.total_lines)
-                futures.append(executor.submit(self._search_chunk, i, end, compiled_pattern))
+            if cancel.cancelled:
+                return
+            if known_end > start_line:
+                lines = _slice_lines(source.line_numbers, start_line, known_end, typecode)
+                if source is cached:
+                    found.extend(lines)
+                    yield SearchBatch(lines, known_bytes, total)
+                else:
+                    done = 0
+                    for matched, chunk in self._refine_chunks(view, lines, compiled_pattern, cancel):
+                        done += len(chunk)
+                        found.extend(matched)
+                        yield SearchBatch(matched, known_bytes * done // len(lines), total)
+            scanned = known_bytes
+            for (start, end), starts in ordered_results(submit, ranges, workers * 2, cancel):
+                if timed:
+                    starts, started, seconds, worker = starts
+                    self.stats.chunk(seconds, end - start, started, worker)
+                scanned += end - start
+                batch = array(typecode, map(line_at, starts))
+                found.extend(batch)
+                yield SearchBatch(batch, scanned, total)
             
-            for future in futures:
-                results.extend(future.result())
-        
-        return results
-
-    def _search_chunk(self, start_line: int, end_line: int, pattern) -> List[Tuple[int, str]]:
-        """Search a chunk of the file for the pattern."""
-        results = []
-        for i in range(start_line, end_line):
-            line = self.get_line(i)
-            if pattern.search(line.encode('utf-8')):
-                results.append((i, line))
-        return results
-
-    def filter_by_time(self, start_time: str, end_time: str, time_format: str) -> List[Tuple[int, str]]:
-        """Filter logs by time range."""
-        # This is a placeholder for time-based filtering
-        # In a real implementation, you would parse the time from each log line
-        # and compare it with the start_time and end_time
-        return []
+            if keep is not None and end_line == view.total_lines and not cancel.cancelled:
+                keep.extend(found)
+                covered = view.total_lines - 1 if line_index.partial else view.total_lines
+                self.result_cache.store(view.file_identity, key, case_sensitive,
+                                        _slice_lines(keep, 0, covered, typecode), covered)
+        finally:
+            if self._search_token is cancel:
+                self._search_token = None
+
+    def refine(self, line_numbers, pattern: str, case_sensitive: bool = False,
+               cancel: Optional[CancelToken] = None, query: bool = False) -> array:
+        """Return the line numbers among line_numbers that also match pattern.
+
+        Only the given lines are read, so narrowing a previous result set
+        (say "ERROR" to "ERROR.*timeout") costs nothing like a full search.
+        """
+        found = array(typecode_for(self.total_lines))
+        for batch in self.iter_refine(line_numbers, pattern, case_sensitive, cancel, query):
+            found.extend(batch.line_numbers)
+        return found
+
+    def iter_refine(self, line_numbers, pattern: str, case_sensitive: bool = False,
+                    cancel: Optional[CancelToken] = None, query: bool = False) -> Iterator[SearchBatch]:
+        """Like iter_search, but over the given lines only, e.g. earlier results.
+
+        Progress is counted in bytes of the given lines.
+        """
+        return self.stats.timed('refine', self._iter_refine(line_numbers, pattern, case_sensitive,
+                                                            cancel, query))
+
+    def _iter_refine(self, line_numbers, pattern: str, case_sensitive: bool,
+                     cancel: Optional[CancelToken], query: bool = False) -> Iterator[SearchBatch]:
+        with self.reading() as view:
+            if view.file_map is None or not pattern:
+                return
+            lines = array(typecode_for(view.total_lines),
+                          (i for i in line_numbers if 0 <= i < view.total_lines))
+            offsets = view.line_index.offsets
+            total = sum(offsets[i + 1] - offsets[i] for i in lines)
+            scanned = 0
+            for matched, chunk in self._refine_chunks(view, lines,
+                                                      _compile_pattern(pattern, case_sensitive, query),
+                                                      cancel):
+                scanned += sum(offsets[i + 1] - offsets[i] for i in chunk)
+                yield SearchBatch(matched, scanned, total)
+
+    def _refine_chunks(self, view: FileView, lines: array, compiled_pattern: SearchPattern,
+                       cancel: Optional[CancelToken]) -> Iterator[Tuple[array, array]]:
+        """Yield (matching lines, lines checked) in chunks of REFINE_CHUNK_LINES."""
+        matches = compiled_pattern.matches
+        if view.compressed is not None:
+            def line_matches(i):
+                line = _read_line(view, i)
+                return matches(line, 0, len(line))
+        else:
+            file_map = view.file_map
+            span = view.line_index.span
+            def line_matches(i):
+                return matches(file_map, *span(i))
+        for pos in range(0, len(lines), REFINE_CHUNK_LINES):
+            if cancel and cancel.cancelled:
+                return
+            chunk = lines[pos:pos + REFINE_CHUNK_LINES]
+            yield array(lines.typecode, (i for i in chunk if line_matches(i))), chunk
+
+    def _submitter(self, view: FileView, thread_task, process_task, *args, timed: bool = False):
+        """Return submit(range) for the configured pool.
+
+        Thread tasks get the view's map, process tasks map the file
+        themselves; both are called as task(<file>, *range, *args).
+        Compressed files are always searched by threads, which decompress
+        without holding the GIL.  With timed, tasks run under timed_task,
+        so each result comes with the time its worker spent on it.
+        """
+        backend = resolve_backend(self.search_backend, view.file_size)
+        if view.compressed is not None:
+            backend = 'thread'
+        pool = get_pool(backend, self.max_workers or os.cpu_count() or 1)
+        wrap = (timed_task,) if timed else ()
+        if backend == 'process':
+            path, inode, size = self.file_path, view.file_identity.inode, view.file_size
+            return lambda item: pool.submit(*wrap, process_task, path, inode, size,
+                                            *_task_args(item), *args)
+        file_map = view.file_map
+        return lambda item: pool.submit(*wrap, thread_task, file_map, *_task_args(item), *args)
+
+    def start_ngram_index(self, on_ready=None) -> None:
+        """Load or build the trigram index for the open file in the background.
+
+        on_ready, if given, is called (from the builder thread) with each
+        index that becomes ready, including after the file is reopened.
+        Reopening or closing the file cancels a build in progress.
+        """
+        if on_ready is not None:
+            self._ngram_ready = on_ready
+        on_ready = self._ngram_ready
+        if (self.file_map is None or self.ngram_index is not None or self._ngram_token is not None
+                or self.indexing):
+            return
+        from src.core.ngram_index import NgramIndex, build_bitmaps, build_file_bitmaps
+        index = NgramIndex.load(self.index_cache, self.file_identity, self.raw_map)
+        if index is not None:
+            self.ngram_index = index
+            if on_ready:
+                on_ready(index)
+            return
+        
+        token = self._ngram_token = CancelToken()
+        view = self._acquire()
+        submit = self._submitter(view, build_bitmaps, build_file_bitmaps)
+        window = 2 * (self.max_workers or os.cpu_count() or 1)
+        
+        def build():
+            index = NgramIndex()
+            try:
+                built = index.build(view.line_index, view.file_size, submit, window, token)
+            finally:
+                self._release(view)
+            if built and not token.cancelled:
+                index.save(self.index_cache, view.file_identity)
+                if self._ngram_token is token:
+                    self.ngram_index = index
+                    self._ngram_token = None
+                    if on_ready:
+                        on_ready(index)
+        
+        threading.Thread(target=build, name='logexplorer-ngram', daemon=True).start()
+
+    def stop_ngram_index(self) -> None:
+        """Cancel a trigram index build and stop using the index."""
+        if self._ngram_token is not None:
+            self._ngram_token.cancel()
+            self._ngram_token = None
+        self.ngram_index = None
+
+    def filter_by_time(self, start_time, end_time, time_format: Optional[str] = None) -> 'LineRange':
+        """Return the lazy range of lines stamped between start_time and end_time.
+
+        time_format may be None/'auto' to detect the file's format, the name
+        of a known format ('iso8601', 'syslog', 'apache', 'epoch'), or a
+        strptime-style string.  Times may be strings in the file's format,
+        ISO 8601, bare times of day, epoch numbers or datetimes.
+        """
+        from src.core.timestamps import LineRange, parse_time
+        if self.file_map is None:
+            return LineRange(self, 0, 0)
+        index = self._timestamps(time_format)
+        if index is None or not index.lines:
+            return LineRange(self, 0, 0)
+        
+        start = parse_time(start_time, index.format, index.first_time)
+        end = parse_time(end_time, index.format, index.first_time)
+        with self.stats.phase('time_filter'):
+            first, last = index.find_range(start, end, self.get_line_bytes, self.total_lines)
+        return LineRange(self, first, last)
+
+    def line_times(self, line_numbers, time_format: Optional[str] = None) -> array:
+        """Timestamps of the given lines, e.g. to merge results from several files.
+
+        Lines without a timestamp take the one before them; lines with none
+        before them, or in files without timestamps, get -inf.
+        """
+        times = array('d')
+        index = self._timestamps(time_format) if self.file_map is not None else None
+        if index is None:
+            times.extend(float('-inf') for _ in line_numbers)
+            return times
+        time_at = index.time_at
+        for line in line_numbers:
+            ts = time_at(line, self.get_line_bytes)
+            times.append(float('-inf') if ts is None else ts)
+        return times
+
+    def _timestamps(self, time_format: Optional[str]) -> Optional['TimestampIndex']:
+        """Build, extend or reuse the sparse timestamp index."""
+        from src.core.timestamps import DETECT_LINES, TimestampIndex, detect_format, resolve_format
+        fmt = resolve_format(time_format)
+        index = self.timestamp_index
+        if index is None or (fmt is not None and fmt.name != index.format.name):
+            if fmt is None:
+                fmt = detect_format(self.get_line_bytes(i)
+                                    for i in range(min(DETECT_LINES, self.total_lines)))
+                if fmt is None:
+                    return None
+            index = self.timestamp_index = TimestampIndex(fmt)
+        if index.covered_lines < self.total_lines:
+            with self.stats.phase('timestamp_index') as span:
+                span.lines = self.total_lines - index.covered_lines
+                index.extend(self.get_line_bytes, self.total_lines)
+        return index
+
+    def fields(self, field_format: Optional[str] = None, cancel: Optional[CancelToken] = None,
+               progress: Optional[Callable[[int, int], None]] = None) -> 'FieldIndex':
+        """Extract structured fields into dictionary-encoded columns.
+
+        field_format is None/'auto', a line template or a regex with named
+        groups (see src.core.fields).  Lines are parsed once, in parallel
+        ranges; later calls only parse lines added since, so the index
+        follows a growing file.  If cancelled, the lines parsed so far stay
+        covered.  progress(bytes_done, bytes_total) is called per range.
+        """
+        from src.core.fields import FieldIndex, resolve_field_format
+        fmt = resolve_field_format(field_format)
+        index = self.field_index
+        if index is None or index.format.name != fmt.name:
+            index = self.field_index = FieldIndex(fmt)
+        with self.reading() as view:
+            if view.file_map is None:
+                return index
+            self._extract_fields(view, index, fmt, cancel, progress)
+        return index
+
+    def _extract_fields(self, view: FileView, index: 'FieldIndex', fmt, cancel: Optional[CancelToken],
+                        progress: Optional[Callable[[int, int], None]]) -> None:
+        from src.core.fields import extract_file_range, extract_range
+        offsets = view.line_index.offsets
+        if index.covered_lines and offsets[index.covered_lines] != index.size:
+            # The last line had no newline yet, and has grown since
+            index.truncate(index.covered_lines - 1, offsets[index.covered_lines - 1])
+        start, end = offsets[index.covered_lines], offsets[view.total_lines]
+        if start >= end:
+            return
+        
+        workers = self.max_workers or os.cpu_count() or 1
+        ranges = byte_ranges(view.line_index, start, end, workers)
+        if view.compressed is not None:
+            results = ((r, extract_range(view.file_map, *r, fmt)) for r in ranges
+                       if not (cancel and cancel.cancelled))
+        else:
+            submit = self._submitter(view, extract_range, extract_file_range, fmt)
+            results = ordered_results(submit, ranges, workers * 2, cancel)
+        with self.stats.phase('fields') as span:
+            for (lo, hi), (count, columns) in results:
+                index.append(count, columns, hi)
+                span.bytes += hi - lo
+                span.lines += count
+                if progress:
+                    progress(hi - start, end - start)
+
+    def export(self, line_numbers, path: str, fmt: Optional[str] = None, before: int = 0,
+               after: int = 0, numbered: bool = False, compress: Optional[bool] = None,
+               cancel: Optional[CancelToken] = None,
+               progress: Optional[Callable[[int, int], None]] = None) -> 'ExportResult':
+        """Write the given lines (sorted, e.g. search results) and their context to path.
+
+        fmt is 'text', grep style (if numbered, "N:" prefixes matches and
+        "N-" context lines), or 'ndjson', one record per line with its
+        number and type; compress writes gzip.  Both default from the file
+        name, as in "errors.ndjson.gz".  Lines are streamed from the map
+        with before/after lines of context, overlapping windows merged, and
+        plain text is copied in byte ranges without decoding.  A cancelled
+        or failed export leaves no file behind.
+        """
+        from src.core.export import export_format, export_lines, open_export
+        fmt, compress = export_format(path, fmt, compress)
+        name = os.path.basename(self.file_path or '')
+        with self.reading() as view, self.stats.phase('export') as span:
+            stream = open_export(path, compress)
+            try:
+                with stream:
+                    result = export_lines(view, line_numbers, stream, fmt, before, after,
+                                          numbered, name, cancel, progress)
+            except BaseException:
+                _remove(path)
+                raise
+            span.bytes, span.lines = result.bytes, result.lines
+        if result.cancelled:
+            _remove(path)
+        return result
 
     def close(self) -> None:
-        """Close the current file."""
-        if self.file_map:
-            self.file_map.close()
-            self.file_map = None
+        """Close the current file, cancelling a background index of it.
+
+        Searches still running on the file are not interrupted: its map is
+        closed when the last of them is done.
+        """
+        if self._index_token is not None:
+            self._index_token.cancel()
+            self._index_token = None
+        if self._index_thread is not None:
+            self._index_thread.join()
+            self._index_thread = None
+        view = self._view
+        self._view = _empty_view(self.index_backend)
+        if view.shared is not None:
+            view.shared.retire()
         if self.current_file:
             self.current_file.close()
             self.current_file = None
-        self.line_offsets = []
-        self.total_lines = 0
+        self.file_path = None
+        self.indexed_bytes = 0
+        self.index_error = None
+        self.timestamp_index = None
+        self.field_index = None
+        self.stop_ngram_index()
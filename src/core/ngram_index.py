@@ -0,0 +1,277 @@
+import re
+import time
+import struct
+from array import array
+from bisect import bisect_right
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is an optional accelerator
+    np = None
+
+try:
+    import re._parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+from src.core.index_cache import FileIdentity, IndexCache
+from src.core.line_index import LineIndex
+from src.core.query import Query
+from src.core.search_engine import SearchPattern
+from src.core.workers import CancelToken, map_file, ordered_results
+
+# Bytes of text per block (rounded up to a line boundary) and bits in each
+# block's trigram bitmap; together they put the index at ~3% of the file.
+BLOCK_SIZE = 256 * 1024
+BITMAP_LOG2 = 16
+BITMAP_BITS = 1 << BITMAP_LOG2
+BITMAP_BYTES = BITMAP_BITS // 8
+
+# Blocks handed to a worker per task.
+BLOCKS_PER_TASK = 64
+
+_WORD = re.compile(rb'\w{3,}')
+_HASH_MULTIPLIER = 2654435761
+_HASH_SHIFT = 32 - BITMAP_LOG2
+_HEADER = struct.Struct('<QQ')
+
+_REPEATS = {sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT}
+if hasattr(sre_parse, 'POSSESSIVE_REPEAT'):
+    _REPEATS.add(sre_parse.POSSESSIVE_REPEAT)
+
+
+def _trigram_hash(a: int, b: int, c: int) -> int:
+    return (((a << 16 | b << 8 | c) * _HASH_MULTIPLIER) & 0xFFFFFFFF) >> _HASH_SHIFT
+
+
+def block_bitmap(buf, start: int, end: int) -> bytes:
+    """Bitmap of the hashed, lowercased trigrams inside words of buf[start:end].
+
+    Only trigrams made of word characters are indexed; queries are
+    decomposed the same way, so every trigram they require is covered.
+    """
+    block = buf[start:end].lower()
+    if np is not None and len(block) >= 3:
+        data = np.frombuffer(block, dtype=np.uint8)
+        word = (((data >= 97) & (data <= 122)) | ((data >= 48) & (data <= 57)) | (data == 95))
+        valid = word[:-2] & word[1:-1] & word[2:]
+        codes = ((data[:-2].astype(np.uint64) << 16) | (data[1:-1].astype(np.uint64) << 8) |
+                 data[2:].astype(np.uint64))[valid]
+        hashes = ((codes * _HASH_MULTIPLIER) & 0xFFFFFFFF) >> _HASH_SHIFT
+        bits = np.zeros(BITMAP_BITS, dtype=bool)
+        bits[hashes] = True
+        return np.packbits(bits, bitorder='little').tobytes()
+
+    bitmap = bytearray(BITMAP_BYTES)
+    hashes = set()
+    for word in set(_WORD.findall(block)):
+        for i in range(len(word) - 2):
+            hashes.add(_trigram_hash(word[i], word[i + 1], word[i + 2]))
+    for h in hashes:
+        bitmap[h >> 3] |= 1 << (h & 7)
+    return bytes(bitmap)
+
+
+def build_bitmaps(buf, bounds: List[int]) -> bytes:
+    """Pool task: bitmaps for consecutive blocks delimited by bounds."""
+    return b''.join(block_bitmap(buf, bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1))
+
+
+def build_file_bitmaps(path: str, inode: int, size: int, bounds: List[int]) -> bytes:
+    """Process-pool task: like build_bitmaps, on a file mapped by the worker."""
+    return build_bitmaps(map_file(path, inode, size), bounds)
+
+
+def _literal_runs(items) -> List[bytes]:
+    """Literal byte runs every match of a parsed regex must contain."""
+    runs = []
+    current = bytearray()
+    for op, value in items:
+        if op is sre_parse.LITERAL:
+            current.append(value)
+            continue
+        if current:
+            runs.append(bytes(current))
+            current = bytearray()
+        if op is sre_parse.SUBPATTERN:
+            runs.extend(_literal_runs(value[-1]))
+        elif op in _REPEATS and value[0] >= 1:
+            runs.extend(_literal_runs(value[2]))
+    if current:
+        runs.append(bytes(current))
+    return runs
+
+
+def required_trigrams(pattern: SearchPattern) -> Set[int]:
+    """Hashes of trigrams any line matching pattern (or a Query) must contain."""
+    if isinstance(pattern, Query):
+        return set().union(*map(required_trigrams, pattern.required_terms()))
+    if pattern.literal is not None:
+        runs = [pattern.literal]
+    else:
+        try:
+            runs = _literal_runs(sre_parse.parse(pattern.regex.pattern, pattern.regex.flags))
+        except Exception:
+            return set()
+    hashes = set()
+    for run in runs:
+        for word in _WORD.findall(run.lower()):
+            for i in range(len(word) - 2):
+                hashes.add(_trigram_hash(word[i], word[i + 1], word[i + 2]))
+    return hashes
+
+
+def _add_range(ranges: List[Tuple[int, int]], start: int, end: int) -> None:
+    if ranges and ranges[-1][1] == start:
+        ranges[-1] = (ranges[-1][0], end)
+    else:
+        ranges.append((start, end))
+
+
+class NgramIndex:
+    """Per-block trigram bitmaps used to skip blocks a search cannot match.
+
+    Blocks are line-aligned, so a line never straddles two of them.  A
+    search only scans blocks whose bitmap has every trigram the pattern
+    requires; false positives cost a scan, never a missed match.
+    """
+
+    def __init__(self):
+        self.bounds = array('Q', [0])
+        self.bitmaps = b''
+        self.size = 0
+        self.build_seconds = 0.0
+        self.from_cache = False
+        self.last_query = {}
+
+    @property
+    def block_count(self) -> int:
+        return len(self.bounds) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.bounds) * self.bounds.itemsize + len(self.bitmaps) + _HEADER.size
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'blocks': self.block_count,
+            'indexed_bytes': self.size,
+            'disk_bytes': self.nbytes,
+            'build_seconds': self.build_seconds,
+            'from_cache': self.from_cache,
+            'last_query': dict(self.last_query),
+        }
+
+    @staticmethod
+    def block_bounds(line_index: LineIndex, size: int) -> array:
+        bounds = array('Q', [0])
+        pos = 0
+        while pos < size:
+            target = pos + BLOCK_SIZE
+            pos = size if target >= size else min(size, line_index.offsets[line_index.line_at(target) + 1])
+            bounds.append(pos)
+        return bounds
+
+    def build(self, line_index: LineIndex, size: int, submit: Callable, window: int,
+              cancel: Optional[CancelToken] = None,
+              progress: Optional[Callable[[int, int], None]] = None) -> bool:
+        """Build bitmaps for the first size bytes; False if cancelled.
+
+        submit(bounds) must start a pool task returning the bitmaps of the
+        blocks delimited by bounds (see build_bitmaps).
+        """
+        started = time.perf_counter()
+        bounds = self.block_bounds(line_index, size)
+        tasks = [list(bounds[i:i + BLOCKS_PER_TASK + 1])
+                 for i in range(0, len(bounds) - 1, BLOCKS_PER_TASK)]
+        parts = []
+        for task, bitmaps in ordered_results(submit, tasks, window, cancel):
+            parts.append(bitmaps)
+            if progress:
+                progress(task[-1], size)
+        if cancel and cancel.cancelled:
+            return False
+        self.bounds = bounds
+        self.bitmaps = b''.join(parts)
+        self.size = size
+        self.build_seconds = time.perf_counter() - started
+        return True
+
+    def candidate_ranges(self, pattern: SearchPattern, start: int,
+                         end: int) -> Optional[List[Tuple[int, int]]]:
+        """Byte ranges within [start, end) that may contain matches.
+
+        Returns None when the pattern requires no trigram, meaning the
+        whole range has to be scanned.  Bytes past the indexed size are
+        always included.
+        """
+        hashes = required_trigrams(pattern)
+        if not hashes:
+            self.last_query = {'pattern': pattern.pattern, 'pruned': False}
+            return None
+        positions = [(h >> 3, 1 << (h & 7)) for h in hashes]
+
+        ranges = []
+        indexed_end = min(end, self.size)
+        if indexed_end > start:
+            first, last = self._block_at(start), self._block_at(indexed_end - 1)
+            for block in self._matching_blocks(positions, first, last + 1):
+                _add_range(ranges, max(start, self.bounds[block]), min(end, self.bounds[block + 1]))
+        if end > self.size:
+            _add_range(ranges, max(start, self.size), end)
+
+        scanned = sum(hi - lo for lo, hi in ranges)
+        self.last_query = {
+            'pattern': pattern.pattern,
+            'pruned': True,
+            'candidate_bytes': scanned,
+            'total_bytes': end - start,
+            'speedup': (end - start) / scanned if scanned else float('inf'),
+        }
+        return ranges
+
+    def _block_at(self, offset: int) -> int:
+        return bisect_right(self.bounds, offset, 0, self.block_count) - 1
+
+    def _matching_blocks(self, positions, first: int, stop: int):
+        if stop <= first:
+            return []
+        if np is not None:
+            bitmaps = np.frombuffer(self.bitmaps, dtype=np.uint8).reshape(-1, BITMAP_BYTES)[first:stop]
+            columns = np.array([p for p, _ in positions])
+            masks = np.array([m for _, m in positions], dtype=np.uint8)
+            hits = np.all((bitmaps[:, columns] & masks) != 0, axis=1)
+            return (np.flatnonzero(hits) + first).tolist()
+        bitmaps = self.bitmaps
+        blocks = []
+        for block in range(first, stop):
+            base = block * BITMAP_BYTES
+            if all(bitmaps[base + byte] & mask for byte, mask in positions):
+                blocks.append(block)
+        return blocks
+
+    def save(self, cache: IndexCache, identity: FileIdentity) -> None:
+        cache.write_entry(identity, 'ngram', 'B', False,
+                          [_HEADER.pack(BITMAP_BITS, self.block_count),
+                           memoryview(self.bounds).cast('B'), self.bitmaps])
+
+    @classmethod
+    def load(cls, cache: IndexCache, identity: FileIdentity, buf) -> Optional['NgramIndex']:
+        entry = cache.read_entry(identity, 'ngram', buf)
+        if entry is None:
+            return None
+        cached_identity, _, _, payload = entry
+        if len(payload) < _HEADER.size:
+            return None
+        bits, blocks = _HEADER.unpack_from(payload)
+        bounds_end = _HEADER.size + (blocks + 1) * 8
+        if bits != BITMAP_BITS or len(payload) != bounds_end + blocks * BITMAP_BYTES:
+            return None
+        index = cls()
+        index.bounds = array('Q')
+        index.bounds.frombytes(payload[_HEADER.size:bounds_end])
+        index.bitmaps = payload[bounds_end:]
+        index.size = cached_identity.size
+        index.from_cache = True
+        return index
@@ -0,0 +1,359 @@
+"""Boolean queries over several patterns, evaluated in one scan.
+
+A query joins terms with AND, OR and NOT (upper case) and parentheses;
+terms next to each other are ANDed::
+
+    ERROR AND (timeout OR refused) AND NOT healthcheck
+    "connection reset" /took [0-9]{4,}ms/ NOT debug
+
+A term is a word, a "quoted phrase" or a /regular expression/, and is
+compiled as a SearchPattern, so terms match as searches for them would.
+
+Each scanned range is planned on a sample of its first bytes: terms are
+counted there, and the matching lines of the cheapest set of terms that
+every match must contain (the rarest of ANDed terms, all of ORed ones)
+are found with the usual fast scans.  Only those candidate lines are
+checked against the whole query, by a check built for the range that
+tries ANDed terms rarest first and ORed terms most frequent first, so
+most checks stop at the first term.  A query whose matches need not
+contain any term (say "NOT healthcheck") checks every line.
+"""
+import re
+import time
+from array import array
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.core.search_engine import (_REGEX_META, FOLD_BLOCK_SIZE, SearchPattern, _scan_literal,
+                                    _scan_regex)
+
+KEYWORDS = ('AND', 'OR', 'NOT')
+
+# Bytes at the start of a range used to estimate how often terms occur.
+SAMPLE_BYTES = 32 * 1024
+
+# Rough costs of finding the line around a hit, splitting off a line and
+# checking one term on a line, weighed against the measured time it
+# takes to scan the sample for each term.
+CANDIDATE_SECONDS = 1e-6
+LINE_SECONDS = 0.2e-6
+CHECK_SECONDS = 0.3e-6
+
+_TOKEN = re.compile(r'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|/((?:[^/\\]|\\.)+)/|([^\s()"]+))')
+
+
+class Query:
+    """A parsed boolean query, usable wherever a SearchPattern is.
+
+    Raises ValueError for a query that does not parse.
+    """
+
+    def __init__(self, text: str, case_sensitive: bool = False):
+        self.pattern = text
+        self.case_sensitive = case_sensitive
+        self.terms: List[SearchPattern] = []
+        self._term_numbers: Dict[Tuple[str, bool], int] = {}
+        self.root = _Parser(text, self._add_term).parse()
+        # Literals of case-insensitive terms are lowercased, so the text is too
+        self.folded = any(term.folded for term in self.terms)
+        self._checks: Dict[tuple, Callable[[bytes], bool]] = {}
+        self._text_regexes = None
+
+    def __reduce__(self):
+        return (Query, (self.pattern, self.case_sensitive))
+
+    def _add_term(self, text: str, is_regex: bool) -> tuple:
+        key = (text, is_regex)
+        number = self._term_numbers.get(key)
+        if number is None:
+            number = self._term_numbers[key] = len(self.terms)
+            if not is_regex and _REGEX_META.intersection(text):
+                text = re.escape(text)
+            self.terms.append(SearchPattern(text, self.case_sensitive))
+        return ('term', number)
+
+    def required_terms(self) -> List[SearchPattern]:
+        """Terms every matching line contains (used to prune with the trigram index)."""
+        return [self.terms[i] for i in _required(self.root)]
+
+    def matches(self, buf, start: int, end: int) -> bool:
+        """True if the line buf[start:end] (without its newline) matches."""
+        line = buf[start:end]
+        if self.folded:
+            line = line.lower()
+        return bool(self._check(None)(line))
+
+    def scan(self, buf, start: int, end: int) -> array:
+        """Return the start offsets of lines in buf[start:end] matching the query."""
+        if not self.folded:
+            return self._scan_block(buf, start, end)
+        found = array('Q')
+        pos = start
+        while pos < end:
+            block_end = buf.find(b'\n', min(pos + FOLD_BLOCK_SIZE, end) - 1, end) + 1 or end
+            block = buf[pos:block_end].lower()
+            found.extend(offset + pos for offset in self._scan_block(block, 0, len(block)))
+            pos = block_end
+        return found
+
+    def _scan_block(self, buf, start: int, end: int) -> array:
+        sample = buf[start:min(end, start + SAMPLE_BYTES)]
+        hits, seconds = self._sample(sample)
+        drivers = _drivers(self.root, hits, seconds, len(self.terms))
+        lines = sample.count(b'\n') + 1
+        if drivers is not None and drivers[0] > lines * (LINE_SECONDS + CHECK_SECONDS * len(self.terms)):
+            drivers = None
+        if drivers is None:
+            evaluate = self._check((hits, lines))
+            return self._scan_lines(buf, start, end, evaluate)
+
+        terms = drivers[1]
+        if len(terms) == 1:
+            starts = self._scan_term(terms[0], buf, start, end)
+        else:
+            starts = sorted(set().union(*(self._scan_term(i, buf, start, end) for i in terms)))
+        if _is_disjunction(self.root):
+            # The lines holding any of the terms are exactly the matches
+            return starts if isinstance(starts, array) else array('Q', starts)
+        evaluate = self._check((hits, lines))
+        find = buf.find
+        found = array('Q')
+        for line_start in starts:
+            line_end = find(b'\n', line_start, end)
+            if line_end < 0:
+                line_end = end
+            if evaluate(buf[line_start:line_end]):
+                found.append(line_start)
+        return found
+
+    def _scan_term(self, number: int, buf, start: int, end: int) -> array:
+        term = self.terms[number]
+        if term.literal is not None:
+            return _scan_literal(buf, start, end, term.literal)
+        return _scan_regex(buf, start, end, term.regex)
+
+    def _scan_lines(self, buf, start: int, end: int, evaluate) -> array:
+        found = array('Q')
+        pos = start
+        lines = buf[start:end].split(b'\n')
+        if not lines[-1]:
+            lines.pop()
+        for line in lines:
+            if evaluate(line):
+                found.append(pos)
+            pos += len(line) + 1
+        return found
+
+    def _sample(self, sample: bytes) -> Tuple[List[int], List[float]]:
+        """Occurrences of each term in the sample, and the time it took to find them."""
+        hits = []
+        seconds = []
+        for term in self.terms:
+            started = time.perf_counter()
+            if term.literal is not None:
+                hits.append(sample.count(term.literal))
+            else:
+                hits.append(sum(1 for _ in term.regex.finditer(sample)))
+            seconds.append(time.perf_counter() - started)
+        return hits, seconds
+
+    def _check(self, sample: Optional[Tuple[List[int], int]]) -> Callable[[bytes], bool]:
+        """The per-line check, ordered by the sample's counts, built once per ordering."""
+        ordered = _order(self.root, sample)
+        check = self._checks.get(ordered)
+        if check is None:
+            check = self._checks[ordered] = _check(ordered, self.terms)
+        return check
+
+    def highlights(self, text: str) -> List[Tuple[int, int, int]]:
+        """(start, end, term number) of every match in text of the terms that are not negated."""
+        if self._text_regexes is None:
+            self._text_regexes = {}
+            for i in _positive(self.root):
+                regex = self.terms[i].regex
+                self._text_regexes[i] = re.compile(regex.pattern.decode('utf-8'),
+                                                   regex.flags & (re.IGNORECASE | re.MULTILINE))
+        spans = [(match.start(), match.end(), i) for i, regex in self._text_regexes.items()
+                 for match in regex.finditer(text) if match.end() > match.start()]
+        spans.sort()
+        return spans
+
+
+class _Parser:
+    """Recursive descent over the query's tokens; builds nested tuples."""
+
+    def __init__(self, text: str, add_term):
+        self.tokens = self._tokenize(text)
+        self.pos = 0
+        self.add_term = add_term
+
+    @staticmethod
+    def _tokenize(text: str) -> List[Tuple[str, str]]:
+        tokens = []
+        pos = 0
+        text = text.rstrip()
+        while pos < len(text):
+            match = _TOKEN.match(text, pos)
+            if match is None:
+                raise ValueError(f"Unbalanced quote in query: {text[pos:].strip()}")
+            opening, closing, phrase, regex, word = match.groups()
+            if opening:
+                tokens.append(('(', opening))
+            elif closing:
+                tokens.append((')', closing))
+            elif phrase is not None:
+                if not phrase:
+                    raise ValueError("Empty phrase in query")
+                tokens.append(('term', re.sub(r'\\(.)', r'\1', phrase)))
+            elif regex is not None:
+                tokens.append(('regex', regex.replace('\\/', '/')))
+            elif word in KEYWORDS:
+                tokens.append((word, word))
+            else:
+                tokens.append(('term', word))
+            pos = match.end()
+        return tokens
+
+    def parse(self) -> tuple:
+        if not self.tokens:
+            raise ValueError("Empty query")
+        node = self._or()
+        if self.pos < len(self.tokens):
+            raise ValueError(f"Unexpected '{self.tokens[self.pos][1]}' in query")
+        return node
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def _or(self) -> tuple:
+        children = [self._and()]
+        while self._peek() == 'OR':
+            self.pos += 1
+            children.append(self._and())
+        return children[0] if len(children) == 1 else ('or', children)
+
+    def _and(self) -> tuple:
+        children = [self._not()]
+        while self._peek() not in (None, 'OR', ')'):
+            if self._peek() == 'AND':
+                self.pos += 1
+            children.append(self._not())
+        return children[0] if len(children) == 1 else ('and', children)
+
+    def _not(self) -> tuple:
+        if self._peek() == 'NOT':
+            self.pos += 1
+            return ('not', self._not())
+        return self._primary()
+
+    def _primary(self) -> tuple:
+        kind = self._peek()
+        if kind is None:
+            raise ValueError("Query ends where a term was expected")
+        value = self.tokens[self.pos][1]
+        self.pos += 1
+        if kind == '(':
+            node = self._or()
+            if self._peek() != ')':
+                raise ValueError("Missing ')' in query")
+            self.pos += 1
+            return node
+        if kind in ('term', 'regex'):
+            return self.add_term(value, kind == 'regex')
+        raise ValueError(f"Unexpected '{value}' in query")
+
+
+def _estimate(node: tuple, hits: List[int], lines: int) -> int:
+    """Lines of the sample matching node, roughly."""
+    kind = node[0]
+    if kind == 'term':
+        return hits[node[1]]
+    if kind == 'not':
+        return max(0, lines - _estimate(node[1], hits, lines))
+    estimates = [_estimate(child, hits, lines) for child in node[1]]
+    return min(estimates) if kind == 'and' else sum(estimates)
+
+
+def _order(node: tuple, sample: Optional[Tuple[List[int], int]]) -> tuple:
+    """node as nested tuples; with sample counts, children ordered to stop early."""
+    kind = node[0]
+    if kind == 'term':
+        return node
+    if kind == 'not':
+        return ('not', _order(node[1], sample))
+    children = list(node[1])
+    if sample is not None:
+        # Rare terms first in an AND (likely false), frequent ones first in an OR
+        children.sort(key=lambda child: _estimate(child, *sample), reverse=kind == 'or')
+    return (kind, tuple(_order(child, sample) for child in children))
+
+
+def _check(node: tuple, terms: List[SearchPattern]) -> Callable[[bytes], bool]:
+    """A function telling whether a line matches node, trying children in order."""
+    kind = node[0]
+    if kind == 'term':
+        term = terms[node[1]]
+        literal = term.literal
+        if literal is None:
+            return term.regex.search
+        return lambda line: literal in line
+    if kind == 'not':
+        child = node[1]
+        if child[0] == 'term' and terms[child[1]].literal is not None:
+            literal = terms[child[1]].literal
+            return lambda line: literal not in line
+        negated = _check(child, terms)
+        return lambda line: not negated(line)
+    # Nested pairs: a call per child tried, with no loop around them
+    checks = [_check(child, terms) for child in node[1]]
+    check = checks.pop()
+    while checks:
+        check = _pair(kind, checks.pop(), check)
+    return check
+
+
+def _pair(kind: str, first: Callable[[bytes], bool],
+          second: Callable[[bytes], bool]) -> Callable[[bytes], bool]:
+    if kind == 'and':
+        return lambda line: first(line) and second(line)
+    return lambda line: first(line) or second(line)
+
+
+def _drivers(node: tuple, hits: List[int], seconds: List[float],
+             term_count: int) -> Optional[Tuple[float, List[int]]]:
+    """(estimated cost, terms) of the cheapest terms whose lines hold every match of node."""
+    kind = node[0]
+    if kind == 'term':
+        i = node[1]
+        return seconds[i] + hits[i] * (CANDIDATE_SECONDS + CHECK_SECONDS * term_count), [i]
+    if kind == 'not':
+        return None
+    options = [_drivers(child, hits, seconds, term_count) for child in node[1]]
+    if kind == 'and':
+        options = [option for option in options if option is not None]
+        return min(options, key=lambda option: option[0]) if options else None
+    if any(option is None for option in options):
+        return None
+    terms = []
+    for _, child_terms in options:
+        terms.extend(i for i in child_terms if i not in terms)
+    return sum(option[0] for option in options), terms
+
+
+def _is_disjunction(node: tuple) -> bool:
+    return node[0] == 'term' or (node[0] == 'or' and all(child[0] == 'term' for child in node[1]))
+
+
+def _required(node: tuple) -> List[int]:
+    if node[0] == 'term':
+        return [node[1]]
+    if node[0] == 'and':
+        return [i for child in node[1] for i in _required(child)]
+    return []
+
+
+def _positive(node: tuple, negated: bool = False) -> List[int]:
+    if node[0] == 'term':
+        return [] if negated else [node[1]]
+    if node[0] == 'not':
+        return _positive(node[1], not negated)
+    return [i for child in node[1] for i in _positive(child, negated)]
@@ -0,0 +1,102 @@
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from src.core.index_cache import FileIdentity
+
+# Rough per-entry bookkeeping cost, on top of the line number array.
+ENTRY_OVERHEAD = 256
+
+
+class CachedResult(NamedTuple):
+    """Line numbers matching a pattern among the first covered_lines lines.
+
+    covered_lines excludes a final line that had no newline yet, since
+    appending to the file can still change it.
+    """
+    identity: FileIdentity
+    line_numbers: array
+    covered_lines: int
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.line_numbers) * self.line_numbers.itemsize + ENTRY_OVERHEAD
+
+
+class ResultCache:
+    """Memory-bounded LRU cache of search results.
+
+    Entries are keyed by file, pattern and case sensitivity, and checked
+    against the file's identity on every lookup: results for a file that
+    has only grown are still valid for the lines it had, anything else
+    invalidates them.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, identity: FileIdentity, buf, pattern: str,
+               case_sensitive: bool) -> Optional[CachedResult]:
+        """Return the cached result for a search of this file, if still valid.
+
+        The result may cover only the lines the file had when it was
+        cached; lines from covered_lines on still have to be searched.
+        """
+        key = (identity.key, pattern, case_sensitive)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.identity.is_prefix_of(identity, buf):
+                    self._entries.move_to_end(key)
+                    if entry.identity.size == identity.size:
+                        self.hits += 1
+                    else:
+                        self.partial_hits += 1
+                    return entry
+                self._drop(key)
+            self.misses += 1
+            return None
+
+    def store(self, identity: FileIdentity, pattern: str, case_sensitive: bool,
+              line_numbers: array, covered_lines: int) -> None:
+        entry = CachedResult(identity, line_numbers, covered_lines)
+        if entry.nbytes > self.max_bytes:
+            return
+        key = (identity.key, pattern, case_sensitive)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self.nbytes += entry.nbytes
+            while self.nbytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, identity: Optional[FileIdentity] = None) -> None:
+        """Forget the results for one file, or for all files."""
+        with self._lock:
+            for key in list(self._entries):
+                if identity is None or key[0] == identity.key:
+                    self._drop(key)
+
+    def _drop(self, key: Tuple) -> None:
+        self.nbytes -= self._entries.pop(key).nbytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self._entries),
+            'bytes': self.nbytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'partial_hits': self.partial_hits,
+            'misses': self.misses,
+        }
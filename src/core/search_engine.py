@@ -0,0 +1,151 @@
+import re
+from array import array
+
+try:
+    from re import _parser as _regex_parser
+except ImportError:  # Python < 3.11
+    import sre_parse as _regex_parser
+
+# Characters that give a pattern regex meaning; anything else is searched
+# with bytes.find instead of the regex engine.
+_REGEX_META = frozenset('.^$*+?{}[]\\|()')
+
+# Bytes lowercased at a time for case-insensitive literal searches.
+FOLD_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+class SearchPattern:
+    """A search pattern compiled for scanning whole buffers.
+
+    Patterns are compiled with ``re.MULTILINE`` so ``^`` and ``$`` keep
+    their per-line meaning when run over many lines at once.  Invalid
+    regexes fall back to a plain-text search, as before.
+    """
+
+    def __init__(self, pattern: str, case_sensitive: bool = False):
+        self.pattern = pattern
+        self.case_sensitive = case_sensitive
+        flags = re.MULTILINE if case_sensitive else re.MULTILINE | re.IGNORECASE
+        is_literal = not _REGEX_META.intersection(pattern)
+        try:
+            self.regex = re.compile(pattern.encode('utf-8'), flags)
+        except re.error:
+            self.regex = re.compile(re.escape(pattern).encode('utf-8'), flags)
+            is_literal = True
+
+        # Literal fast path.  Case-insensitive literals are matched against
+        # lowercased copies of the buffer, which beats re.IGNORECASE by far.
+        literal = pattern.encode('utf-8')
+        self.literal = None
+        self.folded = False
+        if is_literal and literal:
+            if case_sensitive or literal.lower() == literal.upper():
+                self.literal = literal
+            else:
+                self.literal = literal.lower()
+                self.folded = True
+
+    def __reduce__(self):
+        return (SearchPattern, (self.pattern, self.case_sensitive))
+
+    def ignoring_case_matches_more(self) -> bool:
+        """True if the case-insensitive pattern matches every line this one does.
+
+        Negated classes and assertions break that: ``[^a]`` matches "A" only
+        when case counts, so case-insensitive results are no superset.
+        """
+        if self.literal is not None:
+            return True
+        return not _negates(_regex_parser.parse(self.regex.pattern, self.regex.flags))
+
+    def matches(self, buf, start: int, end: int) -> bool:
+        """True if the line buf[start:end] (without its newline) matches."""
+        if self.folded:
+            return self.literal in buf[start:end].lower()
+        if self.literal is not None:
+            return buf.find(self.literal, start, end) >= 0
+        return self.regex.search(buf, start, end) is not None
+
+    def scan(self, buf, start: int, end: int) -> array:
+        if self.folded:
+            return _scan_folded(buf, start, end, self.literal)
+        if self.literal is not None:
+            return _scan_literal(buf, start, end, self.literal)
+        return _scan_regex(buf, start, end, self.regex)
+
+
+_NEGATIONS = (_regex_parser.NOT_LITERAL, _regex_parser.NEGATE,
+              _regex_parser.ASSERT_NOT, _regex_parser.ASSERT)
+
+
+def _negates(node) -> bool:
+    """True if a parsed regex (or part of one) holds any of _NEGATIONS."""
+    if isinstance(node, _regex_parser.SubPattern):
+        node = node.data
+    if not isinstance(node, (list, tuple)):
+        return False
+    if node and any(node[0] is op for op in _NEGATIONS):
+        return True
+    return any(_negates(item) for item in node)
+
+
+def scan_range(buf, start: int, end: int, pattern: SearchPattern) -> array:
+    """Return the start offsets of lines in buf[start:end] matching pattern.
+
+    ``start`` must be the start of a line and ``end`` the end of one (just
+    past its newline, or the end of the buffer).  Lines are located from the
+    match positions, so only matching lines are ever touched.  pattern may
+    also be a query.Query, which scans for all of its terms at once.
+    """
+    return pattern.scan(buf, start, end)
+
+
+def _scan_folded(buf, start: int, end: int, literal: bytes) -> array:
+    found = array('Q')
+    pos = start
+    while pos < end:
+        block_end = buf.find(b'\n', min(pos + FOLD_BLOCK_SIZE, end) - 1, end) + 1 or end
+        block = buf[pos:block_end].lower()
+        found.extend(offset + pos for offset in _scan_literal(block, 0, len(block), literal))
+        pos = block_end
+    return found
+
+
+def _scan_literal(buf, start: int, end: int, literal: bytes) -> array:
+    found = array('Q')
+    if b'\n' in literal:
+        return found
+    pos = start
+    while True:
+        hit = buf.find(literal, pos, end)
+        if hit < 0:
+            break
+        found.append(buf.rfind(b'\n', start, hit) + 1 or start)
+        line_end = buf.find(b'\n', hit, end)
+        if line_end < 0:
+            break
+        pos = line_end + 1
+    return found
+
+
+def _scan_regex(buf, start: int, end: int, regex) -> array:
+    found = array('Q')
+    search = regex.search
+    pos = start
+    while pos <= end:
+        match = search(buf, pos, end)
+        if match is None:
+            break
+        hit = match.start()
+        if hit == end and (hit == start or buf[hit - 1] == 10):
+            break  # an empty match at the start of the next line
+        line_start = buf.rfind(b'\n', start, hit) + 1 or start
+        line_end = buf.find(b'\n', hit, end)
+        if line_end < 0:
+            line_end = end
+        # A match that runs across a newline does not count; re-check the
+        # line on its own, as a per-line search would.
+        if match.end() <= line_end or search(buf, line_start, line_end):
+            found.append(line_start)
+        pos = line_end + 1
+    return found
@@ -0,0 +1,429 @@
+import os
+import re
+import glob
+import heapq
+import queue
+import sys
+import threading
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import repeat
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from src.core.index_cache import IndexCache
+from src.core.log_processor import LogProcessor
+from src.core.query import Query
+from src.core.result_cache import ResultCache
+from src.core.stats import Stats
+from src.core.workers import CancelToken
+
+# Processors (each a file descriptor plus a mapping) kept open at once;
+# others are closed and reopened, from the index cache, when needed.
+MAX_OPEN_FILES = 32
+
+# Bound on the total size of the files mapped at once.
+MAX_MAPPED_BYTES = 16 * 1024 ** 3
+
+# Files searched at the same time.  Their range scans all go to the one
+# shared search pool, which bounds the actual parallelism; searching a few
+# files together keeps the pool busy across many small files.
+FILES_IN_FLIGHT = 4
+
+_ROTATED = re.compile(r'^(.*?)(?:[.-](\d+))?(\.(?:gz|bz2|xz))?$')
+_GLOB_CHARS = re.compile(r'[*?[]')
+
+
+class SessionBatch(NamedTuple):
+    """Matching line numbers from one file of a session, with overall progress."""
+    file_index: int
+    line_numbers: array
+    bytes_scanned: int
+    total_bytes: int
+
+
+def rotation_key(path: str) -> Tuple:
+    """Sort key putting a rotated set in chronological order.
+
+    ``app.log.2.gz``, ``app.log.1`` and ``app.log`` sort oldest first;
+    date-stamped rotations (``app.log-20230101``) sort by date, before the
+    numbered ones.
+    """
+    directory, name = os.path.split(path)
+    base, number, _ = _ROTATED.match(name).groups()
+    if number is None:
+        return directory, base, 2, 0
+    if len(number) < 4:
+        return directory, base, 1, -int(number)
+    return directory, base, 0, int(number)
+
+
+def expand_paths(patterns) -> List[str]:
+    """Expand files, directories and glob patterns into a list of files.
+
+    A directory stands for the files directly in it, hidden ones
+    excepted.  Each pattern's files are in rotation order; duplicates are
+    dropped.
+    """
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            found = [os.path.join(pattern, name) for name in os.listdir(pattern)
+                     if not name.startswith('.')]
+        elif _GLOB_CHARS.search(pattern):
+            found = glob.glob(pattern, recursive=True)
+        else:
+            found = [pattern]  # reported when opened if it is missing
+        for path in sorted(found, key=rotation_key):
+            real = os.path.realpath(path)
+            if real in seen or (path != pattern and not os.path.isfile(path)):
+                continue
+            seen.add(real)
+            paths.append(path)
+    return paths
+
+
+class SessionFile:
+    """A member of a LogSession; its processor is opened on demand."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.size = 0
+        self.total_lines = 0
+        self.processor = None
+        self.mapped_bytes = 0
+        self.pins = 0
+        self.lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"SessionFile({self.path!r})"
+
+
+class LogSession:
+    """A set of log files searched together, such as a rotated log set.
+
+    Each file gets its own LogProcessor, but they share the index cache,
+    the result cache and the search pool.  At most ``max_open`` of them
+    (and ``max_mapped_bytes`` of mappings) are open at once; the least
+    recently used unpinned ones are closed and reopened when needed, so a
+    session over hundreds of files does not run out of file descriptors
+    or address space.
+    """
+
+    def __init__(self, paths=(), max_open: int = MAX_OPEN_FILES,
+                 max_mapped_bytes: int = MAX_MAPPED_BYTES,
+                 index_backend: Optional[str] = None,
+                 index_cache: Optional[IndexCache] = None,
+                 search_backend: Optional[str] = None,
+                 max_workers: Optional[int] = None,
+                 result_cache: Optional[ResultCache] = None,
+                 stats: Optional[Stats] = None):
+        self.files: List[SessionFile] = []
+        self.max_open = max(1, max_open)
+        self.max_mapped_bytes = max_mapped_bytes
+        self.index_backend = index_backend
+        self.index_cache = index_cache if index_cache is not None else IndexCache()
+        self.search_backend = search_backend
+        self.max_workers = max_workers
+        self.result_cache = result_cache if result_cache is not None else ResultCache()
+        # Shared by every file's processor, so it outlives their eviction
+        self.stats = stats if stats is not None else Stats()
+        # Open members, least recently used first
+        self._open_files = OrderedDict()
+        self._lock = threading.Lock()
+        self._jobs = None
+        self._search_token = None
+        if paths:
+            self.add(*paths)
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    @property
+    def total_lines(self) -> int:
+        return sum(member.total_lines for member in self.files)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(member.size for member in self.files)
+
+    @property
+    def open_count(self) -> int:
+        return len(self._open_files)
+
+    def add(self, *patterns: str) -> int:
+        """Add files, directories or glob patterns; returns the number of new files."""
+        known = {os.path.realpath(member.path) for member in self.files}
+        added = [SessionFile(path) for path in expand_paths(patterns)
+                 if os.path.realpath(path) not in known]
+        self.files.extend(added)
+        self._name_files()
+        return len(added)
+
+    def _name_files(self) -> None:
+        """Name files by their path below the directory they all share."""
+        if len(self.files) < 2:
+            for member in self.files:
+                member.name = os.path.basename(member.path)
+            return
+        directories = [os.path.dirname(os.path.abspath(member.path)) for member in self.files]
+        try:
+            common = os.path.commonpath(directories)
+        except ValueError:
+            common = ''  # different drives
+        for member in self.files:
+            path = os.path.abspath(member.path)
+            member.name = os.path.relpath(path, common) if common else path
+
+    def open(self, progress: Optional[Callable[[int, int], None]] = None,
+             cancel: Optional[CancelToken] = None) -> bool:
+        """Index every file, several at a time.
+
+        Files that cannot be opened are dropped from the session.  Returns
+        False if none could be opened (or the indexing was cancelled).
+        """
+        workers = self.max_workers or os.cpu_count() or 1
+        failed = set()
+        done = 0
+
+        def index(file_index):
+            if not (cancel and cancel.cancelled):
+                self.acquire(file_index)
+                self.release(file_index)
+
+        with ThreadPoolExecutor(min(workers, max(1, len(self.files))),
+                                thread_name_prefix='logexplorer-session-index') as pool:
+            futures = [(member, pool.submit(index, i)) for i, member in enumerate(self.files)]
+            for member, future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Error opening {member.path}: {e}", file=sys.stderr)
+                    failed.add(member)
+                done += 1
+                if progress:
+                    progress(done, len(futures))
+        if failed:
+            with self._lock:
+                for member in failed:
+                    self._open_files.pop(member, None)
+            self.files = [member for member in self.files if member not in failed]
+            self._name_files()
+        return bool(self.files) and not (cancel and cancel.cancelled)
+
+    def acquire(self, file_index: int) -> LogProcessor:
+        """Return the file's processor, opening it if needed, and pin it open.
+
+        Every acquire must be matched by a release; pinned processors are
+        never closed to make room for others.
+        """
+        member = self.files[file_index]
+        with member.lock:
+            with self._lock:
+                if member.processor is not None:
+                    member.pins += 1
+                    self._open_files.move_to_end(member)
+                    return member.processor
+            processor = LogProcessor(index_backend=self.index_backend,
+                                     index_cache=self.index_cache,
+                                     search_backend=self.search_backend,
+                                     max_workers=self.max_workers,
+                                     result_cache=self.result_cache,
+                                     stats=self.stats)
+            if not processor.open_file(member.path):
+                raise IOError(f"Cannot open {member.path}")
+            member.size = processor.file_size
+            member.total_lines = processor.total_lines
+            member.mapped_bytes = processor.file_identity.size
+            with self._lock:
+                member.processor = processor
+                member.pins += 1
+                self._open_files[member] = None
+                evicted = self._evict()
+        for old in evicted:
+            old.close()
+        return processor
+
+    def release(self, file_index: int) -> None:
+        member = self.files[file_index]
+        with self._lock:
+            member.pins -= 1
+            evicted = self._evict()
+        for old in evicted:
+            old.close()
+
+    @contextmanager
+    def pinned(self, file_index: int) -> Iterator[LogProcessor]:
+        processor = self.acquire(file_index)
+        try:
+            yield processor
+        finally:
+            self.release(file_index)
+
+    def _evict(self) -> List[LogProcessor]:
+        """Detach least recently used unpinned processors until within bounds."""
+        evicted = []
+        mapped = sum(member.mapped_bytes for member in self._open_files)
+        for member in list(self._open_files):
+            if len(self._open_files) <= self.max_open and mapped <= self.max_mapped_bytes:
+                break
+            if member.pins:
+                continue
+            del self._open_files[member]
+            mapped -= member.mapped_bytes
+            evicted.append(member.processor)
+            member.processor = None
+        return evicted
+
+    def get_line(self, file_index: int, line_number: int) -> str:
+        with self.pinned(file_index) as processor:
+            return processor.get_line(line_number)
+
+    def get_line_bytes(self, file_index: int, line_number: int, start: int = 0,
+                       end: Optional[int] = None) -> bytes:
+        with self.pinned(file_index) as processor:
+            return processor.get_line_bytes(line_number, start, end)
+
+    def iter_search(self, pattern: str, case_sensitive: bool = False,
+                    cancel: Optional[CancelToken] = None, exclusive: bool = True,
+                    within: Optional[Dict[int, array]] = None,
+                    query: bool = False) -> Iterator[SessionBatch]:
+        """Search every file, yielding matches file by file, in file order.
+
+        Up to FILES_IN_FLIGHT files are searched at once; batches of later
+        files are held back until the earlier files are done.  With
+        ``within`` (file index to line numbers), only those lines are
+        searched, as with LogProcessor.iter_refine.  With ``query``, the
+        pattern is a boolean query (see query.Query).  Progress is weighted
+        by file size.  If a file cannot be searched, its error is raised
+        once the files before it are done (an OSError names the file).
+        """
+        if not pattern or not self.files:
+            return
+        if query:
+            Query(pattern)  # a ValueError now rather than one per file
+        cancel = cancel or CancelToken()
+        if exclusive:
+            if self._search_token is not None:
+                self._search_token.cancel()
+            self._search_token = cancel
+        if self._jobs is None:
+            self._jobs = ThreadPoolExecutor(FILES_IN_FLIGHT, thread_name_prefix='logexplorer-session')
+
+        indices = [i for i in range(len(self.files)) if within is None or i in within]
+        weights = {i: max(1, self.files[i].size) for i in indices}
+        total = sum(weights.values())
+        done = 0
+        pending = deque()
+        remaining = iter(indices)
+        try:
+            while True:
+                while len(pending) < FILES_IN_FLIGHT and not cancel.cancelled:
+                    i = next(remaining, None)
+                    if i is None:
+                        break
+                    batches = queue.Queue()
+                    lines = within[i] if within is not None else None
+                    self._jobs.submit(self._search_file, i, batches, pattern, case_sensitive,
+                                      cancel, lines, query)
+                    pending.append((i, batches))
+                if not pending:
+                    return
+                i, batches = pending[0]
+                batch = batches.get()
+                if cancel.cancelled:
+                    return
+                if isinstance(batch, Exception):
+                    raise batch
+                if batch is None:
+                    pending.popleft()
+                    done += weights[i]
+                    yield SessionBatch(i, array('I'), done, total)
+                    continue
+                share = weights[i] * batch.bytes_scanned // max(1, batch.total_bytes)
+                yield SessionBatch(i, batch.line_numbers, done + share, total)
+        finally:
+            if pending:
+                # Stops the files still being searched if the caller gave up
+                cancel.cancel()
+            if self._search_token is cancel:
+                self._search_token = None
+
+    def _search_file(self, file_index: int, batches: queue.Queue, pattern: str,
+                     case_sensitive: bool, cancel: CancelToken, lines: Optional[array],
+                     query: bool = False) -> None:
+        try:
+            with self.pinned(file_index) as processor:
+                if lines is None:
+                    found = processor.iter_search(pattern, case_sensitive, cancel, exclusive=False,
+                                                  query=query)
+                else:
+                    found = processor.iter_refine(lines, pattern, case_sensitive, cancel, query)
+                for batch in found:
+                    batches.put(batch)
+        except Exception as e:
+            if isinstance(e, OSError) and e.filename is None:
+                e.filename = self.files[file_index].path
+            batches.put(e)
+        finally:
+            batches.put(None)
+
+    def search(self, pattern: str, case_sensitive: bool = False,
+               cancel: Optional[CancelToken] = None, order: str = 'file',
+               time_format: Optional[str] = None, query: bool = False) -> List[Tuple[int, int]]:
+        """Search every file and return (file index, line number) pairs.
+
+        order is 'file' (file by file, in session order) or 'time' (merged
+        by the lines' timestamps, see merge_by_time).
+        """
+        if order not in ('file', 'time'):
+            raise ValueError(f"Unknown result order: {order}")
+        cancel = cancel or CancelToken()
+        results = {}
+        for batch in self.iter_search(pattern, case_sensitive, cancel, query=query):
+            if len(batch.line_numbers):
+                results.setdefault(batch.file_index, array(batch.line_numbers.typecode)).extend(
+                    batch.line_numbers)
+        if cancel.cancelled:
+            return []
+        if order == 'time':
+            return list(self.merge_by_time(results, time_format))
+        return [(i, line) for i in sorted(results) for line in results[i]]
+
+    def merge_by_time(self, results: Dict[int, array],
+                      time_format: Optional[str] = None) -> Iterator[Tuple[int, int]]:
+        """Merge per-file results into one stream ordered by timestamp.
+
+        results maps file indices to ascending line numbers.  Each file's
+        timestamps are read while it is open; the k-way merge itself is
+        lazy and keeps file order for equal times.  Lines without a
+        timestamp stay after the line before them.
+        """
+        streams = []
+        for i in sorted(results):
+            with self.pinned(i) as processor:
+                times = processor.line_times(results[i], time_format)
+            streams.append(zip(times, repeat(i), results[i]))
+        for _, i, line in heapq.merge(*streams):
+            yield i, line
+
+    def close(self) -> None:
+        """Close every file; the session can be searched again afterwards."""
+        if self._search_token is not None:
+            self._search_token.cancel()
+            self._search_token = None
+        if self._jobs is not None:
+            self._jobs.shutdown(wait=False)
+            self._jobs = None
+        with self._lock:
+            members = list(self._open_files)
+            self._open_files.clear()
+            processors = [member.processor for member in members]
+            for member in members:
+                member.processor = None
+                member.pins = 0
+        for processor in processors:
+            processor.close()
@@ -0,0 +1,336 @@
+"""Lightweight instrumentation of the engine's hot paths.
+
+A Stats object collects per-phase timings (open, index, search, refine,
+row reads, ...), bytes and lines processed, worker chunk durations and
+cache hit counts.  Collecting is off unless enabled, and then costs one
+attribute check per instrumented call.  Three environment variables help
+with bug reports:
+
+- ``LOGEXPLORER_STATS=1`` collects stats from the start (the debug panel
+  and ``python -m src.cli --stats`` turn collecting on themselves).
+- ``LOGEXPLORER_TRACE=trace.json`` also writes every phase and worker
+  chunk to a Chrome trace-event file at exit, viewable in Perfetto or
+  chrome://tracing.
+- ``LOGEXPLORER_PROFILE=search`` (or ``open``, ``refine``) runs cProfile
+  around the next such operation and prints the top functions to stderr;
+  ``search:out.prof`` saves the profile for pstats or snakeviz instead.
+  cProfile only sees the calling thread, so time spent in search workers
+  shows up as waiting; the chunk timings cover that side.
+"""
+import os
+import sys
+import time
+import atexit
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional
+
+STATS_ENV = 'LOGEXPLORER_STATS'
+TRACE_ENV = 'LOGEXPLORER_TRACE'
+PROFILE_ENV = 'LOGEXPLORER_PROFILE'
+
+# Functions listed when a profile is printed rather than saved.
+PROFILE_TOP = 25
+
+_trace_events: List[dict] = []
+_trace_lock = threading.Lock()
+_profiled = set()
+
+
+def default_enabled() -> bool:
+    return os.environ.get(STATS_ENV, '') not in ('', '0') or bool(os.environ.get(TRACE_ENV))
+
+
+class PhaseStats:
+    """Totals for one phase, and the figures of its last run."""
+
+    __slots__ = ('count', 'seconds', 'bytes', 'lines', 'last_seconds', 'last_bytes', 'last_lines')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.lines = 0
+        self.last_seconds = 0.0
+        self.last_bytes = 0
+        self.last_lines = 0
+
+    def to_dict(self) -> dict:
+        result = {'count': self.count, 'seconds': round(self.seconds, 6),
+                  'last_seconds': round(self.last_seconds, 6)}
+        if self.bytes:
+            result.update(bytes=self.bytes, last_bytes=self.last_bytes,
+                          mb_per_second=round(self.last_bytes / 1e6 / max(self.last_seconds, 1e-9), 1))
+        if self.lines:
+            result.update(lines=self.lines, last_lines=self.last_lines,
+                          lines_per_second=round(self.last_lines / max(self.last_seconds, 1e-9)))
+        return result
+
+
+class Span:
+    """A running phase; set ``bytes`` and ``lines`` before it ends."""
+
+    __slots__ = ('stats', 'name', 'bytes', 'lines', 'started')
+
+    def __init__(self, stats: 'Stats', name: str):
+        self.stats = stats
+        self.name = name
+        self.bytes = 0
+        self.lines = 0
+        self.started = 0.0
+
+    def __enter__(self) -> 'Span':
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stats.record(self.name, time.perf_counter() - self.started, self.bytes, self.lines,
+                          self.started)
+
+
+class _NullSpan:
+    """Stands in for a Span while collecting is off."""
+
+    __slots__ = ()
+    bytes = lines = 0
+
+    def __setattr__(self, name, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Stats:
+    """Collected timings and counters, shared by the processors of a session."""
+
+    def __init__(self, enabled: Optional[bool] = None):
+        self.enabled = default_enabled() if enabled is None else enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.phases: Dict[str, PhaseStats] = {}
+            self.counters: Dict[str, int] = {}
+            # Worker durations of the last search's chunks, in seconds
+            self.chunk_seconds: List[float] = []
+            self.chunk_bytes: List[int] = []
+
+    def phase(self, name: str):
+        """Context manager timing one run of a phase."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name)
+
+    def record(self, name: str, seconds: float, nbytes: int = 0, lines: int = 0,
+               started: Optional[float] = None) -> None:
+        with self._lock:
+            phase = self.phases.get(name)
+            if phase is None:
+                phase = self.phases[name] = PhaseStats()
+            phase.count += 1
+            phase.seconds += seconds
+            phase.bytes += nbytes
+            phase.lines += lines
+            phase.last_seconds = seconds
+            phase.last_bytes = nbytes
+            phase.last_lines = lines
+        if started is not None and _tracing():
+            args = {key: value for key, value in (('bytes', nbytes), ('lines', lines)) if value}
+            _trace(name, started, seconds, args=args)
+
+    def count(self, name: str, n: int = 1) -> None:
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def start_chunks(self) -> None:
+        """Forget the previous search's chunks."""
+        with self._lock:
+            self.chunk_seconds = []
+            self.chunk_bytes = []
+
+    def chunk(self, seconds: float, nbytes: int, started: float, worker: str) -> None:
+        """Record the time a worker spent on one range of a search."""
+        with self._lock:
+            self.chunk_seconds.append(seconds)
+            self.chunk_bytes.append(nbytes)
+        if _tracing():
+            _trace('chunk', started, seconds, worker, {'bytes': nbytes})
+
+    def timed(self, name: str, items: Iterable, nbytes=None, lines: int = 0) -> Iterator:
+        """Yield from items, timing only the work of producing them as phase ``name``.
+
+        The time the caller spends between items is not counted.  nbytes,
+        if given, is called with the last item to get the bytes processed.
+        """
+        profile = _start_profile(name)
+        if not self.enabled and profile is None:
+            yield from items
+            return
+        items = iter(items)
+        started = time.perf_counter()
+        busy = 0.0
+        last = None
+        try:
+            while True:
+                before = time.perf_counter()
+                if profile is not None:
+                    profile.enable()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                finally:
+                    if profile is not None:
+                        profile.disable()
+                    busy += time.perf_counter() - before
+                last = item
+                yield item
+        finally:
+            if self.enabled:
+                done = nbytes(last) if nbytes is not None and last is not None else 0
+                self.record(name, busy, done, lines)
+                if _tracing():
+                    _trace(name + ' (wall)', started, time.perf_counter() - started)
+            if profile is not None:
+                _finish_profile(name, profile)
+
+    def hit_rate(self, name: str) -> Optional[float]:
+        """Fraction of ``name.hit`` among ``name.hit`` and ``name.miss``."""
+        hits = self.counters.get(name + '.hit', 0)
+        total = hits + self.counters.get(name + '.miss', 0)
+        return hits / total if total else None
+
+    def snapshot(self) -> dict:
+        """Everything collected so far, as plain data (ready for JSON)."""
+        with self._lock:
+            phases = {name: phase.to_dict() for name, phase in self.phases.items()}
+            counters = dict(self.counters)
+            chunks = list(self.chunk_seconds)
+            chunk_bytes = sum(self.chunk_bytes)
+        result = {'enabled': self.enabled, 'phases': phases, 'counters': counters}
+        caches = sorted({name.rsplit('.', 1)[0] for name in counters
+                         if name.endswith(('.hit', '.miss'))})
+        result['hit_rates'] = {name: round(self.hit_rate(name), 3) for name in caches}
+        if chunks:
+            mean = sum(chunks) / len(chunks)
+            result['chunks'] = {
+                'count': len(chunks), 'bytes': chunk_bytes,
+                'mean_seconds': round(mean, 6), 'max_seconds': round(max(chunks), 6),
+                'min_seconds': round(min(chunks), 6),
+                # How much the slowest worker range lags the average one
+                'skew': round(max(chunks) / mean, 2) if mean else 1.0,
+            }
+        return result
+
+
+def format_stats(snapshot: dict) -> str:
+    """Render a snapshot as a few lines of text for the debug panel."""
+    if not snapshot['enabled']:
+        return "Stats collection is off"
+    lines = []
+    for name, phase in sorted(snapshot['phases'].items()):
+        text = f"{name:<16} {phase['count']:>6}x  last {phase['last_seconds'] * 1000:9.2f} ms"
+        if 'mb_per_second' in phase:
+            text += f"  {phase['last_bytes'] / 1e6:9.1f} MB  {phase['mb_per_second']:8.1f} MB/s"
+        if 'lines_per_second' in phase:
+            text += f"  {phase['lines_per_second']:>12,} lines/s"
+        lines.append(text)
+    chunks = snapshot.get('chunks')
+    if chunks:
+        lines.append(f"last search: {chunks['count']} chunks, mean {chunks['mean_seconds'] * 1000:.2f} ms, "
+                     f"max {chunks['max_seconds'] * 1000:.2f} ms, skew {chunks['skew']:.2f}")
+    for name, rate in snapshot['hit_rates'].items():
+        hits = snapshot['counters'].get(name + '.hit', 0)
+        misses = snapshot['counters'].get(name + '.miss', 0)
+        lines.append(f"{name}: {rate:.0%} hits ({hits} hits, {misses} misses)")
+    others = {name: value for name, value in snapshot['counters'].items()
+              if not name.endswith(('.hit', '.miss'))}
+    for name, value in sorted(others.items()):
+        lines.append(f"{name}: {value}")
+    return "\n".join(lines) or "Nothing recorded yet"
+
+
+def _tracing() -> bool:
+    return bool(os.environ.get(TRACE_ENV))
+
+
+def _trace(name: str, started: float, seconds: float, worker: Optional[str] = None,
+           args: Optional[dict] = None) -> None:
+    """Add a complete ('X') event to the trace."""
+    if worker is None:
+        pid, tid = os.getpid(), threading.get_ident()
+    else:
+        pid, tid = (int(part) for part in worker.split(':'))
+    event = {'name': name, 'ph': 'X', 'ts': round(started * 1e6, 1), 'dur': round(seconds * 1e6, 1),
+             'pid': pid, 'tid': tid}
+    if args:
+        event['args'] = args
+    with _trace_lock:
+        _trace_events.append(event)
+
+
+def write_trace(path: Optional[str] = None) -> None:
+    """Write the trace events collected so far (to $LOGEXPLORER_TRACE by default)."""
+    import json
+    path = path or os.environ.get(TRACE_ENV)
+    if not path:
+        return
+    with _trace_lock:
+        events = list(_trace_events)
+    try:
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    except OSError as e:
+        print(f"Error writing trace to {path}: {e}", file=sys.stderr)
+
+
+atexit.register(write_trace)
+
+
+def _start_profile(name: str):
+    """A cProfile.Profile if $LOGEXPLORER_PROFILE asks for this operation and it is not done yet."""
+    setting = os.environ.get(PROFILE_ENV)
+    if not setting or setting.split(':', 1)[0] != name or name in _profiled:
+        return None
+    _profiled.add(name)
+    import cProfile
+    return cProfile.Profile()
+
+
+def _finish_profile(name: str, profile) -> None:
+    import pstats
+    _, _, path = os.environ.get(PROFILE_ENV, '').partition(':')
+    if path:
+        profile.dump_stats(path)
+        print(f"Profile of {name} saved to {path}", file=sys.stderr)
+        return
+    print(f"Profile of {name}:", file=sys.stderr)
+    pstats.Stats(profile, stream=sys.stderr).sort_stats('cumulative').print_stats(PROFILE_TOP)
+
+
+def profiled(name: str):
+    """Context manager running cProfile around a non-iterating operation, if asked for."""
+    profile = _start_profile(name)
+    return _ProfileBlock(name, profile) if profile is not None else _NULL_SPAN
+
+
+class _ProfileBlock:
+    def __init__(self, name: str, profile):
+        self.name = name
+        self.profile = profile
+
+    def __enter__(self):
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.disable()
+        _finish_profile(self.name, self.profile)
@@ -0,0 +1,320 @@
+import re
+import calendar
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from typing import Callable, Iterable, List, Optional, Tuple
+
+# Lines between timestamp samples; a lookup parses at most two such spans.
+SAMPLE_INTERVAL = 1024
+
+# Lines inspected when guessing a file's timestamp format.
+DETECT_LINES = 200
+
+_MONTHS = {name: i for i, name in enumerate(
+    (b'Jan', b'Feb', b'Mar', b'Apr', b'May', b'Jun',
+     b'Jul', b'Aug', b'Sep', b'Oct', b'Nov', b'Dec'), 1)}
+
+# Syslog timestamps carry no year; a fixed leap year keeps Feb 29 valid
+# and comparisons consistent as long as both sides are parsed the same way.
+_SYSLOG_YEAR = 2000
+
+
+def _offset_seconds(tz: Optional[bytes]) -> int:
+    if not tz or tz == b'Z':
+        return 0
+    tz = tz.replace(b':', b'')
+    seconds = int(tz[1:3]) * 3600 + int(tz[3:5]) * 60
+    return -seconds if tz[:1] == b'-' else seconds
+
+
+def _fraction(digits: Optional[bytes]) -> float:
+    return int(digits) / 10 ** len(digits) if digits else 0.0
+
+
+def _parse_iso(m) -> float:
+    year, month, day, hour, minute, second, frac, tz = m.groups()
+    seconds = calendar.timegm((int(year), int(month), int(day), int(hour), int(minute), int(second)))
+    return seconds + _fraction(frac) - _offset_seconds(tz)
+
+
+def _parse_syslog(m) -> float:
+    month, day, hour, minute, second, frac = m.groups()
+    seconds = calendar.timegm((_SYSLOG_YEAR, _MONTHS[month], int(day), int(hour), int(minute), int(second)))
+    return seconds + _fraction(frac)
+
+
+def _parse_apache(m) -> float:
+    day, month, year, hour, minute, second, tz = m.groups()
+    seconds = calendar.timegm((int(year), _MONTHS[month], int(day), int(hour), int(minute), int(second)))
+    return seconds - _offset_seconds(tz)
+
+
+def _parse_epoch(m) -> float:
+    whole, frac = m.groups()
+    if len(whole) == 13:  # milliseconds
+        return int(whole) / 1000.0
+    return int(whole) + _fraction(frac)
+
+
+class TimestampFormat:
+    """A named timestamp pattern and the parser turning its match into epoch seconds."""
+
+    def __init__(self, name: str, pattern: bytes, parse: Callable[[object], float]):
+        self.name = name
+        self.regex = re.compile(pattern)
+        self.parse = parse
+
+    def extract(self, line: bytes) -> Optional[float]:
+        m = self.regex.search(line)
+        if m is None:
+            return None
+        try:
+            return self.parse(m)
+        except (ValueError, KeyError, OverflowError):
+            return None
+
+
+_MONTH_RE = rb'(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)'
+
+FORMATS = [
+    TimestampFormat('iso8601',
+                    rb'(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:[.,](\d+))?'
+                    rb'(Z|[+-]\d{2}:?\d{2})?', _parse_iso),
+    TimestampFormat('apache',
+                    rb'\[(\d{2})/' + _MONTH_RE + rb'/(\d{4}):(\d{2}):(\d{2}):(\d{2}) ([+-]\d{4})\]',
+                    _parse_apache),
+    TimestampFormat('syslog',
+                    _MONTH_RE + rb' {1,2}(\d{1,2}) (\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?',
+                    _parse_syslog),
+    TimestampFormat('epoch', rb'(?<![\d.])(1\d{12}|1\d{9})(?:\.(\d+))?(?![\d])', _parse_epoch),
+]
+
+_FORMATS_BY_NAME = {fmt.name: fmt for fmt in FORMATS}
+
+# strptime directives understood in user-supplied formats
+_DIRECTIVES = {
+    'Y': rb'\d{4}', 'm': rb'\d{1,2}', 'd': rb'\d{1,2}', 'H': rb'\d{1,2}', 'M': rb'\d{2}',
+    'S': rb'\d{2}', 'f': rb'\d{1,6}', 'b': rb'[A-Z][a-z]{2}', 'y': rb'\d{2}', 'z': rb'[+-]\d{4}',
+    'j': rb'\d{3}', 'p': rb'[AaPp][Mm]', 'I': rb'\d{1,2}', 'e': rb' ?\d{1,2}', '%': rb'%',
+}
+
+
+def strptime_format(time_format: str) -> TimestampFormat:
+    """Build a TimestampFormat from a strptime-style format string."""
+    pattern = b''
+    i = 0
+    while i < len(time_format):
+        char = time_format[i]
+        if char == '%' and i + 1 < len(time_format):
+            directive = time_format[i + 1]
+            if directive not in _DIRECTIVES:
+                raise ValueError(f"Unsupported time format directive: %{directive}")
+            pattern += _DIRECTIVES[directive]
+            i += 2
+        else:
+            pattern += re.escape(char).encode('utf-8')
+            i += 1
+    strptime = time_format.replace('%e', '%d')
+
+    def parse(m):
+        parsed = datetime.strptime(m.group(0).decode('ascii').replace('  ', ' '), strptime)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+    return TimestampFormat(time_format, b'(' + pattern + b')', parse)
+
+
+def resolve_format(time_format: Optional[str]) -> Optional[TimestampFormat]:
+    """Map a format name, strptime string, or None/'auto' to a TimestampFormat."""
+    if not time_format or time_format == 'auto':
+        return None
+    if time_format in _FORMATS_BY_NAME:
+        return _FORMATS_BY_NAME[time_format]
+    return strptime_format(time_format)
+
+
+def detect_format(lines: Iterable[bytes]) -> Optional[TimestampFormat]:
+    """Return the known format matching most of the given lines."""
+    lines = list(lines)
+    best, best_hits = None, 0
+    for fmt in FORMATS:
+        hits = sum(1 for line in lines if fmt.extract(line) is not None)
+        if hits > best_hits:
+            best, best_hits = fmt, hits
+    return best
+
+
+def parse_time(value, fmt: Optional[TimestampFormat], day_start: Optional[float] = None) -> float:
+    """Turn a user-supplied time into epoch seconds.
+
+    Accepts numbers, datetimes, strings in the file's own format or any
+    known format, plain epoch seconds, and bare times of day ("14:02", "14:02:30"), which are
+    taken to be on the day of ``day_start``.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    text = value.strip().encode('utf-8')
+    for candidate in ([fmt] if fmt else []) + FORMATS:
+        parsed = candidate.extract(text)
+        if parsed is not None:
+            return parsed
+    if re.fullmatch(rb'\d+(?:\.\d+)?', text):
+        return float(text)
+    m = re.fullmatch(rb'(\d{1,2}):(\d{2})(?::(\d{2})(?:[.,](\d+))?)?', text)
+    if m:
+        hour, minute, second, frac = m.groups()
+        day = (day_start or 0) // 86400 * 86400
+        return day + int(hour) * 3600 + int(minute) * 60 + int(second or 0) + _fraction(frac)
+    raise ValueError(f"Unrecognized time: {value!r}")
+
+
+class TimestampIndex:
+    """Sparse index of line timestamps for binary-search seeking by time.
+
+    Every ``interval``-th line is sampled (or the next line carrying a
+    timestamp, for continuation lines).  A running maximum over the samples
+    keeps the index sorted even when records are mildly out of order; the
+    exact boundaries are then found by parsing the lines around the two
+    nearest samples.  Lines without a timestamp take the one before them.
+    """
+
+    def __init__(self, fmt: TimestampFormat, interval: int = SAMPLE_INTERVAL):
+        self.format = fmt
+        self.interval = interval
+        self.lines = array('Q')
+        self.times = array('d')
+        self.maxima = array('d')
+        self.covered_lines = 0
+
+    def extend(self, get_line_bytes: Callable[[int], bytes], total_lines: int) -> None:
+        """Sample lines from covered_lines up to total_lines."""
+        extract = self.format.extract
+        line = -(-self.covered_lines // self.interval) * self.interval
+        while line < total_lines:
+            stop = min(total_lines, line + self.interval)
+            for candidate in range(line, stop):
+                ts = extract(get_line_bytes(candidate))
+                if ts is not None:
+                    if not self.lines or candidate > self.lines[-1]:
+                        self.lines.append(candidate)
+                        self.times.append(ts)
+                        self.maxima.append(max(ts, self.maxima[-1]) if self.maxima else ts)
+                    break
+            line = stop
+        self.covered_lines = total_lines
+
+    @property
+    def first_time(self) -> Optional[float]:
+        return self.times[0] if self.times else None
+
+    def find_range(self, start: float, end: float, get_line_bytes: Callable[[int], bytes],
+                   total_lines: int) -> Tuple[int, int]:
+        """Return the [first, last) line range whose timestamps fall in [start, end]."""
+        if not self.lines or end < start:
+            return 0, 0
+        first = self._first_at_or_after(start, get_line_bytes, total_lines)
+        last = self._end_of(end, get_line_bytes, total_lines)
+        return first, max(first, last)
+
+    def time_at(self, line: int, get_line_bytes: Callable[[int], bytes]) -> Optional[float]:
+        """Timestamp of a covered line; a line without one takes the one before it."""
+        k = bisect_right(self.lines, line) - 1
+        floor = self.lines[k] if k >= 0 else 0
+        extract = self.format.extract
+        for candidate in range(line, floor - 1, -1):
+            ts = extract(get_line_bytes(candidate))
+            if ts is not None:
+                return ts
+        return None
+
+    def _span(self, k: int, total_lines: int) -> Tuple[int, int]:
+        """Lines from sample k - 1 up to sample k (or the end of the file)."""
+        return self.lines[k - 1], self.lines[k] if k < len(self.lines) else total_lines
+
+    def _first_at_or_after(self, when: float, get_line_bytes, total_lines: int) -> int:
+        k = bisect_left(self.maxima, when)
+        if k == 0:
+            return 0
+        lo, hi = self._span(k, total_lines)
+        extract = self.format.extract
+        current = self.times[k - 1]
+        for line in range(lo, hi):
+            ts = extract(get_line_bytes(line))
+            if ts is not None:
+                current = ts
+            if current >= when:
+                return line
+        return hi
+
+    def _end_of(self, when: float, get_line_bytes, total_lines: int) -> int:
+        """One past the last line stamped at or before when."""
+        k = bisect_right(self.maxima, when)
+        if k == 0:
+            return 0
+        lo, hi = self._span(k, total_lines)
+        extract = self.format.extract
+        current = self.times[k - 1]
+        boundary = lo + 1
+        for line in range(lo, hi):
+            ts = extract(get_line_bytes(line))
+            if ts is not None:
+                current = ts
+            if current <= when:
+                boundary = line + 1
+        return boundary
+
+
+class LineRange:
+    """A lazy, pageable range of lines of a LogProcessor."""
+
+    def __init__(self, processor, start: int, end: int):
+        self.processor = processor
+        self.start = start
+        self.end = end
+
+    def __len__(self) -> int:
+        return max(0, self.end - self.start)
+
+    def __bool__(self) -> bool:
+        return self.end > self.start
+
+    def __repr__(self) -> str:
+        return f"LineRange({self.start}, {self.end})"
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, LineRange):
+            return (self.processor, self.start, self.end) == (other.processor, other.start, other.end)
+        return NotImplemented
+
+    def __iter__(self):
+        for line in range(self.start, self.end):
+            yield line, self.processor.get_line(line)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step != 1:
+                raise ValueError("LineRange slices do not support steps")
+            return LineRange(self.processor, self.start + start, self.start + max(start, stop))
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("LineRange index out of range")
+        line = self.start + item
+        return line, self.processor.get_line(line)
+
+    def lines(self, offset: int, count: int) -> List[str]:
+        """Return up to count lines starting offset lines into the range."""
+        start = self.start + max(0, offset)
+        return self.processor.get_lines(start, min(self.end, start + count))
+
+    def search(self, pattern: str, case_sensitive: bool = False) -> Optional[List[Tuple[int, str]]]:
+        """Search for a pattern within this range only (None if it was cancelled)."""
+        return self.processor.search(pattern, case_sensitive, start_line=self.start,
+                                     end_line=self.end)
@@ -0,0 +1,191 @@
+import os
+import mmap
+import time
+import atexit
+import threading
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from src.core.line_index import LineIndex
+from src.core.search_engine import SearchPattern, scan_range
+
+BACKENDS = ('auto', 'thread', 'process')
+BACKEND_ENV = 'LOGEXPLORER_SEARCH_BACKEND'
+
+# 'auto' only pays for process start-up and IPC on files at least this big.
+PROCESS_MIN_FILE_SIZE = 64 * 1024 * 1024
+
+# Ranges are sized so every worker gets several, letting fast workers pick
+# up the slack of slow ones, without making per-task overhead noticeable.
+CHUNKS_PER_WORKER = 8
+MIN_CHUNK_BYTES = 1024 * 1024
+MAX_CHUNK_BYTES = 16 * 1024 * 1024
+
+# How often a caller blocked on a worker checks for cancellation.
+CANCEL_POLL_SECONDS = 0.05
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class CancelToken:
+    """Cooperative cancellation flag shared by a caller and its workers."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+def default_backend() -> str:
+    backend = os.environ.get(BACKEND_ENV, 'auto')
+    return backend if backend in BACKENDS else 'auto'
+
+
+def resolve_backend(backend: str, file_size: int) -> str:
+    """Pick the concrete backend ('thread' or 'process') for a search."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown search backend: {backend}")
+    if backend == 'auto':
+        if file_size >= PROCESS_MIN_FILE_SIZE and (os.cpu_count() or 1) > 1:
+            return 'process'
+        return 'thread'
+    return backend
+
+
+def get_pool(backend: str, max_workers: Optional[int] = None) -> Executor:
+    """Return the shared, persistent pool for a concrete backend."""
+    workers = max_workers or os.cpu_count() or 1
+    with _pools_lock:
+        pool = _pools.get((backend, workers))
+        if pool is None:
+            if backend == 'process':
+                # Imported here: multiprocessing is slow to import, and
+                # only needed once a big file is searched
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                # Spawned rather than forked: the GUI process has threads.
+                pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+            else:
+                pool = ThreadPoolExecutor(workers, thread_name_prefix='logexplorer-search')
+            _pools[(backend, workers)] = pool
+        return pool
+
+
+def shutdown_pools() -> None:
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=False)
+        _pools.clear()
+
+
+atexit.register(shutdown_pools)
+
+
+def byte_ranges(index: LineIndex, start: int, end: int, workers: int) -> List[Tuple[int, int]]:
+    """Split [start, end) into line-aligned ranges for a pool of workers.
+
+    Ranges start small and double up to the working size, so the first
+    results of a scan arrive quickly.
+    """
+    chunk = (end - start) // (workers * CHUNKS_PER_WORKER)
+    chunk = max(MIN_CHUNK_BYTES, min(MAX_CHUNK_BYTES, chunk))
+    step = MIN_CHUNK_BYTES
+    ranges = []
+    pos = start
+    while pos < end:
+        target = pos + step
+        step = min(step * 2, chunk)
+        if target >= end:
+            stop = end
+        else:
+            stop = min(end, index.offsets[index.line_at(target) + 1])
+        ranges.append((pos, stop))
+        pos = stop
+    return ranges
+
+
+def ordered_results(submit: Callable[[object], Future], items: Iterable, window: int,
+                    cancel: Optional[CancelToken] = None) -> Iterator[Tuple[object, object]]:
+    """Run submit(item) for each item, yielding (item, result) in item order.
+
+    At most ``window`` tasks are in flight.  Once ``cancel`` is set (or the
+    generator is closed) no more tasks are submitted and queued ones are
+    dropped, so workers are free again after at most one range each.
+    """
+    pending = deque()
+    items = iter(items)
+    try:
+        while True:
+            while len(pending) < window and not (cancel and cancel.cancelled):
+                item = next(items, None)
+                if item is None:
+                    break
+                pending.append((item, submit(item)))
+            if not pending:
+                return
+            item, future = pending.popleft()
+            while not future.done():
+                if cancel and cancel.cancelled:
+                    future.cancel()
+                    return
+                wait((future,), timeout=CANCEL_POLL_SECONDS)
+            if cancel and cancel.cancelled:
+                return
+            yield item, future.result()
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+# Worker-process side: each process maps the files it is asked to scan once
+# and keeps a few mappings around for follow-up tasks.
+_MAX_WORKER_MAPS = 4
+_worker_maps = OrderedDict()
+
+
+def map_file(path: str, inode: int, size: int):
+    key = (path, inode)
+    entry = _worker_maps.get(key)
+    if entry is not None and len(entry) >= size:
+        _worker_maps.move_to_end(key)
+        return entry
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_ino != inode:
+            raise IOError(f"{path} was replaced while being searched")
+        file_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(file_map) < size:
+        file_map.close()
+        raise IOError(f"{path} is shorter than expected ({size} bytes)")
+    if entry is not None:
+        entry.close()
+    _worker_maps[key] = file_map
+    while len(_worker_maps) > _MAX_WORKER_MAPS:
+        _worker_maps.popitem(last=False)[1].close()
+    return file_map
+
+
+def scan_file_range(path: str, inode: int, size: int, start: int, end: int,
+                    pattern: SearchPattern) -> array:
+    """Process-pool task: scan a byte range of a file mapped by this worker."""
+    return scan_range(map_file(path, inode, size), start, end, pattern)
+
+
+def timed_task(task, *args) -> tuple:
+    """Run task(*args) in a worker; returns (result, start time, seconds, worker id).
+
+    Used instead of calling the task directly while stats are collected,
+    so the time a range took in its worker can be told from time spent
+    queued.  perf_counter is system-wide on Linux, so process workers'
+    start times line up with the caller's.
+    """
+    started = time.perf_counter()
+    result = task(*args)
+    return result, started, time.perf_counter() - started, f"{os.getpid()}:{threading.get_ident()}"
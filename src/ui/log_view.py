@@ -0,0 +1,226 @@
+from collections import OrderedDict
+
+from PyQt5.QtWidgets import QAbstractScrollArea, QApplication
+from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtGui import QColor, QFont, QFontMetrics, QKeySequence, QPainter, QPalette
+
+# Rows kept decoded; with lines capped at LONG_LINE_BYTES this bounds the
+# view's memory no matter how far it is scrolled.
+ROW_CACHE_ROWS = 4096
+
+# Rows read beyond the visible ones on a cache miss, in each direction.
+READ_AHEAD_ROWS = 64
+
+# Longer lines are only cached up to this many bytes; the rest is read
+# from the file for the columns actually on screen.
+LONG_LINE_BYTES = 4096
+
+# Tabs are expanded to this width in short lines.
+TAB_WIDTH = 4
+
+# Backgrounds of highlighted terms, by term number.
+TERM_COLORS = ('#fff59d', '#80deea', '#ffab91', '#c5e1a5', '#ce93d8', '#90caf9')
+
+# QScrollBar values are C ints.
+_MAX_SCROLL = 2 ** 31 - 1
+
+
+class LogView(QAbstractScrollArea):
+    """Read-only, virtualized view of a LogProcessor's lines.
+
+    The vertical scrollbar spans the whole file, one step per line, and
+    only the rows on screen are read from the processor, through a small
+    LRU row cache.  Moving anywhere in the file therefore costs the same
+    as showing one screenful.
+    """
+    line_clicked = pyqtSignal(int)
+    top_line_changed = pyqtSignal(int)
+
+    def __init__(self, processor=None, parent=None):
+        super().__init__(parent)
+        self.processor = processor
+        self.highlighted_line = None
+        # Called with a row's visible text, returns (start, end, term) spans to mark
+        self.highlighter = None
+        self._rows = OrderedDict()
+        self._row_count = 0
+        self.setFont(QFont("Courier New", 10))
+        self.setFocusPolicy(Qt.StrongFocus)
+        self.verticalScrollBar().valueChanged.connect(self._on_scrolled)
+        self.horizontalScrollBar().valueChanged.connect(self.viewport().update)
+
+    def set_processor(self, processor):
+        self.processor = processor
+        self.refresh(0)
+
+    @property
+    def row_count(self):
+        return self._row_count
+
+    @property
+    def top_line(self):
+        return self.verticalScrollBar().value()
+
+    @property
+    def row_height(self):
+        return QFontMetrics(self.font()).lineSpacing()
+
+    @property
+    def char_width(self):
+        return max(1, QFontMetrics(self.font()).horizontalAdvance('M'))
+
+    def visible_rows(self):
+        """Number of rows that fit in the viewport, counting a partial last row."""
+        return max(1, -(-self.viewport().height() // self.row_height))
+
+    def refresh(self, first_changed_line=0):
+        """Pick up a changed line count; rows from first_changed_line on are reread."""
+        for line in [line for line in self._rows if line >= first_changed_line]:
+            del self._rows[line]
+        self._row_count = self.processor.total_lines if self.processor is not None else 0
+        if self.highlighted_line is not None and self.highlighted_line >= self._row_count:
+            self.highlighted_line = None
+        self._update_scrollbars()
+        self.viewport().update()
+
+    def scroll_to_line(self, line_num, center=False):
+        """Make line_num the top row, or the middle one if center is set."""
+        if center:
+            line_num -= self.visible_rows() // 2
+        self.verticalScrollBar().setValue(max(0, min(line_num, _MAX_SCROLL)))
+
+    def ensure_visible(self, line_num):
+        full_rows = max(1, self.viewport().height() // self.row_height)
+        if not self.top_line <= line_num < self.top_line + full_rows:
+            self.scroll_to_line(line_num, center=True)
+
+    def scroll_to_end(self):
+        self.verticalScrollBar().setValue(self.verticalScrollBar().maximum())
+
+    def set_highlighter(self, highlighter):
+        self.highlighter = highlighter
+        self.viewport().update()
+
+    def highlight_line(self, line_num):
+        self.highlighted_line = line_num
+        self.ensure_visible(line_num)
+        self.viewport().update()
+
+    def row_text(self, line_num):
+        """The display text of a line; long lines are cut at LONG_LINE_BYTES."""
+        self._load_rows(line_num, line_num + 1)
+        return self._rows[line_num][0]
+
+    def _load_rows(self, first, last):
+        """Make sure rows [first, last) are cached, reading ahead on a miss."""
+        last = min(last, self._row_count)
+        if all(line in self._rows for line in range(first, last)):
+            for line in range(first, last):
+                self._rows.move_to_end(line)
+            return
+        start = max(0, first - READ_AHEAD_ROWS)
+        stop = min(self._row_count, last + READ_AHEAD_ROWS)
+        with self.processor.stats.phase('ui.rows') as span:
+            span.lines = stop - start
+            for line in range(start, stop):
+                if line in self._rows:
+                    self._rows.move_to_end(line)
+                    continue
+                length = self.processor.line_length(line)
+                data = self.processor.get_line_bytes(line, 0, LONG_LINE_BYTES)
+                text = data.decode('utf-8', errors='replace')
+                if length <= LONG_LINE_BYTES:
+                    text = text.expandtabs(TAB_WIDTH)
+                self._rows[line] = (text, length)
+        while len(self._rows) > ROW_CACHE_ROWS:
+            self._rows.popitem(last=False)
+
+    def _visible_text(self, line_num, first_column, columns):
+        """Text of a line from first_column on, reading long lines lazily."""
+        text, length = self._rows[line_num]
+        if length <= LONG_LINE_BYTES or first_column + columns <= len(text):
+            return text[first_column:first_column + columns]
+        data = self.processor.get_line_bytes(line_num, first_column, first_column + columns)
+        return data.decode('utf-8', errors='replace')
+
+    def _update_scrollbars(self):
+        full_rows = max(1, self.viewport().height() // self.row_height)
+        vbar = self.verticalScrollBar()
+        vbar.setRange(0, min(_MAX_SCROLL, max(0, self._row_count - full_rows)))
+        vbar.setPageStep(full_rows)
+        vbar.setSingleStep(1)
+
+        # Wide enough for the longest row on screen
+        first = self.top_line
+        last = min(self._row_count, first + self.visible_rows())
+        widest = 0
+        if self.processor is not None and last > first:
+            self._load_rows(first, last)
+            widest = max(max(len(self._rows[line][0]), self._rows[line][1])
+                         for line in range(first, last))
+        columns = self.viewport().width() // self.char_width
+        hbar = self.horizontalScrollBar()
+        hbar.setRange(0, min(_MAX_SCROLL, max(0, widest - columns + 1)))
+        hbar.setPageStep(max(1, columns))
+
+    def _on_scrolled(self, value):
+        self._update_scrollbars()
+        self.viewport().update()
+        self.top_line_changed.emit(value)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._update_scrollbars()
+
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        palette = self.palette()
+        painter.fillRect(self.viewport().rect(), palette.color(QPalette.Base))
+        if self.processor is None or not self._row_count:
+            return
+
+        row_height = self.row_height
+        char_width = self.char_width
+        first = self.top_line
+        last = min(self._row_count, first + self.visible_rows())
+        self._load_rows(first, last)
+        first_column = self.horizontalScrollBar().value()
+        columns = self.viewport().width() // char_width + 2
+        ascent = QFontMetrics(self.font()).ascent()
+        width = self.viewport().width()
+
+        painter.setPen(palette.color(QPalette.Text))
+        for row, line in enumerate(range(first, last)):
+            y = row * row_height
+            if line == self.highlighted_line:
+                painter.fillRect(0, y, width, row_height, palette.color(QPalette.Highlight))
+                painter.setPen(palette.color(QPalette.HighlightedText))
+            text = self._visible_text(line, first_column, columns)
+            if self.highlighter is not None:
+                for start, end, term in self.highlighter(text):
+                    painter.fillRect(start * char_width, y, (end - start) * char_width, row_height,
+                                     QColor(TERM_COLORS[term % len(TERM_COLORS)]))
+            painter.drawText(0, y + ascent, text)
+            if line == self.highlighted_line:
+                painter.setPen(palette.color(QPalette.Text))
+
+    def line_at(self, y):
+        line = self.top_line + y // self.row_height
+        return line if 0 <= line < self._row_count else None
+
+    def mousePressEvent(self, event):
+        line = self.line_at(event.pos().y())
+        if line is not None:
+            self.highlight_line(line)
+            self.line_clicked.emit(line)
+        super().mousePressEvent(event)
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.Copy) and self.highlighted_line is not None:
+            QApplication.clipboard().setText(self.processor.get_line(self.highlighted_line))
+        elif event.key() == Qt.Key_Home and event.modifiers() & Qt.ControlModifier:
+            self.scroll_to_line(0)
+        elif event.key() == Qt.Key_End and event.modifiers() & Qt.ControlModifier:
+            self.scroll_to_end()
+        else:
+            super().keyPressEvent(event)
@@ -1,37 +1,254 @@
 import os
 import time
+from array import array
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QPushButton, QLineEdit, QFileDialog, QLabel, 
-                             QTextEdit, QCheckBox, QProgressBar, QSplitter,
-                             QListWidget, QListWidgetItem, QComboBox, QMessageBox,
-                             QShortcut, QMenu, QAction)
+                             QCheckBox, QProgressBar, QSplitter, QInputDialog,
+                             QTreeView, QListWidget, QComboBox, QMessageBox,
+                             QShortcut, QMenu, QAction, QApplication,
+                             QDockWidget, QPlainTextEdit, QTreeWidget, QTreeWidgetItem)
 from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer
-from PyQt5.QtGui import QKeySequence, QTextCursor, QFont, QColor
+from PyQt5.QtGui import QKeySequence, QColor, QFontDatabase
 
+from src.core.follow import FileWatcher
 from src.core.log_processor import LogProcessor
+from src.core.query import Query
+from src.core.session import LogSession
+from src.core.stats import Stats, default_enabled, format_stats
+from src.core.workers import CancelToken
+from src.ui.log_view import LogView
+from src.ui.results_model import ResultsModel, SessionResultsModel
+
+# Values listed per field in the fields panel, most frequent first.
+FACET_VALUES = 50
+
+FILE_FILTERS = ("All Files (*);;Text Files (*.txt);;Log Files (*.log);;"
+                "Compressed Logs (*.gz *.bz2 *.xz)")
+EXPORT_FILTERS = ("Text (*.log *.txt);;NDJSON (*.ndjson);;Compressed Text (*.log.gz);;"
+                  "Compressed NDJSON (*.ndjson.gz)")
 
 class SearchThread(QThread):
-    search_complete = pyqtSignal(list)
+    results_found = pyqtSignal(object)
+    search_complete = pyqtSignal(int)
     progress_update = pyqtSignal(int)
     
-    def __init__(self, log_processor, search_text, case_sensitive):
+    def __init__(self, log_processor, search_text, case_sensitive, start_line=0, within=None,
+                 query=False):
         super().__init__()
         self.log_processor = log_processor
         self.search_text = search_text
         self.case_sensitive = case_sensitive
+        self.query = query
+        self.start_line = start_line
+        # Line numbers to refine instead of searching the whole file
+        self.within = within
+        self.end_line = log_processor.total_lines
+        self.cancel_token = CancelToken()
+        self.error = None
+        
+    def cancel(self):
+        self.cancel_token.cancel()
         
     def run(self):
-        results = self.log_processor.search(self.search_text, self.case_sensitive)
-        self.search_complete.emit(results)
+        found = 0
+        if self.within is not None:
+            batches = self.log_processor.iter_refine(self.within, self.search_text,
+                                                     self.case_sensitive, self.cancel_token,
+                                                     self.query)
+        else:
+            # The window cancels its own searches; other searches of the same
+            # processor run alongside this one instead of being cut short
+            batches = self.log_processor.iter_search(self.search_text, self.case_sensitive,
+                                                     self.cancel_token, exclusive=False,
+                                                     start_line=self.start_line,
+                                                     end_line=self.end_line, query=self.query)
+        try:
+            for batch in batches:
+                if batch.line_numbers:
+                    found += len(batch.line_numbers)
+                    self.results_found.emit(batch.line_numbers)
+                self.progress_update.emit(int(batch.bytes_scanned * 100 / max(1, batch.total_bytes)))
+        except (OSError, ValueError) as e:
+            self.error = str(e)
+        self.search_complete.emit(found)
+
+class SessionSearchThread(QThread):
+    """Searches every file of a LogSession; results arrive file by file."""
+    results_found = pyqtSignal(int, object)
+    results_reordered = pyqtSignal(object, object)
+    search_complete = pyqtSignal(int)
+    progress_update = pyqtSignal(int)
+    
+    def __init__(self, session, search_text, case_sensitive, within=None, by_time=False,
+                 query=False):
+        super().__init__()
+        self.session = session
+        self.search_text = search_text
+        self.case_sensitive = case_sensitive
+        self.query = query
+        # File index to line numbers to refine, instead of searching everything
+        self.within = within
+        self.by_time = by_time
+        self.cancel_token = CancelToken()
+        self.error = None
+        
+    def cancel(self):
+        self.cancel_token.cancel()
+        
+    def run(self):
+        found = 0
+        results = {}
+        try:
+            for batch in self.session.iter_search(self.search_text, self.case_sensitive,
+                                                  self.cancel_token, within=self.within,
+                                                  query=self.query):
+                if len(batch.line_numbers):
+                    found += len(batch.line_numbers)
+                    self.results_found.emit(batch.file_index, batch.line_numbers)
+                    if self.by_time:
+                        results.setdefault(batch.file_index, array('Q')).extend(batch.line_numbers)
+                self.progress_update.emit(int(batch.bytes_scanned * 100 / max(1, batch.total_bytes)))
+        except (OSError, ValueError) as e:
+            self.error = str(e)
+        if results and not self.cancel_token.cancelled and self.error is None:
+            merged = list(self.session.merge_by_time(results))
+            self.results_reordered.emit(array('I', (f for f, _ in merged)),
+                                        array('Q', (line for _, line in merged)))
+        self.search_complete.emit(found)
+
+class SessionOpenThread(QThread):
+    """Indexes every file of a new session."""
+    open_done = pyqtSignal(bool)
+    progress_update = pyqtSignal(int)
+    
+    def __init__(self, session):
+        super().__init__()
+        self.session = session
+        self.cancel_token = CancelToken()
+        
+    def cancel(self):
+        self.cancel_token.cancel()
+        
+    def run(self):
+        opened = self.session.open(
+            lambda done, total: self.progress_update.emit(done * 100 // max(1, total)),
+            self.cancel_token)
+        self.open_done.emit(opened)
+
+class FollowThread(QThread):
+    """Signals whenever the followed file may have grown or been rotated."""
+    file_changed = pyqtSignal()
+    
+    # Lower bound between notifications, so a busy log is picked up in
+    # batches rather than once per write.
+    MIN_INTERVAL = 0.1
+    
+    def __init__(self, file_path):
+        super().__init__()
+        self.file_path = file_path
+        self._stopped = False
+        
+    def stop(self):
+        self._stopped = True
+        
+    def run(self):
+        watcher = FileWatcher(self.file_path)
+        try:
+            while not self._stopped:
+                if watcher.wait(0.25) and not self._stopped:
+                    self.file_changed.emit()
+                    time.sleep(self.MIN_INTERVAL)
+        finally:
+            watcher.close()
+
+class FieldThread(QThread):
+    """Extracts (or extends) the structured fields of the open file."""
+    fields_ready = pyqtSignal(object)
+    progress_update = pyqtSignal(int)
+    
+    def __init__(self, log_processor, field_format):
+        super().__init__()
+        self.log_processor = log_processor
+        self.field_format = field_format
+        self.cancel_token = CancelToken()
+        self.error = None
+        
+    def cancel(self):
+        self.cancel_token.cancel()
+        
+    def run(self):
+        try:
+            index = self.log_processor.fields(
+                self.field_format, self.cancel_token,
+                lambda done, total: self.progress_update.emit(done * 100 // max(1, total)))
+        except ValueError as e:
+            self.error = str(e)
+            index = None
+        if not self.cancel_token.cancelled:
+            self.fields_ready.emit(index)
+
+class ExportThread(QThread):
+    """Writes matching lines and their context to a file."""
+    export_done = pyqtSignal(object)
+    progress_update = pyqtSignal(int)
+    
+    def __init__(self, log_processor, line_numbers, path, context=0):
+        super().__init__()
+        self.log_processor = log_processor
+        self.line_numbers = line_numbers
+        self.path = path
+        self.context = context
+        self.cancel_token = CancelToken()
+        self.error = None
+        
+    def cancel(self):
+        self.cancel_token.cancel()
+        
+    def run(self):
+        try:
+            result = self.log_processor.export(
+                self.line_numbers, self.path, before=self.context, after=self.context,
+                cancel=self.cancel_token,
+                progress=lambda done, total: self.progress_update.emit(done * 100 // max(1, total)))
+        except (OSError, ValueError) as e:
+            self.error = str(e)
+            result = None
+        self.export_done.emit(result)
 
 class MainWindow(QMainWindow):
+    ngram_ready = pyqtSignal(object)
+    index_progress = pyqtSignal(int, int)
+    
     def __init__(self):
         super().__init__()
-        self.log_processor = LogProcessor()
+        # One collector for the file and any session, shown in the stats panel
+        self.stats = Stats()
+        self.log_processor = LogProcessor(stats=self.stats)
+        self.file_processor = self.log_processor
         self.current_file = None
-        self.search_results = []
+        self.results_model = ResultsModel(self.log_processor)
+        # Multi-file sessions: the file shown is pinned open while shown
+        self.session = None
+        self.session_file = None
+        self.session_model = SessionResultsModel()
+        self.session_open_thread = None
+        self.match_counts = {}
+        self.search_thread = None
+        self.follow_thread = None
+        self.last_search = None
+        self.searched_lines = 0
+        # Set while a file opened in the background is still being indexed
+        self.index_pending = False
+        self.open_started = 0.0
+        self.indexed_before = 0
+        self._stopping_threads = []
         self.current_display_start = 0
         self.lines_per_page = 1000
+        self.search_started = 0.0
+        self.field_thread = None
+        self.export_thread = None
+        # Checked values in the fields panel: {field: {value, ...}}
+        self.field_filters = {}
         
         self.init_ui()
         
@@ -45,11 +262,20 @@ class MainWindow(QMainWindow):
         # File selection area
         file_layout = QHBoxLayout()
         self.file_path_input = QLineEdit()
-        self.file_path_input.setPlaceholderText("Log file path...")
+        self.file_path_input.setPlaceholderText("Log file, directory or glob pattern...")
+        self.file_path_input.returnPressed.connect(self.open_path)
         browse_button = QPushButton("Browse")
         browse_button.clicked.connect(self.browse_file)
+        open_set_button = QPushButton("Open Set")
+        open_set_button.setToolTip("Open several files, e.g. a rotated log set, as one session")
+        open_set_button.clicked.connect(self.browse_files)
+        self.follow_checkbox = QCheckBox("Follow")
+        self.follow_checkbox.setToolTip("Show new lines as the file grows")
+        self.follow_checkbox.toggled.connect(self.set_follow)
         file_layout.addWidget(self.file_path_input)
         file_layout.addWidget(browse_button)
+        file_layout.addWidget(open_set_button)
+        file_layout.addWidget(self.follow_checkbox)
         main_layout.addLayout(file_layout)
         
         # Search area
@@ -60,9 +286,26 @@ class MainWindow(QMainWindow):
         search_button = QPushButton("Search")
         search_button.clicked.connect(self.search_logs)
         self.case_sensitive_checkbox = QCheckBox("Case Sensitive")
+        self.query_checkbox = QCheckBox("Query")
+        self.query_checkbox.setToolTip('Search for words, "phrases" and /regexes/ joined by AND, OR, NOT '
+                                       'and parentheses, e.g. ERROR AND (timeout OR refused) AND NOT health')
+        self.within_results_checkbox = QCheckBox("Within Results")
+        self.within_results_checkbox.setToolTip("Search only the lines found by the previous search")
+        self.ngram_checkbox = QCheckBox("Trigram Index")
+        self.ngram_checkbox.setToolTip("Build a persistent index so repeated searches skip blocks that cannot match")
+        self.ngram_checkbox.toggled.connect(self.set_ngram_index)
+        self.ngram_ready.connect(self.show_ngram_stats, Qt.QueuedConnection)
+        self.index_progress.connect(self.show_index_progress, Qt.QueuedConnection)
+        self.by_time_checkbox = QCheckBox("Merge by Time")
+        self.by_time_checkbox.setToolTip("Order the results of a multi-file search by timestamp")
+        self.by_time_checkbox.setEnabled(False)
         search_layout.addWidget(self.search_input)
         search_layout.addWidget(search_button)
         search_layout.addWidget(self.case_sensitive_checkbox)
+        search_layout.addWidget(self.query_checkbox)
+        search_layout.addWidget(self.within_results_checkbox)
+        search_layout.addWidget(self.ngram_checkbox)
+        search_layout.addWidget(self.by_time_checkbox)
         main_layout.addLayout(search_layout)
         
         # Splitter for results and content
@@ -72,19 +315,30 @@ class MainWindow(QMainWindow):
         results_widget = QWidget()
         results_layout = QVBoxLayout(results_widget)
         results_label = QLabel("Search Results:")
-        self.results_list = QListWidget()
-        self.results_list.itemClicked.connect(self.show_selected_result)
+        self.results_list = QTreeView()
+        self.results_list.setRootIsDecorated(False)
+        self.results_list.setUniformRowHeights(True)
+        self.results_list.setHeaderHidden(True)
+        self.results_list.setModel(self.results_model)
+        self.results_list.clicked.connect(self.show_selected_result)
+        # Files of a session, with their match counts
+        self.file_list = QListWidget()
+        self.file_list.setVisible(False)
+        self.file_list.currentRowChanged.connect(self.show_session_file)
+        results_splitter = QSplitter(Qt.Horizontal)
+        results_splitter.addWidget(self.file_list)
+        results_splitter.addWidget(self.results_list)
+        results_splitter.setSizes([250, 950])
         results_layout.addWidget(results_label)
-        results_layout.addWidget(self.results_list)
+        results_layout.addWidget(results_splitter)
         results_widget.setLayout(results_layout)
         
         # Content area
         content_widget = QWidget()
         content_layout = QVBoxLayout(content_widget)
         content_label = QLabel("Log Content:")
-        self.log_display = QTextEdit()
-        self.log_display.setReadOnly(True)
-        self.log_display.setFont(QFont("Courier New", 10))
+        self.log_display = LogView(self.log_processor)
+        self.log_display.top_line_changed.connect(self.update_page_info)
         content_layout.addWidget(content_label)
         content_layout.addWidget(self.log_display)
         content_widget.setLayout(content_layout)
@@ -95,7 +349,7 @@ class MainWindow(QMainWindow):
         self.prev_button.clicked.connect(self.show_previous_page)
         self.next_button = QPushButton("Next Page")
         self.next_button.clicked.connect(self.show_next_page)
-        self.page_info_label = QLabel("Page: 0/0")
+        self.page_info_label = QLabel("Lines: 0/0")
         nav_layout.addWidget(self.prev_button)
         nav_layout.addWidget(self.page_info_label)
         nav_layout.addWidget(self.next_button)
@@ -119,20 +373,98 @@ class MainWindow(QMainWindow):
         central_widget.setLayout(main_layout)
         self.setCentralWidget(central_widget)
         
+        # Stats panel: engine timings and cache hit rates, for bug reports
+        stats_widget = QWidget()
+        stats_layout = QVBoxLayout(stats_widget)
+        self.stats_view = QPlainTextEdit()
+        self.stats_view.setReadOnly(True)
+        self.stats_view.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        stats_buttons = QHBoxLayout()
+        copy_stats_button = QPushButton("Copy as JSON")
+        copy_stats_button.clicked.connect(self.copy_stats)
+        reset_stats_button = QPushButton("Reset")
+        reset_stats_button.clicked.connect(self.reset_stats)
+        stats_buttons.addWidget(copy_stats_button)
+        stats_buttons.addWidget(reset_stats_button)
+        stats_buttons.addStretch()
+        stats_layout.addWidget(self.stats_view)
+        stats_layout.addLayout(stats_buttons)
+        self.stats_dock = QDockWidget("Stats", self)
+        self.stats_dock.setWidget(stats_widget)
+        self.stats_dock.setVisible(False)
+        self.stats_dock.visibilityChanged.connect(self.set_stats_visible)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.stats_dock)
+        self.stats_timer = QTimer(self)
+        self.stats_timer.setInterval(500)
+        self.stats_timer.timeout.connect(self.refresh_stats)
+        
+        # Fields panel: value counts of structured fields, checked values filter
+        fields_widget = QWidget()
+        fields_layout = QVBoxLayout(fields_widget)
+        self.field_format_input = QLineEdit()
+        self.field_format_input.setPlaceholderText("auto, a template like {time} {level} [{thread}] {logger}: {message}, or a regex")
+        self.field_format_input.setToolTip("Fields to extract: 'auto' finds levels, threads, components and key=value pairs")
+        self.field_format_input.returnPressed.connect(self.extract_fields)
+        self.facet_tree = QTreeWidget()
+        self.facet_tree.setHeaderLabels(["Value", "Lines"])
+        self.facet_tree.itemChanged.connect(self.apply_field_filter)
+        field_buttons = QHBoxLayout()
+        extract_button = QPushButton("Refresh")
+        extract_button.setToolTip("Extract fields, or extend them over lines added since")
+        extract_button.clicked.connect(self.extract_fields)
+        clear_filter_button = QPushButton("Clear Filter")
+        clear_filter_button.clicked.connect(self.clear_field_filter)
+        field_buttons.addWidget(extract_button)
+        field_buttons.addWidget(clear_filter_button)
+        field_buttons.addStretch()
+        fields_layout.addWidget(self.field_format_input)
+        fields_layout.addWidget(self.facet_tree)
+        fields_layout.addLayout(field_buttons)
+        self.fields_dock = QDockWidget("Fields", self)
+        self.fields_dock.setWidget(fields_widget)
+        self.fields_dock.setVisible(False)
+        self.fields_dock.visibilityChanged.connect(self.set_fields_visible)
+        self.addDockWidget(Qt.LeftDockWidgetArea, self.fields_dock)
+        
         # Keyboard shortcuts
         QShortcut(QKeySequence("Ctrl+F"), self).activated.connect(lambda: self.search_input.setFocus())
         QShortcut(QKeySequence("Ctrl+O"), self).activated.connect(self.browse_file)
+        QShortcut(QKeySequence("Ctrl+Shift+O"), self).activated.connect(self.browse_files)
+        escape = QShortcut(QKeySequence("Escape"), self)
+        escape.activated.connect(self.cancel_search)
+        escape.activated.connect(self.stop_export)
+        QShortcut(QKeySequence("Ctrl+E"), self).activated.connect(self.export_results)
+        QShortcut(QKeySequence("Ctrl+Shift+D"), self).activated.connect(
+            lambda: self.stats_dock.setVisible(not self.stats_dock.isVisible()))
+        QShortcut(QKeySequence("Ctrl+Shift+F"), self).activated.connect(
+            lambda: self.fields_dock.setVisible(not self.fields_dock.isVisible()))
         
         # Context menu for results
         self.results_list.setContextMenuPolicy(Qt.CustomContextMenu)
         self.results_list.customContextMenuRequested.connect(self.show_context_menu)
         
     def browse_file(self):
-        file_path, _ = QFileDialog.getOpenFileName(self, "Open Log File", "", "All Files (*);;Text Files (*.txt);;Log Files (*.log)")
+        file_path, _ = QFileDialog.getOpenFileName(self, "Open Log File", "", FILE_FILTERS)
         if file_path:
             self.file_path_input.setText(file_path)
             self.open_file(file_path)
     
+    def browse_files(self):
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "Open Log Files", "", FILE_FILTERS)
+        if file_paths:
+            self.file_path_input.setText(os.path.dirname(file_paths[0]))
+            self.open_session(file_paths)
+    
+    def open_path(self):
+        """Open what was typed in the path box: a file, or a directory or glob as a session."""
+        path = self.file_path_input.text().strip()
+        if not path:
+            return
+        if os.path.isdir(path) or any(char in path for char in '*?['):
+            self.open_session([path])
+        else:
+            self.open_file(path)
+    
     def open_file(self, file_path):
         self.status_bar.showMessage(f"Opening file: {file_path}")
         self.progress_bar.setVisible(True)
@@ -142,100 +474,635 @@ class MainWindow(QMainWindow):
         QTimer.singleShot(100, lambda: self._process_file_open(file_path))
     
     def _process_file_open(self, file_path):
-        start_time = time.time()
-        success = self.log_processor.open_file(file_path)
+        self.open_started = time.time()
+        self.cancel_session_open()
+        self.close_session()
+        self.cancel_search()
+        self.cancel_field_extraction()
+        indexed = self.stats.phases.get('index')
+        self.indexed_before = indexed.count if indexed else 0
+        # The first page shows as soon as it is indexed; the rest follows
+        with self.stats.phase('ui.open'):
+            success = self.log_processor.open_file(file_path, background=True,
+                                                   progress=self.index_progress.emit)
+        self.index_pending = success and self.log_processor.indexing
         
         if success:
             self.current_file = file_path
             self.current_display_start = 0
+            self.log_display.highlighted_line = None
             self.update_log_display()
-            self.results_list.clear()
-            self.search_results = []
-            
-            elapsed = time.time() - start_time
-            self.status_bar.showMessage(f"File loaded: {os.path.basename(file_path)} ({self.log_processor.total_lines} lines) in {elapsed:.2f} seconds")
+            self.results_model.processor = self.log_processor
+            self.results_model.clear()
+            self.last_search = None
+            self.searched_lines = 0
+            self.reset_fields()
+            self.set_follow(self.follow_checkbox.isChecked())
+            if self.index_pending:
+                self.show_index_progress()
+                return
+            self.show_file_loaded()
+            if self.fields_dock.isVisible():
+                self.extract_fields()
         else:
-            self.status_bar.showMessage(f"Failed to open file: {file_path}")
-            QMessageBox.critical(self, "Error", f"Failed to open file: {file_path}")
+            self.show_open_failed(file_path)
+        
+        self.progress_bar.setVisible(False)
+    
+    def show_open_failed(self, file_path, error=None):
+        message = f"Failed to open file: {file_path}"
+        if error:
+            message += f" ({error})"
+        self.progress_bar.setVisible(False)
+        self.status_bar.showMessage(message)
+        QMessageBox.critical(self, "Error", message)
+    
+    def show_file_loaded(self):
+        elapsed = time.time() - self.open_started
+        throughput = self.log_processor.line_index.throughput
+        message = f"File loaded: {os.path.basename(self.current_file)} ({self.log_processor.total_lines} lines) in {elapsed:.2f} seconds, indexed at {throughput:.2f} GB/s"
+        if self.stats.enabled:
+            message += " [" + self.open_details(self.indexed_before) + "]"
+        self.status_bar.showMessage(message)
+    
+    def show_index_progress(self, done=0, total=0):
+        """Show the lines indexed so far, and extend the search over them."""
+        if not self.index_pending or self.session is not None:
+            return
+        processor = self.log_processor
+        if processor.total_lines != self.log_display.row_count:
+            self.log_display.refresh(self.log_display.row_count)
+            self.update_page_info()
+        if (self.last_search and self.search_thread is None
+                and self.searched_lines < processor.total_lines):
+            self.start_search(*self.last_search, start_line=self.searched_lines)
+        
+        if processor.indexing:
+            if self.search_thread is None:
+                self.progress_bar.setVisible(True)
+                self.progress_bar.setValue(processor.indexed_bytes * 100 // max(1, processor.file_size))
+                self.status_bar.showMessage(f"Indexing {os.path.basename(self.current_file)}: "
+                                            f"{processor.total_lines} lines so far...")
+            return
+        self.index_pending = False
+        if processor.index_error is not None:
+            # Showing the indexed lines as if they were the file would mislead
+            file_path, error = self.current_file, processor.index_error
+            self.set_follow(False)
+            self.cancel_search()
+            processor.close()
+            self.current_file = None
+            self.results_model.clear()
+            self.last_search = None
+            self.log_display.set_processor(processor)
+            self.update_page_info()
+            self.show_open_failed(file_path, error)
+            return
+        if self.search_thread is None:
+            self.progress_bar.setVisible(False)
+            self.show_file_loaded()
+        if self.fields_dock.isVisible():
+            self.extract_fields()
+        if self.follow_thread is not None:
+            # Catch up on anything appended while indexing
+            self.refresh_file()
+    
+    def open_session(self, patterns):
+        self.status_bar.showMessage("Opening files...")
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        QTimer.singleShot(100, lambda: self._process_session_open(patterns))
+    
+    def _process_session_open(self, patterns):
+        """Index the session's files on a worker thread; finish_session_open shows them."""
+        self.cancel_session_open()
+        self.open_started = time.time()
+        session = LogSession(patterns, index_cache=self.file_processor.index_cache,
+                             result_cache=self.file_processor.result_cache, stats=self.stats)
+        self.session_open_thread = SessionOpenThread(session)
+        self.session_open_thread.progress_update.connect(self.progress_bar.setValue)
+        self.session_open_thread.open_done.connect(lambda opened: self.finish_session_open(patterns, opened))
+        self.session_open_thread.start()
+    
+    def finish_session_open(self, patterns, opened):
+        session = self.session_open_thread.session
+        self.session_open_thread = None
+        if not opened:
+            session.close()
+            self.progress_bar.setVisible(False)
+            self.status_bar.showMessage("Failed to open files: " + ", ".join(patterns))
+            QMessageBox.critical(self, "Error", "No log files could be opened from: " + ", ".join(patterns))
+            return
         
+        self.close_session()
+        self.set_follow(False)
+        self.reset_fields()
+        self.file_processor.close()
+        self.results_model.clear()
+        self.last_search = None
+        self.session = session
+        self.session_model.session = session
+        self.session_model.clear()
+        self.match_counts = {}
+        self.results_list.setModel(self.session_model)
+        self.results_list.setHeaderHidden(False)
+        self.by_time_checkbox.setEnabled(True)
+        self.file_list.blockSignals(True)
+        self.file_list.clear()
+        self.file_list.addItems([member.name for member in session.files])
+        self.file_list.blockSignals(False)
+        self.file_list.setVisible(True)
+        self.show_session_file(0)
+        
+        elapsed = time.time() - self.open_started
+        self.status_bar.showMessage(f"Opened {len(session)} files ({session.total_lines} lines) in {elapsed:.2f} seconds")
         self.progress_bar.setVisible(False)
     
+    def cancel_session_open(self):
+        """Drop a session still being opened, closing its files once its thread stops."""
+        thread = self.session_open_thread
+        if thread is None:
+            return
+        thread.cancel()
+        thread.open_done.disconnect()
+        thread.progress_update.disconnect()
+        if thread.isRunning():
+            self._stopping_threads.append(thread)
+            thread.finished.connect(lambda: self._stopping_threads.remove(thread))
+            # Closed on the worker as it stops, so closeEvent's wait covers it
+            thread.finished.connect(thread.session.close, Qt.DirectConnection)
+        else:
+            thread.session.close()
+        self.session_open_thread = None
+    
+    def close_session(self):
+        """Go back to single-file mode, closing the session's files."""
+        if self.session is None:
+            return
+        self.cancel_search()
+        if self.session_file is not None:
+            self.session.release(self.session_file)
+        self.session.close()
+        self.session = None
+        self.session_file = None
+        self.current_file = None
+        self.log_processor = self.file_processor
+        self.session_model.clear()
+        self.session_model.session = None
+        self.results_list.setModel(self.results_model)
+        self.results_list.setHeaderHidden(True)
+        self.by_time_checkbox.setEnabled(False)
+        self.file_list.blockSignals(True)
+        self.file_list.clear()
+        self.file_list.blockSignals(False)
+        self.file_list.setVisible(False)
+        self.log_display.set_processor(self.log_processor)
+    
+    def show_session_file(self, file_index):
+        """Show a file of the session in the log view."""
+        if self.session is None or file_index < 0 or file_index == self.session_file:
+            return
+        processor = self.session.acquire(file_index)
+        if self.session_file is not None:
+            self.session.release(self.session_file)
+        self.session_file = file_index
+        self.log_processor = processor
+        self.current_file = self.session.files[file_index].path
+        self.current_display_start = 0
+        self.log_display.highlighted_line = None
+        self.update_log_display()
+        self.file_list.blockSignals(True)
+        self.file_list.setCurrentRow(file_index)
+        self.file_list.blockSignals(False)
+    
+    def update_file_item(self, file_index):
+        member = self.session.files[file_index]
+        count = self.match_counts.get(file_index)
+        text = member.name if count is None else f"{member.name} ({count} matches)"
+        self.file_list.item(file_index).setText(text)
+    
     def search_logs(self):
         search_text = self.search_input.text()
         if not search_text or not self.current_file:
             return
         
+        case_sensitive = self.case_sensitive_checkbox.isChecked()
+        query = self.query_checkbox.isChecked()
+        highlighter = None
+        if query:
+            try:
+                highlighter = Query(search_text, case_sensitive).highlights
+            except ValueError as e:
+                self.status_bar.showMessage(f"Invalid query: {e}")
+                return
+        # The terms of a query are marked in the log view
+        self.log_display.set_highlighter(highlighter)
+        self.searched_lines = 0
+        if self.session is not None:
+            within = None
+            if self.within_results_checkbox.isChecked() and len(self.session_model):
+                within = self.session_model.by_file()
+            self.last_search = None
+            self.start_session_search(search_text, case_sensitive, within, query)
+            return
+        if self.within_results_checkbox.isChecked() and len(self.results_model):
+            # A refinement is not re-run on lines appended while following
+            self.last_search = None
+            self.start_search(search_text, case_sensitive, query, within=self.results_model.line_numbers)
+            return
+        self.last_search = (search_text, case_sensitive, query)
+        self.start_search(search_text, case_sensitive, query)
+    
+    def start_search(self, search_text, case_sensitive, query=False, start_line=0, within=None):
+        """Search from start_line on; earlier results are kept and extended.
+
+        With within, only those lines are searched and the results replace
+        the current ones.
+        """
+        self.cancel_search()
         self.status_bar.showMessage(f"Searching for: {search_text}")
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
+        self.discard_results_from(start_line)
+        self.search_started = time.perf_counter()
         
         # Start search in a separate thread
         self.search_thread = SearchThread(
             self.log_processor, 
             search_text, 
-            self.case_sensitive_checkbox.isChecked()
+            case_sensitive,
+            start_line,
+            within,
+            query
         )
-        self.search_thread.search_complete.connect(self.handle_search_results)
+        self.search_thread.results_found.connect(self.handle_search_results)
+        self.search_thread.search_complete.connect(self.finish_search)
         self.search_thread.progress_update.connect(self.progress_bar.setValue)
         self.search_thread.start()
     
-    def handle_search_results(self, results):
-        self.search_results = results
-        self.results_list.clear()
-        
-        for line_num, line_text in results:
-            # Truncate long lines for display
-            display_text = line_text[:100] + "..." if len(line_text) > 100 else line_text
-            item = QListWidgetItem(f"Line {line_num + 1}: {display_text}")
-            item.setData(Qt.UserRole, line_num)
-            self.results_list.addItem(item)
+    def start_session_search(self, search_text, case_sensitive, within=None, query=False):
+        """Search every file of the session, replacing the current results."""
+        self.cancel_search()
+        self.status_bar.showMessage(f"Searching {len(self.session)} files for: {search_text}")
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        self.session_model.clear()
+        self.match_counts = {}
+        for file_index in range(len(self.session)):
+            self.update_file_item(file_index)
+        self.search_started = time.perf_counter()
         
-        self.status_bar.showMessage(f"Found {len(results)} matches")
+        self.search_thread = SessionSearchThread(self.session, search_text, case_sensitive,
+                                                 within, self.by_time_checkbox.isChecked(), query)
+        self.search_thread.results_found.connect(self.handle_session_results)
+        self.search_thread.results_reordered.connect(self.session_model.set_results)
+        self.search_thread.search_complete.connect(self.finish_session_search)
+        self.search_thread.progress_update.connect(self.progress_bar.setValue)
+        self.search_thread.start()
+    
+    def handle_session_results(self, file_index, line_numbers):
+        with self.stats.phase('ui.results') as span:
+            span.lines = len(line_numbers)
+            self.session_model.append(file_index, line_numbers)
+            self.results_list.updateGeometries()
+        self.match_counts[file_index] = self.match_counts.get(file_index, 0) + len(line_numbers)
+        self.update_file_item(file_index)
+        self.status_bar.showMessage(f"Found {len(self.session_model)} matches so far...")
+    
+    def finish_session_search(self, count):
+        for file_index in range(len(self.session)):
+            self.match_counts.setdefault(file_index, 0)
+            self.update_file_item(file_index)
+        files = sum(1 for matches in self.match_counts.values() if matches)
+        message = f"Found {len(self.session_model)} matches in {files} of {len(self.session)} files"
+        error = self.search_thread.error if self.search_thread is not None else None
+        if error is not None:
+            message = f"Search failed: {error} ({len(self.session_model)} matches found before it)"
+        self.status_bar.showMessage(message + self.search_details(count))
         self.progress_bar.setVisible(False)
+        self.search_thread = None
     
-    def show_selected_result(self, item):
-        line_num = item.data(Qt.UserRole)
-        self.highlight_line(line_num)
+    def discard_results_from(self, line_num):
+        if line_num <= 0:
+            self.results_model.clear()
+        else:
+            self.results_model.discard_from(line_num)
     
-    def highlight_line(self, line_num):
-        # Calculate which page contains this line
-        page = line_num // self.lines_per_page
-        self.current_display_start = page * self.lines_per_page
-        
-        # Update display
-        self.update_log_display()
-        
-        # Highlight the specific line
-        cursor = self.log_display.textCursor()
-        cursor.setPosition(0)
+    def cancel_search(self):
+        """Stop the running search; its late results are discarded."""
+        thread = self.search_thread
+        if thread is None:
+            return
+        thread.cancel()
+        thread.results_found.disconnect()
+        if isinstance(thread, SessionSearchThread):
+            thread.results_reordered.disconnect()
+        thread.search_complete.disconnect()
+        thread.progress_update.disconnect()
+        if thread.isRunning():
+            # Keep a reference until the thread has actually stopped
+            self._stopping_threads.append(thread)
+            thread.finished.connect(lambda: self._stopping_threads.remove(thread))
+        self.search_thread = None
+        self.progress_bar.setVisible(False)
+    
+    def handle_search_results(self, line_numbers):
+        with self.stats.phase('ui.results') as span:
+            span.lines = len(line_numbers)
+            self.results_model.append(line_numbers)
+            # Let the list fetch the new rows if it is scrolled to the end
+            self.results_list.updateGeometries()
+        self.status_bar.showMessage(f"Found {len(self.results_model)} matches so far...")
+    
+    def finish_search(self, count):
+        error = self.search_thread.error
+        if error is not None:
+            # Not followed up on new lines, which would only fail again
+            self.last_search = None
+            self.status_bar.showMessage(f"Search failed: {error}")
+            self.progress_bar.setVisible(False)
+            self.search_thread = None
+            return
+        self.searched_lines = self.search_thread.end_line
+        message = f"Found {len(self.results_model)} matches"
+        ngram_index = self.log_processor.ngram_index
+        if ngram_index is not None and ngram_index.last_query.get('pruned'):
+            query = ngram_index.last_query
+            message += (f" (trigram index: scanned {query['candidate_bytes'] / 1e6:.1f} of "
+                        f"{query['total_bytes'] / 1e6:.1f} MB)")
+        self.status_bar.showMessage(message + self.search_details(count))
+        self.progress_bar.setVisible(False)
+        self.search_thread = None
+        if self.last_search and self.searched_lines < self.log_processor.total_lines:
+            # The file grew, or more of it was indexed, while searching; catch up on the new lines
+            self.start_search(*self.last_search, start_line=self.searched_lines)
+    
+    def open_details(self, indexed_before):
+        """Where the time of the last open went, for the status bar."""
+        phases = self.stats.phases
+        index = phases.get('index')
+        if index is not None and index.count > indexed_before:
+            return f"indexed in {index.last_seconds:.3f} s"
+        load = phases.get('index_cache.load')
+        if load is not None:
+            return f"index loaded from cache in {load.last_seconds * 1000:.1f} ms"
+        return "index from cache"
+    
+    def search_details(self, count):
+        """Record the search's wall time and describe it, if stats are collected."""
+        if not self.stats.enabled:
+            return ""
+        elapsed = time.perf_counter() - self.search_started
+        self.stats.record('ui.search', elapsed, lines=count)
+        snapshot = self.stats.snapshot()
+        details = f" [{elapsed:.3f} s"
+        search = snapshot['phases'].get('search')
+        if search and 'mb_per_second' in search:
+            details += f", {search['mb_per_second']:.0f} MB/s"
+        chunks = snapshot.get('chunks')
+        if chunks:
+            details += f", {chunks['count']} chunks, skew {chunks['skew']:.2f}"
+        return details + "]"
+    
+    def set_stats_visible(self, visible):
+        """Collect stats while the panel is shown (or when asked to by the environment)."""
+        self.stats.enabled = visible or default_enabled()
+        if visible:
+            self.refresh_stats()
+            self.stats_timer.start()
+        else:
+            self.stats_timer.stop()
+    
+    def refresh_stats(self):
+        text = format_stats(self.stats.snapshot())
+        if text != self.stats_view.toPlainText():
+            self.stats_view.setPlainText(text)
+    
+    def copy_stats(self):
+        """Copy the stats, with the open file's size, as JSON for a bug report."""
+        import json
+        snapshot = self.stats.snapshot()
+        snapshot['file'] = {'size': self.log_processor.file_size,
+                            'lines': self.log_processor.total_lines,
+                            'compressed': self.log_processor.compressed is not None,
+                            'session_files': len(self.session) if self.session is not None else 0}
+        QApplication.clipboard().setText(json.dumps(snapshot, indent=2))
+        self.status_bar.showMessage("Stats copied to clipboard", 2000)
+    
+    def reset_stats(self):
+        self.stats.reset()
+        self.refresh_stats()
+    
+    def set_fields_visible(self, visible):
+        if visible and self.log_processor.field_index is None:
+            self.extract_fields()
+    
+    def extract_fields(self):
+        """Extract the fields of the open file in the background (only new lines if done before)."""
+        if not self.current_file:
+            return
+        if self.session is not None:
+            self.status_bar.showMessage("Fields are extracted for single files only")
+            return
+        self.cancel_field_extraction()
+        self.status_bar.showMessage("Extracting fields...")
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        self.field_thread = FieldThread(self.log_processor, self.field_format_input.text().strip() or None)
+        self.field_thread.fields_ready.connect(self.show_fields)
+        self.field_thread.progress_update.connect(self.progress_bar.setValue)
+        self.field_thread.start()
+    
+    def reset_fields(self):
+        """Forget the fields panel's values and filter, as the file changed."""
+        self.cancel_field_extraction()
+        self.field_filters = {}
+        self.facet_tree.clear()
+    
+    def cancel_field_extraction(self):
+        thread = self.field_thread
+        if thread is None:
+            return
+        thread.cancel()
+        thread.fields_ready.disconnect()
+        thread.progress_update.disconnect()
+        if thread.isRunning():
+            self._stopping_threads.append(thread)
+            thread.finished.connect(lambda: self._stopping_threads.remove(thread))
+        self.field_thread = None
+    
+    def show_fields(self, index):
+        error = self.field_thread.error
+        self.field_thread = None
+        self.progress_bar.setVisible(False)
+        if index is None:
+            self.status_bar.showMessage(f"Cannot extract fields: {error}")
+            return
+        self.field_filters = {name: values for name, values in self.field_filters.items()
+                              if name in index.columns}
+        self.populate_facets()
+        message = f"Fields of {index.covered_lines} lines: {', '.join(index.fields) or 'none found'}"
+        if index.dropped:
+            message += f" (too many values to count: {', '.join(sorted(index.dropped))})"
+        self.status_bar.showMessage(message)
+    
+    def populate_facets(self):
+        """List each field's most frequent values, with counts under the other fields' filters."""
+        index = self.log_processor.field_index
+        self.facet_tree.blockSignals(True)
+        self.facet_tree.clear()
+        if index is not None:
+            for name, pairs in index.facets(self.field_filters, FACET_VALUES).items():
+                checked = self.field_filters.get(name, set())
+                field_item = QTreeWidgetItem([name, str(len(index.columns[name].values) - 1)])
+                field_item.setToolTip(1, "distinct values")
+                for value, count in pairs:
+                    item = QTreeWidgetItem([value, f"{count:,}"])
+                    item.setData(0, Qt.UserRole, (name, value))
+                    item.setTextAlignment(1, Qt.AlignRight)
+                    item.setCheckState(0, Qt.Checked if value in checked else Qt.Unchecked)
+                    field_item.addChild(item)
+                self.facet_tree.addTopLevelItem(field_item)
+                field_item.setExpanded(True)
+        self.facet_tree.resizeColumnToContents(0)
+        self.facet_tree.blockSignals(False)
+    
+    def apply_field_filter(self, item, column=0):
+        """Show the lines having every checked field value (values of one field are alternatives)."""
+        key = item.data(0, Qt.UserRole)
+        index = self.log_processor.field_index
+        if key is None or index is None:
+            return
+        name, value = key
+        values = self.field_filters.setdefault(name, set())
+        if item.checkState(0) == Qt.Checked:
+            values.add(value)
+        else:
+            values.discard(value)
+            if not values:
+                del self.field_filters[name]
+        self.show_field_matches()
+    
+    def show_field_matches(self):
+        index = self.log_processor.field_index
+        self.cancel_search()
+        self.last_search = None
+        self.results_model.clear()
+        if self.field_filters and index is not None:
+            started = time.perf_counter()
+            lines = index.filter(self.field_filters)
+            self.results_model.append(lines)
+            self.results_list.updateGeometries()
+            description = " AND ".join(f"{name}={','.join(sorted(values))}"
+                                       for name, values in sorted(self.field_filters.items()))
+            self.status_bar.showMessage(f"{len(lines)} lines where {description} "
+                                        f"({(time.perf_counter() - started) * 1000:.1f} ms)")
+        QTimer.singleShot(0, self.populate_facets)
+    
+    def clear_field_filter(self):
+        self.field_filters = {}
+        self.show_field_matches()
+    
+    def set_ngram_index(self, enabled):
+        """Build (or load) the trigram index for the open file, or drop it."""
+        self.log_processor.ngram_enabled = enabled
+        if not enabled:
+            self.log_processor.stop_ngram_index()
+            return
+        if self.current_file:
+            self.status_bar.showMessage("Building trigram index...")
+        self.log_processor.start_ngram_index(self.ngram_ready.emit)
+    
+    def show_ngram_stats(self, index):
+        stats = index.stats()
+        origin = ("loaded from cache" if stats['from_cache']
+                  else f"built in {stats['build_seconds']:.2f} seconds")
+        self.status_bar.showMessage(
+            f"Trigram index ready: {stats['blocks']} blocks, {stats['disk_bytes'] / 1e6:.1f} MB"
+            f" on disk, {origin}")
+    
+    def set_follow(self, enabled):
+        """Start or stop following the open file as it grows."""
+        if self.follow_thread is not None:
+            self.follow_thread.stop()
+            self.follow_thread.wait()
+            self.follow_thread = None
+        if enabled and self.current_file and self.session is None:
+            self.follow_thread = FollowThread(self.current_file)
+            self.follow_thread.file_changed.connect(self.refresh_file)
+            self.follow_thread.start()
+            self.refresh_file()
+    
+    def refresh_file(self):
+        """Show lines appended to the file, and search only those lines."""
+        change = self.log_processor.refresh()
+        if change.kind in ('unchanged', 'missing'):
+            return
         
-        # Find the position of the target line in the displayed text
-        line_offset = line_num - self.current_display_start
-        for _ in range(line_offset):
-            cursor.movePosition(QTextCursor.NextBlock)
+        if change.kind == 'grown':
+            if self.search_thread is not None:
+                # Picked up by finish_search once the running search is done
+                self.search_thread.end_line = min(self.search_thread.end_line, change.first_line)
+            elif self.last_search:
+                self.start_search(*self.last_search,
+                                  start_line=min(change.first_line, self.searched_lines))
+        else:
+            # Truncated or rotated: everything shown so far is gone
+            self.cancel_search()
+            self.reset_fields()
+            self.current_display_start = 0
+            self.discard_results_from(0)
+            self.searched_lines = 0
+            if self.last_search:
+                self.start_search(*self.last_search)
         
-        cursor.movePosition(QTextCursor.EndOfBlock, QTextCursor.KeepAnchor)
-        self.log_display.setTextCursor(cursor)
-        self.log_display.ensureCursorVisible()
+        self.log_display.refresh(change.first_line)
+        if self.follow_checkbox.isChecked():
+            self.scroll_to_end()
+        else:
+            self.update_page_info()
+        self.status_bar.showMessage(f"{os.path.basename(self.current_file)}: {self.log_processor.total_lines} lines ({change.kind})")
+    
+    def scroll_to_end(self):
+        self.log_display.scroll_to_end()
+    
+    def show_selected_result(self, index):
+        line_num = index.data(Qt.UserRole)
+        if self.session is not None:
+            file_index, line_num = line_num
+            self.show_session_file(file_index)
+        self.highlight_line(line_num)
+    
+    def highlight_line(self, line_num):
+        self.log_display.highlight_line(line_num)
     
     def update_log_display(self):
+        """Show the file from current_display_start on."""
         if not self.current_file:
             return
         
-        end_line = min(self.current_display_start + self.lines_per_page, self.log_processor.total_lines)
-        lines = self.log_processor.get_lines(self.current_display_start, end_line)
-        
-        self.log_display.clear()
-        self.log_display.setPlainText(''.join(lines))
-        
-        # Update page info
-        total_pages = (self.log_processor.total_lines + self.lines_per_page - 1) // self.lines_per_page
-        current_page = self.current_display_start // self.lines_per_page + 1
-        self.page_info_label.setText(f"Page: {current_page}/{total_pages}")
+        if self.log_display.processor is not self.log_processor:
+            self.log_display.set_processor(self.log_processor)
+        else:
+            self.log_display.refresh(self.log_display.row_count)
+        self.log_display.scroll_to_line(self.current_display_start)
+        self.update_page_info()
+    
+    def update_page_info(self, top_line=None):
+        """Track the line at the top of the view and the position in the file."""
+        if top_line is not None:
+            self.current_display_start = top_line
+        total_lines = self.log_processor.total_lines
+        if not total_lines:
+            self.page_info_label.setText("Lines: 0/0")
+        else:
+            first = min(self.current_display_start + 1, total_lines)
+            last = min(self.current_display_start + self.log_display.visible_rows(), total_lines)
+            self.page_info_label.setText(f"Lines: {first}-{last}/{total_lines}")
         
         # Enable/disable navigation buttons
         self.prev_button.setEnabled(self.current_display_start > 0)
-        self.next_button.setEnabled(end_line < self.log_processor.total_lines)
+        self.next_button.setEnabled(self.current_display_start + self.lines_per_page < total_lines)
     
     def show_previous_page(self):
         if self.current_display_start > 0:
@@ -248,23 +1115,95 @@ class MainWindow(QMainWindow):
             self.update_log_display()
     
     def show_context_menu(self, position):
-        item = self.results_list.itemAt(position)
-        if not item:
+        index = self.results_list.indexAt(position)
+        if not index.isValid():
             return
         
         context_menu = QMenu()
         copy_action = QAction("Copy Line", self)
-        copy_action.triggered.connect(lambda: self.copy_result_line(item))
+        copy_action.triggered.connect(lambda: self.copy_result_line(index))
         context_menu.addAction(copy_action)
+        export_action = QAction("Export Results...", self)
+        export_action.setEnabled(self.session is None)
+        export_action.triggered.connect(self.export_results)
+        context_menu.addAction(export_action)
         
         context_menu.exec_(self.results_list.mapToGlobal(position))
     
-    def copy_result_line(self, item):
-        line_num = item.data(Qt.UserRole)
-        line_text = self.log_processor.get_line(line_num)
+    def copy_result_line(self, index):
+        line_num = index.data(Qt.UserRole)
+        if self.session is not None:
+            line_text = self.session.get_line(*line_num)
+        else:
+            line_text = self.log_processor.get_line(line_num)
         QApplication.clipboard().setText(line_text)
         self.status_bar.showMessage("Line copied to clipboard", 2000)
     
+    def export_results(self):
+        """Write the results, with context lines around them, to a file chosen by the user."""
+        if self.session is not None:
+            self.status_bar.showMessage("Results are exported for single files only")
+            return
+        if not len(self.results_model):
+            self.status_bar.showMessage("No results to export")
+            return
+        if self.export_thread is not None:
+            self.status_bar.showMessage("An export is already running (Esc cancels it)")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Export Results", "", EXPORT_FILTERS)
+        if not path:
+            return
+        context, ok = QInputDialog.getInt(self, "Export Results", "Context lines around each match:",
+                                          0, 0, 1000)
+        if not ok:
+            return
+        self.status_bar.showMessage(f"Exporting {len(self.results_model)} matches...")
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setValue(0)
+        # A copy, since a search still running appends to the results
+        lines = array(self.results_model.line_numbers.typecode, self.results_model.line_numbers)
+        self.export_thread = ExportThread(self.log_processor, lines, path, context)
+        self.export_thread.export_done.connect(self.finish_export)
+        self.export_thread.progress_update.connect(self.progress_bar.setValue)
+        self.export_thread.start()
+    
+    def finish_export(self, result):
+        thread = self.export_thread
+        self.export_thread = None
+        self.progress_bar.setVisible(False)
+        if result is None:
+            self.status_bar.showMessage(f"Export failed: {thread.error}")
+        elif result.cancelled:
+            self.status_bar.showMessage("Export cancelled")
+        else:
+            self.status_bar.showMessage(f"Exported {result.matches} matches ({result.lines} lines) "
+                                        f"to {os.path.basename(thread.path)}")
+    
+    def stop_export(self):
+        """Cancel a running export; finish_export reports it."""
+        if self.export_thread is not None:
+            self.export_thread.cancel()
+    
+    def cancel_export(self):
+        thread = self.export_thread
+        if thread is None:
+            return
+        thread.cancel()
+        thread.export_done.disconnect()
+        thread.progress_update.disconnect()
+        if thread.isRunning():
+            self._stopping_threads.append(thread)
+            thread.finished.connect(lambda: self._stopping_threads.remove(thread))
+        self.export_thread = None
+    
     def closeEvent(self, event):
+        self.set_follow(False)
+        self.cancel_search()
+        self.cancel_field_extraction()
+        self.cancel_export()
+        self.cancel_session_open()
+        for thread in list(self._stopping_threads):
+            thread.wait()
+        self.close_session()
         self.log_processor.close()
         event.accept()
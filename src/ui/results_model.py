@@ -0,0 +1,226 @@
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from PyQt5.QtCore import QAbstractListModel, QAbstractTableModel, QModelIndex, Qt
+
+# Rows made visible to the view per fetchMore call.
+FETCH_ROWS = 1000
+
+# Formatted rows kept around for repaints and scrolling back.
+TEXT_CACHE_ROWS = 1024
+
+# Characters of each matching line shown in the list.
+PREVIEW_CHARS = 100
+
+
+def _preview(data):
+    """Text shown for a matching line, cut at PREVIEW_CHARS characters."""
+    text = data.decode('utf-8', errors='replace')
+    if len(text) > PREVIEW_CHARS:
+        text = text[:PREVIEW_CHARS] + "..."
+    return text
+
+
+class ResultsModel(QAbstractListModel):
+    """List model over the line numbers of search results.
+
+    Only line numbers are stored, in a packed array; the text of a row is
+    read from the processor when the view asks for it, through a small
+    cache.  Rows are exposed to the view in FETCH_ROWS steps as it
+    scrolls, so a search can keep streaming millions of hits into the
+    model without the view doing work per hit.
+    """
+
+    def __init__(self, processor=None, parent=None):
+        super().__init__(parent)
+        self.processor = processor
+        self.line_numbers = array('I')
+        self._exposed = 0
+        self._text = OrderedDict()
+
+    def __len__(self):
+        return len(self.line_numbers)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._exposed
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._exposed < len(self.line_numbers)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        count = min(FETCH_ROWS, len(self.line_numbers) - self._exposed)
+        self.beginInsertRows(QModelIndex(), self._exposed, self._exposed + count - 1)
+        self._exposed += count
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < self._exposed:
+            return None
+        line_num = self.line_numbers[index.row()]
+        if role == Qt.DisplayRole:
+            return self._row_text(line_num)
+        if role == Qt.UserRole:
+            return line_num
+        return None
+
+    def _row_text(self, line_num):
+        text = self._text.get(line_num)
+        if text is not None:
+            self._text.move_to_end(line_num)
+            return text
+        # A few extra bytes tell whether the preview was cut short
+        data = self.processor.get_line_bytes(line_num, 0, PREVIEW_CHARS * 4 + 1)
+        text = f"Line {line_num + 1}: {_preview(data)}"
+        self._text[line_num] = text
+        if len(self._text) > TEXT_CACHE_ROWS:
+            self._text.popitem(last=False)
+        return text
+
+    def line_at(self, row):
+        return self.line_numbers[row]
+
+    def append(self, line_numbers):
+        """Add results after the current ones; line numbers must be ascending."""
+        if not len(line_numbers):
+            return
+        if getattr(line_numbers, 'typecode', None) == self.line_numbers.typecode:
+            self.line_numbers.extend(line_numbers)
+        else:
+            try:
+                self.line_numbers.extend(array(self.line_numbers.typecode, line_numbers))
+            except OverflowError:
+                self.line_numbers = array('Q', self.line_numbers)
+                self.line_numbers.extend(line_numbers)
+        # The first screenfuls are shown right away; later rows on demand
+        if self._exposed < FETCH_ROWS:
+            self.fetchMore()
+
+    def discard_from(self, line_num):
+        """Drop results at or after line_num, e.g. lines that were rewritten."""
+        row = bisect_left(self.line_numbers, line_num)
+        if row < self._exposed:
+            self.beginRemoveRows(QModelIndex(), row, self._exposed - 1)
+            del self.line_numbers[row:]
+            self._exposed = row
+            self.endRemoveRows()
+        else:
+            del self.line_numbers[row:]
+        for cached in [n for n in self._text if n >= line_num]:
+            del self._text[cached]
+
+    def clear(self):
+        self.beginResetModel()
+        self.line_numbers = array('I')
+        self._exposed = 0
+        self._text.clear()
+        self.endResetModel()
+
+
+class SessionResultsModel(QAbstractTableModel):
+    """Table model over the (file, line) results of a LogSession search.
+
+    Works like ResultsModel, with File, Line and Text columns; rows keep
+    the order they are added in, which need not be file order.
+    """
+    COLUMNS = ("File", "Line", "Text")
+
+    def __init__(self, session=None, parent=None):
+        super().__init__(parent)
+        self.session = session
+        self.file_indices = array('I')
+        self.line_numbers = array('Q')
+        self._exposed = 0
+        self._text = OrderedDict()
+
+    def __len__(self):
+        return len(self.line_numbers)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._exposed
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole and 0 <= section < len(self.COLUMNS):
+            return self.COLUMNS[section]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._exposed < len(self.line_numbers)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        count = min(FETCH_ROWS, len(self.line_numbers) - self._exposed)
+        self.beginInsertRows(QModelIndex(), self._exposed, self._exposed + count - 1)
+        self._exposed += count
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < self._exposed:
+            return None
+        file_index = self.file_indices[index.row()]
+        line_num = self.line_numbers[index.row()]
+        if role == Qt.DisplayRole:
+            column = index.column()
+            if column == 0:
+                return self.session.files[file_index].name
+            if column == 1:
+                return str(line_num + 1)
+            return self._row_text(file_index, line_num)
+        if role == Qt.UserRole:
+            return file_index, line_num
+        return None
+
+    def _row_text(self, file_index, line_num):
+        key = (file_index, line_num)
+        text = self._text.get(key)
+        if text is not None:
+            self._text.move_to_end(key)
+            return text
+        text = _preview(self.session.get_line_bytes(file_index, line_num, 0, PREVIEW_CHARS * 4 + 1))
+        self._text[key] = text
+        if len(self._text) > TEXT_CACHE_ROWS:
+            self._text.popitem(last=False)
+        return text
+
+    def result_at(self, row):
+        return self.file_indices[row], self.line_numbers[row]
+
+    def append(self, file_index, line_numbers):
+        """Add results of one file after the current ones."""
+        if not len(line_numbers):
+            return
+        self.file_indices.extend(array('I', [file_index]) * len(line_numbers))
+        self.line_numbers.extend(array('Q', line_numbers))
+        if self._exposed < FETCH_ROWS:
+            self.fetchMore()
+
+    def set_results(self, file_indices, line_numbers):
+        """Replace the results, e.g. with the same ones merged by time."""
+        self.beginResetModel()
+        self.file_indices = array('I', file_indices)
+        self.line_numbers = array('Q', line_numbers)
+        self._exposed = min(FETCH_ROWS, len(self.line_numbers))
+        self.endResetModel()
+
+    def by_file(self):
+        """The results grouped by file, as ascending line numbers per file index."""
+        grouped = {}
+        for file_index, line_num in zip(self.file_indices, self.line_numbers):
+            grouped.setdefault(file_index, array('Q')).append(line_num)
+        for lines in grouped.values():
+            lines[:] = array('Q', sorted(lines))
+        return grouped
+
+    def clear(self):
+        self.beginResetModel()
+        self.file_indices = array('I')
+        self.line_numbers = array('Q')
+        self._exposed = 0
+        self._text.clear()
+        self.endResetModel()
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks.generate import generate_log, parse_size
+from benchmarks.report import compare
+from src.core.log_processor import LogProcessor
+from src.core.timestamps import detect_format
+
+
+class TestGenerator(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+
+    def generate(self, name, **options):
+        path = os.path.join(self.temp_dir, name)
+        return path, generate_log(path, 200_000, **options)
+
+    def test_deterministic(self):
+        first, counts = self.generate('a.log', seed=3)
+        second, _ = self.generate('b.log', seed=3)
+        third, _ = self.generate('c.log', seed=4)
+        with open(first, 'rb') as a, open(second, 'rb') as b, open(third, 'rb') as c:
+            data = a.read()
+            self.assertEqual(data, b.read())
+            self.assertNotEqual(data, c.read())
+        self.assertEqual(counts['bytes'], len(data))
+        self.assertGreaterEqual(len(data), 200_000)
+        self.assertEqual(counts['lines'], data.count(b"\n"))
+
+    def test_match_density_is_exact(self):
+        path, counts = self.generate('app.log', match_density=0.05)
+        processor = LogProcessor(search_backend='thread')
+        self.assertTrue(processor.open_file(path))
+        self.addCleanup(processor.close)
+        self.assertAlmostEqual(counts['matches'] / counts['lines'], 0.05, delta=0.01)
+        self.assertEqual(len(processor.search("ERROR", True)), counts['matches'])
+        self.assertEqual(len(processor.search("connection TIMEOUT", False)), counts['matches'])
+
+    def test_options(self):
+        for timestamps in ['iso8601', 'syslog', 'apache', 'epoch']:
+            path, _ = self.generate(f'{timestamps}.log', timestamp_format=timestamps)
+            with open(path, 'rb') as f:
+                lines = f.read().splitlines()
+            self.assertEqual(detect_format(lines[:200]).name, timestamps)
+        path, _ = self.generate('fixed.log', line_length='fixed', mean_length=200)
+        with open(path, 'rb') as f:
+            self.assertEqual({len(line) for line in f.read().splitlines()}, {200})
+        self.assertEqual(parse_size('100MB'), 100_000_000)
+        self.assertEqual(parse_size('1.5g'), 1_500_000_000)
+        self.assertRaises(ValueError, parse_size, 'lots')
+
+
+class TestCompare(unittest.TestCase):
+    def test_regressions_past_threshold(self):
+        baseline = {'search_mbps': {'value': 1000.0, 'unit': 'MB/s', 'better': 'higher'},
+                    'page_ms': {'value': 1.0, 'unit': 'ms', 'better': 'lower'}}
+        steady = {'search_mbps': {'value': 800.0, 'unit': 'MB/s', 'better': 'higher'},
+                  'page_ms': {'value': 1.2, 'unit': 'ms', 'better': 'lower'},
+                  'new_metric': {'value': 5.0, 'unit': 'ms', 'better': 'lower'}}
+        self.assertEqual(compare(steady, baseline, {'default': 0.25}), [])
+        slower = {'search_mbps': {'value': 700.0, 'unit': 'MB/s', 'better': 'higher'},
+                  'page_ms': {'value': 1.5, 'unit': 'ms', 'better': 'lower'}}
+        regressions = compare(slower, baseline, {'default': 0.25, 'page_ms': 1.0})
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith('search_mbps'))
+
+
+if __name__ == '__main__':
+    unittest.main()
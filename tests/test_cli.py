@@ -0,0 +1,138 @@
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+from unittest.mock import patch
+
+from src import cli
+from src.core.log_processor import LogProcessor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.lines = [f"2023-01-01 10:00:{i % 60:02d} {'ERROR' if i % 10 == 3 else 'INFO'} event {i}"
+                      for i in range(40)]
+        self.path = self.write('app.log', self.lines)
+
+    def write(self, name, lines):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        return path
+
+    def run_cli(self, *argv):
+        out = io.BytesIO()
+        status = cli.main(list(argv) + ['--no-cache'], out)
+        return status, out.getvalue().decode()
+
+    def test_search(self):
+        status, text = self.run_cli('search', 'ERROR', self.path)
+        self.assertEqual(status, cli.EXIT_FOUND)
+        self.assertEqual(text.splitlines(), [self.lines[i] for i in (3, 13, 23, 33)])
+        status, text = self.run_cli('search', '-n', '-i', 'event 1[0-2]$', self.path)
+        self.assertEqual(text.splitlines(), [f"{i + 1}:{self.lines[i]}" for i in (10, 11, 12)])
+        self.assertEqual(self.run_cli('search', '-c', 'ERROR', self.path), (cli.EXIT_FOUND, "4\n"))
+        self.assertEqual(self.run_cli('search', 'error', self.path), (cli.EXIT_NOT_FOUND, ""))
+
+    def test_query(self):
+        status, text = self.run_cli('search', '-n', '--query', 'ERROR AND NOT (/event 3$/ OR "event 13")',
+                                    self.path)
+        self.assertEqual(text.splitlines(), [f"{i + 1}:{self.lines[i]}" for i in (23, 33)])
+        self.assertEqual(self.run_cli('search', '-c', '--query', '-i', 'error OR "event 5"', self.path),
+                         (cli.EXIT_FOUND, "5\n"))
+        self.assertEqual(self.run_cli('search', '--query', '(ERROR', self.path)[0], cli.EXIT_ERROR)
+
+    def test_context(self):
+        status, text = self.run_cli('search', '-n', '-A', '1', '-B', '2', 'event (3|4|13)$', self.path)
+        self.assertEqual(text.splitlines(), [
+            f"2-{self.lines[1]}", f"3-{self.lines[2]}", f"4:{self.lines[3]}", f"5:{self.lines[4]}",
+            f"6-{self.lines[5]}", "--", f"12-{self.lines[11]}", f"13-{self.lines[12]}",
+            f"14:{self.lines[13]}", f"15-{self.lines[14]}"])
+
+    def test_context_lines(self):
+        # Matches arriving in separate batches share their context
+        context = cli.ContextLines(1, 2, 20)
+        items = list(context.add([2])) + list(context.add([4, 10])) + list(context.finish())
+        self.assertEqual(items, [(1, False), (2, True), (3, False), (4, True), (5, False),
+                                 (6, False), None, (9, False), (10, True), (11, False), (12, False)])
+
+    def test_several_files(self):
+        other = self.write('app.log.1', ["2023-01-01 09:59:59 ERROR earlier"])
+        status, text = self.run_cli('search', '-n', 'ERROR', self.temp_dir)
+        self.assertEqual(text.splitlines()[:2], ["app.log.1:1:2023-01-01 09:59:59 ERROR earlier",
+                                                 f"app.log:4:{self.lines[3]}"])
+        status, text = self.run_cli('search', '-c', '--no-filename', 'ERROR', other, self.path)
+        self.assertEqual(text, "1\n4\n")
+        self.assertEqual(self.run_cli('search', 'x', os.path.join(self.temp_dir, 'missing.log'))[0],
+                         cli.EXIT_ERROR)
+
+    def test_search_error(self):
+        def failing_search(processor, *args, **kwargs):
+            raise OSError(5, "Input/output error")
+        
+        stderr = io.StringIO()
+        with patch.object(LogProcessor, 'iter_search', failing_search), redirect_stderr(stderr):
+            self.assertEqual(self.run_cli('search', 'ERROR', self.path), (cli.EXIT_ERROR, ""))
+        self.assertEqual(stderr.getvalue(),
+                         f"logexplorer: [Errno 5] Input/output error: '{self.path}'\n")
+
+    def test_json_output(self):
+        status, text = self.run_cli('search', '--json', '-C', '1', 'event 3$', self.path)
+        records = json.loads(text)
+        self.assertEqual([(r['line'], r['type']) for r in records],
+                         [(3, 'context'), (4, 'match'), (5, 'context')])
+        self.assertEqual(records[1]['text'], self.lines[3])
+        self.assertEqual(json.loads(self.run_cli('search', '--json', 'missing', self.path)[1]), [])
+        status, text = self.run_cli('search', '--ndjson', 'ERROR', self.path)
+        self.assertEqual([json.loads(line)['line'] for line in text.splitlines()], [4, 14, 24, 34])
+
+    def test_time(self):
+        status, text = self.run_cli('time', '10:00:05', '10:00:14', self.path, '-e', 'ERROR', '-n')
+        self.assertEqual(text.splitlines(), [f"14:{self.lines[13]}"])
+        self.assertEqual(self.run_cli('time', '10:00:05', '10:00:14', self.path, '-c')[1], "10\n")
+
+    def test_index(self):
+        status, text = self.run_cli('index', '--json', self.path)
+        self.assertEqual(json.loads(text), [{'file': 'app.log', 'lines': 40,
+                                             'bytes': os.path.getsize(self.path)}])
+
+    def test_fields(self):
+        self.assertEqual(self.run_cli('fields', self.path),
+                         (cli.EXIT_FOUND, "level=INFO\t36\nlevel=ERROR\t4\n"))
+        self.assertEqual(self.run_cli('fields', '-c', '--where', 'level=ERROR', self.path),
+                         (cli.EXIT_FOUND, "4\n"))
+        status, text = self.run_cli('fields', '-l', '-n', '--where', 'level=ERROR', self.path)
+        self.assertEqual(text.splitlines(), [f"{i + 1}:{self.lines[i]}" for i in (3, 13, 23, 33)])
+        status, text = self.run_cli('fields', '--ndjson', '--field-format', '{} {} {level} {}',
+                                    self.path)
+        self.assertEqual([json.loads(line) for line in text.splitlines()],
+                         [{'field': 'level', 'value': 'INFO', 'lines': 36},
+                          {'field': 'level', 'value': 'ERROR', 'lines': 4}])
+        # A field's own filter leaves its counts alone, so other values stay visible
+        self.assertEqual(self.run_cli('fields', '--where', 'level=FATAL', self.path),
+                         (cli.EXIT_NOT_FOUND, "level=INFO\t36\nlevel=ERROR\t4\n"))
+        self.assertEqual(self.run_cli('fields', '--where', 'level', self.path)[0], cli.EXIT_ERROR)
+
+    def test_startup_imports(self):
+        # Neither Qt nor the heavy optional modules load for a search
+        # (bz2 and lzma are not checked: argparse imports them through shutil)
+        code = ("import sys; from src import cli; "
+                f"cli.main(['search', '--no-cache', 'ERROR', {self.path!r}], open(__import__('os').devnull, 'wb')); "
+                "print(' '.join(m for m in ('PyQt5', 'numpy', 'multiprocessing') "
+                "if m in sys.modules))")
+        result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+import bz2
+import gzip
+import lzma
+import os
+import random
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from src.core import compressed
+from src.core.compressed import CompressedFile, compressed_ranges, detect_compression, xz_blocks
+from src.core.index_cache import IndexCache
+from src.core.log_processor import LogProcessor
+
+
+def make_lines(count, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(count):
+        level = 'ERROR' if i % 997 == 3 else rng.choice(['INFO', 'DEBUG', 'WARN'])
+        lines.append(b"2023-01-01 10:%02d:%02d %s request %d took %dms" %
+                     (i // 60 % 60, i % 60, level.encode(), i, rng.randrange(1000)))
+    return b"\n".join(lines) + b"\n"
+
+
+def split_parts(data, parts):
+    """Split data into roughly equal pieces, not aligned to lines."""
+    step = len(data) // parts + 1
+    return [data[i:i + step] for i in range(0, len(data), step)]
+
+
+class TestCompressedLogs(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.cache = IndexCache(os.path.join(self.temp_dir, 'cache'), min_file_size=0)
+        self.data = make_lines(20000)
+        self.plain_path = self.write('app.log', self.data)
+
+    def write(self, name, data):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def open_processor(self, path, cache=None):
+        processor = LogProcessor(index_cache=cache or self.cache, search_backend='thread',
+                                 max_workers=2)
+        self.assertTrue(processor.open_file(path))
+        self.addCleanup(processor.close)
+        return processor
+
+    def compressed_files(self):
+        parts = split_parts(self.data, 3)
+        return {
+            'gzip': self.write('app.log.gz', gzip.compress(self.data)),
+            'gzip members': self.write('members.log.gz', b''.join(gzip.compress(p) for p in parts)),
+            'bz2 streams': self.write('app.log.bz2', b''.join(bz2.compress(p) for p in parts)),
+            'xz streams': self.write('app.log.xz', b''.join(lzma.compress(p) for p in parts)
+                                     + b'\x00' * 8),
+            'xz filters': self.write('delta.log.xz', lzma.compress(self.data, filters=[
+                {'id': lzma.FILTER_DELTA, 'dist': 1}, {'id': lzma.FILTER_LZMA2}])),
+        }
+
+    def assert_same_as_plain(self, processor, plain):
+        self.assertEqual(processor.total_lines, plain.total_lines)
+        self.assertEqual(list(processor.line_offsets), list(plain.line_offsets))
+        for line in [0, 1, 4567, plain.total_lines - 1]:
+            self.assertEqual(processor.get_line(line), plain.get_line(line))
+        for pattern, case_sensitive in [("ERROR", True), ("request 1234 ", False),
+                                        (r"took 99\dms", False), ("missing", False)]:
+            self.assertEqual(processor.search(pattern, case_sensitive),
+                             plain.search(pattern, case_sensitive))
+
+    def test_detect_compression(self):
+        self.assertEqual(detect_compression(gzip.compress(b"x")), 'gzip')
+        self.assertEqual(detect_compression(bz2.compress(b"x")), 'bz2')
+        self.assertEqual(detect_compression(lzma.compress(b"x")), 'xz')
+        self.assertIsNone(detect_compression(b"plain text"))
+
+    def test_formats_read_like_the_plain_file(self):
+        plain = self.open_processor(self.plain_path)
+        for name, path in self.compressed_files().items():
+            with self.subTest(format=name):
+                processor = self.open_processor(path)
+                self.assertIsNotNone(processor.compressed)
+                self.assertEqual(processor.file_size, len(self.data))
+                self.assert_same_as_plain(processor, plain)
+
+    def test_segments(self):
+        files = self.compressed_files()
+        counts = {'gzip': 1, 'gzip members': 3, 'bz2 streams': 3, 'xz streams': 3, 'xz filters': 1}
+        for name, path in files.items():
+            with self.subTest(format=name):
+                self.assertEqual(self.open_processor(path).compressed.segment_count, counts[name])
+        with open(files['xz streams'], 'rb') as f:
+            blocks = xz_blocks(f.read())
+        self.assertEqual(sum(size for _, size, _ in blocks), len(self.data))
+        with open(files['xz filters'], 'rb') as f:
+            self.assertIsNone(xz_blocks(f.read()))
+
+    def test_sidecar_skips_decompressing(self):
+        path = self.compressed_files()['gzip members']
+        first = self.open_processor(path)
+        with patch.object(CompressedFile, 'build', side_effect=AssertionError("rebuilt")):
+            second = self.open_processor(path)
+        self.assertEqual(list(second.line_offsets), list(first.line_offsets))
+        self.assertEqual(list(second.compressed.starts), list(first.compressed.starts))
+        self.assert_same_as_plain(second, self.open_processor(self.plain_path))
+
+    def test_changed_file_is_reread(self):
+        path = self.write('app.log.gz', gzip.compress(self.data))
+        processor = self.open_processor(path)
+        self.assertEqual(processor.refresh().kind, 'unchanged')
+        with open(path, 'ab') as f:
+            f.write(gzip.compress(b"appended line\n"))
+        change = processor.refresh()
+        self.assertEqual(change.kind, 'truncated')
+        self.assertEqual(processor.get_line(processor.total_lines - 1), "appended line")
+
+    def test_truncated_file_keeps_what_decodes(self):
+        packed = gzip.compress(self.data)
+        processor = self.open_processor(self.write('cut.log.gz', packed[:len(packed) // 2]))
+        self.assertGreater(processor.total_lines, 0)
+        self.assertLess(processor.total_lines, 20000)
+        self.assertEqual(processor.get_line(0), self.data.split(b"\n")[0].decode())
+
+
+class TestGzipCheckpoints(unittest.TestCase):
+    def setUp(self):
+        for name, value in [('CHECKPOINT_BYTES', 64 * 1024), ('PAGE_BYTES', 4096),
+                            ('CACHE_PAGES', 4), ('MIN_RANGE_BYTES', 100 * 1024),
+                            ('INPUT_BYTES', 4096)]:
+            patcher = patch.object(compressed, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.data = make_lines(30000, seed=1)
+        self.lines = self.data.split(b"\n")[:-1]
+        self.path = os.path.join(self.temp_dir, 'app.log.gz')
+        with open(self.path, 'wb') as f:
+            f.write(gzip.compress(self.data))
+        self.processor = LogProcessor(index_cache=IndexCache(max_bytes=0), search_backend='thread',
+                                      max_workers=2)
+        self.assertTrue(self.processor.open_file(self.path))
+        self.addCleanup(self.processor.close)
+
+    def test_checkpoints_bound_random_reads(self):
+        source = self.processor.compressed
+        points = source.restart_points()
+        self.assertGreater(len(points), len(self.data) // (128 * 1024))
+        rng = random.Random(2)
+        for line in rng.sample(range(len(self.lines)), 200):
+            self.assertEqual(self.processor.get_line_bytes(line), self.lines[line])
+        self.assertLessEqual(len(source._pages), compressed.CACHE_PAGES)
+
+    def test_reads_across_pages(self):
+        source = self.processor.compressed
+        for start, end in [(0, 10), (4090, 4100), (5000, 70000), (len(self.data) - 5, len(self.data))]:
+            self.assertEqual(source[start:end], self.data[start:end])
+        self.assertEqual(source[len(self.data):len(self.data) + 10], b'')
+
+    def test_concurrent_reads(self):
+        errors = []
+
+        def read(seed):
+            rng = random.Random(seed)
+            for line in rng.sample(range(len(self.lines)), 100):
+                if self.processor.get_line_bytes(line) != self.lines[line]:
+                    errors.append(line)
+
+        threads = [threading.Thread(target=read, args=(seed,)) for seed in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_search_is_split_at_restart_points(self):
+        ranges = compressed_ranges(self.processor.compressed, self.processor.line_index,
+                                   0, len(self.data))
+        self.assertGreater(len(ranges), 1)
+        offsets = self.processor.line_offsets
+        for start, end in ranges:
+            self.assertEqual(offsets[self.processor.line_index.line_at(start)], start)
+        expected = [i for i, line in enumerate(self.lines) if b"ERROR" in line]
+        self.assertEqual([i for i, _ in self.processor.search("ERROR", True)], expected)
+        refined = self.processor.refine(expected, "request 3", True)
+        self.assertEqual(list(refined), [i for i in expected if b"request 3" in self.lines[i]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from array import array
+from unittest.mock import patch
+
+from src.core import export
+from src.core.export import ContextLines, export_format
+from src.core.log_processor import LogProcessor
+from src.core.workers import CancelToken
+
+
+def grep_context(matches, before, after, total_lines):
+    """Lines grep -B before -A after would print, with None for its "--" separators."""
+    shown = sorted({line for match in matches
+                    for line in range(max(0, match - before), min(total_lines, match + after + 1))})
+    result = []
+    for i, line in enumerate(shown):
+        if i and line != shown[i - 1] + 1:
+            result.append(None)
+        result.append((line, line in matches))
+    return result
+
+
+class TestContextLines(unittest.TestCase):
+    def test_segments_merge_overlapping_windows(self):
+        context = ContextLines(2, 1, 100)
+        segments = list(context.segments([5, 6, 9, 40])) + list(context.finish_segments())
+        self.assertEqual(segments, [(3, 5, False), (5, 7, True), (7, 9, False), (9, 10, True),
+                                    (10, 11, False), None, (38, 40, False), (40, 41, True),
+                                    (41, 42, False)])
+
+    def test_lines_agree_with_grep(self):
+        matches = [0, 1, 4, 10, 11, 30, 33, 34, 98, 99]
+        for before, after in ((0, 0), (1, 0), (0, 2), (3, 3), (10, 1)):
+            with self.subTest(before=before, after=after):
+                context = ContextLines(before, after, 100)
+                # Batches split anywhere give the same lines
+                items = (list(context.add(matches[:3])) + list(context.add(matches[3:8])) +
+                         list(context.add(matches[8:])) + list(context.finish()))
+                if not (before or after):
+                    items = [item for item in items if item is not None]
+                    self.assertEqual(items, [(line, True) for line in matches])
+                else:
+                    self.assertEqual(items, grep_context(matches, before, after, 100))
+
+    def test_export_format(self):
+        self.assertEqual(export_format('out.log'), ('text', False))
+        self.assertEqual(export_format('out.NDJSON.gz'), ('ndjson', True))
+        self.assertEqual(export_format('out.jsonl', compress=True), ('ndjson', True))
+        self.assertEqual(export_format('out.gz', 'text', False), ('text', False))
+        with self.assertRaises(ValueError):
+            export_format('out.log', 'xml')
+
+
+class TestProcessorExport(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.lines = [f"{'ERROR' if i % 7 == 0 else 'INFO'} event {i} {'x' * (i % 30)}"
+                      for i in range(2000)]
+        self.path = self.write('app.log', "\n".join(self.lines) + "\n")
+        self.processor = LogProcessor(search_backend='thread')
+        self.addCleanup(self.processor.close)
+        self.assertTrue(self.processor.open_file(self.path))
+        self.matches = [i for i, _ in self.processor.search("ERROR")]
+
+    def write(self, name, text):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def expected(self, before, after, numbered=False):
+        lines = []
+        for item in grep_context(set(self.matches), before, after, len(self.lines)):
+            if item is None:
+                if before or after:
+                    lines.append("--")
+            elif numbered:
+                lines.append(f"{item[0] + 1}{':' if item[1] else '-'}{self.lines[item[0]]}")
+            else:
+                lines.append(self.lines[item[0]])
+        return lines
+
+    def test_text(self):
+        out = os.path.join(self.temp_dir, 'out.log')
+        for before, after in ((0, 0), (2, 1), (4, 4)):
+            with self.subTest(before=before, after=after), patch.object(export, 'COPY_BYTES', 1000):
+                result = self.processor.export(self.matches, out, before=before, after=after)
+                with open(out) as f:
+                    self.assertEqual(f.read().splitlines(), self.expected(before, after))
+                self.assertEqual(result.matches, len(self.matches))
+                self.assertEqual(result.lines, sum(1 for line in self.expected(before, after) if line != "--"))
+        self.processor.export(self.matches, out, before=1, after=2, numbered=True)
+        with open(out) as f:
+            self.assertEqual(f.read().splitlines(), self.expected(1, 2, numbered=True))
+
+    def test_ndjson_gzip(self):
+        out = os.path.join(self.temp_dir, 'out.ndjson.gz')
+        with patch.object(export, 'COPY_LINES', 3):
+            self.processor.export(array('I', self.matches), out, after=1)
+        with gzip.open(out) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([(r['line'] - 1, r['type'] == 'match') for r in records],
+                         [item for item in grep_context(set(self.matches), 0, 1, len(self.lines)) if item])
+        self.assertEqual(records[0], {'file': 'app.log', 'line': 1, 'text': self.lines[0], 'type': 'match'})
+
+    def test_unterminated_last_line(self):
+        path = self.write('tail.log', "ERROR first\nINFO second\nERROR third")
+        self.assertTrue(self.processor.open_file(path))
+        out = os.path.join(self.temp_dir, 'out.log')
+        self.processor.export([0, 2], out, before=1)
+        with open(out) as f:
+            self.assertEqual(f.read(), "ERROR first\nINFO second\nERROR third\n")
+
+    def test_compressed_source(self):
+        path = os.path.join(self.temp_dir, 'app.log.gz')
+        with gzip.open(path, 'wt') as f:
+            f.write("\n".join(self.lines) + "\n")
+        self.assertTrue(self.processor.open_file(path))
+        out = os.path.join(self.temp_dir, 'out.log')
+        self.processor.export(self.matches, out, before=2, after=2)
+        with open(out) as f:
+            self.assertEqual(f.read().splitlines(), self.expected(2, 2))
+
+    def test_progress_and_cancel(self):
+        out = os.path.join(self.temp_dir, 'out.log')
+        progress = []
+        with patch.object(export, 'PROGRESS_BYTES', 1000):
+            self.processor.export(self.matches, out, after=3,
+                                  progress=lambda done, total: progress.append((done, total)))
+        self.assertGreater(len(progress), 10)
+        self.assertEqual(progress, sorted(progress))
+        self.assertEqual(progress[-1], (os.path.getsize(self.path),) * 2)
+
+        cancel = CancelToken()
+        with patch.object(export, 'PROGRESS_BYTES', 1000):
+            result = self.processor.export(self.matches, out, cancel=cancel,
+                                           progress=lambda done, total: cancel.cancel())
+        self.assertTrue(result.cancelled)
+        self.assertFalse(os.path.exists(out))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.core import fields
+from src.core.fields import (FieldIndex, extract_range, parse_filter, resolve_field_format,
+                             template_format)
+from src.core.log_processor import LogProcessor
+
+LINES = [
+    "2023-01-01 10:00:00 INFO [main] app.Server: started port=8080",
+    "2023-01-01 10:00:01 ERROR [pool-1] db.Pool - connection lost host=db1 retry=3",
+    "2023-01-01 10:00:02 WARN [pool-2] db.Pool - slow query took=1200ms",
+    "    at db.Pool.query(Pool.java:42)",
+    "2023-01-01 10:00:03 ERROR [main] app.Server: request failed user=\"jane doe\"",
+    "2023-01-01 10:00:04 INFO [pool-1] db.Pool - connection restored host=db1",
+]
+
+
+class TestFieldFormats(unittest.TestCase):
+    def test_auto_format(self):
+        fmt = resolve_field_format('auto')
+        self.assertEqual(fmt.extract(LINES[1].encode()),
+                         {'level': b'ERROR', 'thread': b'pool-1', 'component': b'db.Pool',
+                          'host': b'db1', 'retry': b'3'})
+        self.assertEqual(fmt.extract(LINES[4].encode())['user'], b'jane doe')
+        self.assertEqual(fmt.extract(LINES[3].encode()), {})
+
+    def test_template(self):
+        fmt = template_format("{} {} {level} [{thread}] {logger}{} {message}")
+        values = fmt.extract(LINES[4].encode())
+        self.assertEqual(values['level'], b'ERROR')
+        self.assertEqual(values['thread'], b'main')
+        self.assertEqual(values['message'], b'request failed user="jane doe"')
+        self.assertEqual(fmt.fields, ['level', 'thread', 'logger', 'message'])
+        self.assertEqual(resolve_field_format(r'(?P<level>INFO|ERROR)').extract(b"x ERROR"),
+                         {'level': b'ERROR'})
+        with self.assertRaises(ValueError):
+            resolve_field_format("no placeholders")
+
+    def test_parse_filter(self):
+        self.assertEqual(parse_filter('level=ERROR,WARN AND component=db user="jane doe"'),
+                         {'level': {'ERROR', 'WARN'}, 'component': {'db'}, 'user': {'jane doe'}})
+        with self.assertRaises(ValueError):
+            parse_filter("level")
+
+
+class TestFieldIndex(unittest.TestCase):
+    def build(self, lines, ranges=2):
+        data = "".join(line + "\n" for line in lines).encode()
+        index = FieldIndex(resolve_field_format(None))
+        bounds = [0] + [data.index(b"\n", len(data) * k // ranges) + 1 for k in range(1, ranges)]
+        bounds.append(len(data))
+        for lo, hi in zip(bounds, bounds[1:]):
+            index.append(*extract_range(data, lo, hi, index.format), hi)
+        return index
+
+    def test_columns_and_facets(self):
+        index = self.build(LINES)
+        self.assertEqual(index.covered_lines, 6)
+        self.assertEqual(index.columns['level'].codes.typecode, 'B')
+        facets = index.facets()
+        self.assertEqual(facets['level'], [('ERROR', 2), ('INFO', 2), ('WARN', 1)])
+        self.assertEqual(facets['host'], [('db1', 2)])
+        self.assertEqual(list(index.filter({'level': ['ERROR'], 'component': ['db.Pool']})), [1])
+        self.assertEqual(list(index.filter({'level': ['ERROR', 'WARN']})), [1, 2, 4])
+        self.assertEqual(index.count({'thread': ['pool-1']}), 2)
+        self.assertEqual(index.count({'level': ['FATAL']}), 0)
+        self.assertEqual(index.count({}), 6)
+        # A field's own filter does not narrow its counts
+        facets = index.facets({'level': ['ERROR'], 'thread': ['main']})
+        self.assertEqual(facets['level'], [('ERROR', 1), ('INFO', 1)])
+        self.assertEqual(facets['thread'], [('main', 1), ('pool-1', 1)])
+
+    def test_wide_and_dropped_columns(self):
+        lines = [f"INFO [t{i % 280}] id={i}" for i in range(400)]
+        with patch.object(fields, 'MAX_VALUES', 300):
+            index = self.build(lines, ranges=3)
+        self.assertEqual(index.columns['thread'].codes.typecode, 'H')
+        self.assertEqual(index.count({'thread': ['t279']}), 1)
+        self.assertEqual(index.count({'thread': ['t3']}), 2)
+        self.assertNotIn('id', index.columns)
+        self.assertIn('id', index.dropped)
+        with self.assertRaises(ValueError):
+            index.count({'id': ['3']})
+
+    def test_truncate(self):
+        index = self.build(LINES)
+        index.truncate(4, 0)
+        self.assertEqual(index.covered_lines, 4)
+        self.assertEqual(index.facets()['level'], [('ERROR', 1), ('INFO', 1), ('WARN', 1)])
+
+
+class TestProcessorFields(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.path = os.path.join(self.temp_dir, 'app.log')
+        with open(self.path, 'w') as f:
+            f.write("\n".join(LINES * 50) + "\n2023-01-01 10:00:05 DEBUG [main] app")
+        self.processor = LogProcessor(search_backend='thread')
+        self.addCleanup(self.processor.close)
+        self.processor.open_file(self.path)
+
+    def test_extracts_in_parallel_ranges(self):
+        progress = []
+        with patch('src.core.workers.MIN_CHUNK_BYTES', 1000):
+            index = self.processor.fields(progress=lambda done, total: progress.append(done))
+        self.assertGreater(len(progress), 1)
+        self.assertEqual(index.covered_lines, 301)
+        self.assertEqual(dict(index.facets()['level']), {'ERROR': 100, 'INFO': 100, 'WARN': 50,
+                                                         'DEBUG': 1})
+        self.assertIs(self.processor.fields(), index)
+
+    def test_follows_growing_file(self):
+        self.processor.fields()
+        with open(self.path, 'a') as f:
+            f.write(" ready\n2023-01-01 10:00:06 FATAL [main] app: down\n")
+        self.processor.refresh()
+        index = self.processor.fields()
+        self.assertEqual(index.covered_lines, 302)
+        self.assertEqual(dict(index.facets()['level'])['DEBUG'], 1)
+        self.assertEqual(list(index.filter({'level': ['FATAL']})), [301])
+        self.assertEqual(index.facets({'level': ['FATAL']})['component'], [('app', 1)])
+
+    def test_other_format_starts_over(self):
+        self.processor.fields()
+        index = self.processor.fields(r'(?P<second>\d\d) (?P<level>[A-Z]+) ')
+        self.assertEqual(index.fields, ['second', 'level'])
+        self.assertEqual(index.count({'second': ['03']}), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
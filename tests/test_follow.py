@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from src.core.follow import FileWatcher
+from src.core.log_processor import LogProcessor
+
+
+class TestFollow(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.temp_dir, 'app.log')
+        self.write(b"one\ntwo\n")
+        self.processor = LogProcessor()
+        self.assertTrue(self.processor.open_file(self.log_path))
+
+    def tearDown(self):
+        self.processor.close()
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, data, mode='wb'):
+        with open(self.log_path, mode) as f:
+            f.write(data)
+
+    def test_unchanged(self):
+        self.assertEqual(self.processor.refresh(), ('unchanged', 2))
+
+    def test_growth_indexes_only_new_lines(self):
+        self.write(b"three\nfo", mode='ab')
+        self.assertEqual(self.processor.refresh(), ('grown', 2))
+        self.write(b"ur\nfive\n", mode='ab')
+        # The unterminated line is reported again once it is completed
+        self.assertEqual(self.processor.refresh(), ('grown', 3))
+        self.assertEqual(self.processor.get_lines(2, 5), ["three", "four", "five"])
+        self.assertEqual(self.processor.search("f", start_line=3), [(3, "four"), (4, "five")])
+
+    def test_truncation_reopens(self):
+        self.write(b"x\n")
+        self.assertEqual(self.processor.refresh(), ('truncated', 0))
+        self.assertEqual(self.processor.get_lines(0, 5), ["x"])
+
+    def test_rewrite_with_growth_reopens(self):
+        self.write(b"ONE\nTWO\nTHREE\n")
+        self.assertEqual(self.processor.refresh().kind, 'truncated')
+        self.assertEqual(self.processor.get_line(0), "ONE")
+
+    def test_rotation(self):
+        os.rename(self.log_path, self.log_path + '.1')
+        self.assertEqual(self.processor.refresh(), ('missing', 2))
+        self.assertEqual(self.processor.get_line(1), "two")
+        self.write(b"")
+        self.assertEqual(self.processor.refresh(), ('rotated', 0))
+        self.assertEqual(self.processor.total_lines, 0)
+        self.write(b"fresh\n", mode='ab')
+        self.assertEqual(self.processor.refresh(), ('grown', 0))
+        self.assertEqual(self.processor.get_line(0), "fresh")
+
+
+class TestFileWatcher(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.temp_dir, 'app.log')
+        open(self.log_path, 'wb').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def check_wakes_on_append(self, watcher):
+        self.addCleanup(watcher.close)
+        self.assertFalse(watcher.wait(0.05))
+        timer = threading.Timer(0.05, lambda: open(self.log_path, 'ab').write(b"x\n"))
+        timer.start()
+        started = time.monotonic()
+        self.assertTrue(watcher.wait(5))
+        self.assertLess(time.monotonic() - started, 5)
+        timer.join()
+
+    def test_wakes_on_append(self):
+        self.check_wakes_on_append(FileWatcher(self.log_path))
+
+    def test_polling_fallback(self):
+        watcher = FileWatcher(self.log_path, poll_interval=0.01)
+        watcher.close()  # drop inotify, if any, to force polling
+        self.check_wakes_on_append(watcher)
+
+    def test_ignores_other_files(self):
+        watcher = FileWatcher(self.log_path)
+        self.addCleanup(watcher.close)
+        if not watcher.uses_inotify:
+            self.skipTest("inotify not available")
+        with open(os.path.join(self.temp_dir, 'other.log'), 'wb') as f:
+            f.write(b"noise\n")
+        self.assertFalse(watcher.wait(0.1))
+
+
+if __name__ == "__main__":
+    unittest.main()
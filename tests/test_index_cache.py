@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+from array import array
+from unittest.mock import patch
+
+from src.core import index_cache
+from src.core.index_cache import IndexCache
+from src.core.line_index import LineIndex
+from src.core.log_processor import LogProcessor
+
+
+class TestIndexCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = IndexCache(os.path.join(self.temp_dir, 'cache'), min_file_size=0)
+        self.log_path = os.path.join(self.temp_dir, 'app.log')
+        self.write(b"".join(b"line %d\n" % i for i in range(100)))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, data, mode='wb'):
+        with open(self.log_path, mode) as f:
+            f.write(data)
+
+    def open_processor(self):
+        processor = LogProcessor(index_cache=self.cache)
+        self.assertTrue(processor.open_file(self.log_path))
+        self.addCleanup(processor.close)
+        return processor
+
+    def test_reopen_uses_mapped_cache(self):
+        first = self.open_processor()
+        second = self.open_processor()
+        self.assertIsInstance(second.line_index.offsets, memoryview)
+        self.assertEqual(list(second.line_offsets), list(first.line_offsets))
+        self.assertEqual(second.get_line(42), "line 42")
+
+    def test_grown_file_extends_cached_index(self):
+        self.open_processor()
+        self.write(b"line 100\nline 1", mode='ab')
+        processor = self.open_processor()
+        self.assertEqual(processor.total_lines, 102)
+        self.assertEqual(processor.get_line(100), "line 100")
+        self.assertEqual(processor.get_line(101), "line 1")
+
+    def test_rewritten_file_is_reindexed(self):
+        self.open_processor()
+        self.write(b"".join(b"LINE %d\n" % i for i in range(100)))
+        processor = self.open_processor()
+        self.assertNotIsInstance(processor.line_index.offsets, memoryview)
+        self.assertEqual(processor.get_line(5), "LINE 5")
+
+    def test_corrupt_entry_is_discarded(self):
+        processor = self.open_processor()
+        entry = self.cache.entry_path(processor.file_identity)
+        with open(entry, 'r+b') as f:
+            f.seek(20)
+            f.write(b"\xff\xff")
+        processor = self.open_processor()
+        self.assertNotIsInstance(processor.line_index.offsets, memoryview)
+        self.assertEqual(processor.total_lines, 100)
+
+    def test_corrupt_payload_is_discarded(self):
+        processor = self.open_processor()
+        entry = self.cache.entry_path(processor.file_identity)
+        with open(entry, 'r+b') as f:
+            f.seek(-12, os.SEEK_END)
+            data = f.read(1)
+            f.seek(-12, os.SEEK_END)
+            f.write(bytes([data[0] ^ 0x01]))
+        processor = self.open_processor()
+        self.assertNotIsInstance(processor.line_index.offsets, memoryview)
+        self.assertEqual(list(processor.line_offsets[-3:]), [774, 782, 790])
+        self.assertEqual(processor.get_line(98), "line 98")
+
+    def test_large_entry_checks_sampled_pages(self):
+        self.write(b"x\n" * 200000)
+        processor = self.open_processor()
+        entry = self.cache.entry_path(processor.file_identity)
+        payload_bytes = os.path.getsize(entry) - index_cache._HEADER.size
+        hashed = []
+        crc32 = zlib.crc32
+        
+        def counting_crc32(data, *args):
+            hashed.append(len(data))
+            return crc32(data, *args)
+        
+        with patch.object(index_cache.zlib, 'crc32', counting_crc32):
+            self.assertIsInstance(self.open_processor().line_index.offsets, memoryview)
+        sampled = index_cache.PAYLOAD_SAMPLES * index_cache.PAYLOAD_SAMPLE_BYTES
+        self.assertLess(sum(hashed), sampled + 2 * index_cache.CHECK_BYTES + 4096)
+        self.assertGreater(payload_bytes, 2 * sampled)
+        
+        # A corrupt sampled page (here the tail) is caught
+        with open(entry, 'r+b') as f:
+            f.seek(-3, os.SEEK_END)
+            f.write(b"\x7f")
+        processor = self.open_processor()
+        self.assertNotIsInstance(processor.line_index.offsets, memoryview)
+        self.assertEqual(processor.total_lines, 200000)
+    
+    def test_offsets_past_the_file_are_discarded(self):
+        processor = self.open_processor()
+        index = LineIndex()
+        index.offsets = array('I', [0, 7, os.path.getsize(self.log_path) + 1])
+        self.cache.store(processor.file_identity, index)
+        self.assertIsNone(self.cache.load(processor.file_identity, processor.raw_map))
+        self.assertFalse(os.path.exists(self.cache.entry_path(processor.file_identity)))
+    
+    def test_lru_eviction_respects_size_cap(self):
+        processor = self.open_processor()
+        entry_size = os.path.getsize(self.cache.entry_path(processor.file_identity))
+        self.cache.max_bytes = entry_size
+        other = os.path.join(self.temp_dir, 'other.log')
+        with open(other, 'wb') as f:
+            f.write(b"x\n" * 100)
+        other_processor = LogProcessor(index_cache=self.cache)
+        other_processor.open_file(other)
+        other_entry = self.cache.entry_path(other_processor.file_identity)
+        other_processor.close()
+        self.assertEqual(os.listdir(self.cache.cache_dir), [os.path.basename(other_entry)])
+
+
+if __name__ == "__main__":
+    unittest.main()
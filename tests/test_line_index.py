@@ -0,0 +1,65 @@
+import unittest
+from array import array
+from unittest.mock import patch
+
+from src.core import line_index
+from src.core.line_index import LineIndex, typecode_for
+
+
+class TestLineIndex(unittest.TestCase):
+    def build(self, data, backend='array'):
+        index = LineIndex(backend)
+        index.build(data, len(data))
+        return index
+
+    def test_trailing_newline_does_not_add_line(self):
+        index = self.build(b"a\nbb\nccc\n")
+        self.assertEqual(index.line_count, 3)
+        self.assertEqual(list(index.offsets), [0, 2, 5, 9])
+        self.assertEqual(index.span(2), (5, 8))
+
+    def test_unterminated_last_line(self):
+        index = self.build(b"a\nbb")
+        self.assertEqual(index.line_count, 2)
+        self.assertTrue(index.partial)
+        self.assertEqual(index.span(1), (2, 4))
+
+    def test_empty_buffer(self):
+        index = self.build(b"")
+        self.assertEqual(index.line_count, 0)
+
+    def test_extend_completes_partial_line(self):
+        data = b"one\ntw"
+        index = self.build(data)
+        data += b"o\nthree\n"
+        index.extend(data, len(data))
+        self.assertEqual(index.line_count, 3)
+        self.assertFalse(index.partial)
+        self.assertEqual(list(index.offsets), [0, 4, 8, 14])
+
+    def test_blocks_match_single_pass(self):
+        data = b"".join(b"x" * (i % 13) + b"\n" for i in range(500))
+        expected = list(self.build(data).offsets)
+        with patch.object(line_index, 'BLOCK_SIZE', 7):
+            self.assertEqual(list(self.build(data).offsets), expected)
+
+    def test_line_at(self):
+        index = self.build(b"a\nbb\nccc\n")
+        self.assertEqual(index.line_at(0), 0)
+        self.assertEqual(index.line_at(1), 0)
+        self.assertEqual(index.line_at(2), 1)
+        self.assertEqual(index.line_at(8), 2)
+
+    def test_typecode_widens_for_large_files(self):
+        self.assertEqual(array(typecode_for(2 ** 32 - 1)).itemsize, 4)
+        self.assertEqual(array(typecode_for(2 ** 32)).itemsize, 8)
+
+    @unittest.skipIf(not line_index.HAVE_NUMPY, "NumPy not installed")
+    def test_numpy_backend_matches_array_backend(self):
+        data = b"".join(b"y" * (i % 17) + b"\n" for i in range(1000)) + b"tail"
+        self.assertEqual(list(self.build(data, 'numpy').offsets),
+                         list(self.build(data, 'array').offsets))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,15 @@
 import unittest
 import os
+import shutil
 import tempfile
+import threading
+import time
+from unittest.mock import patch
+from src.core import log_processor, workers
+from src.core.index_cache import IndexCache
 from src.core.log_processor import LogProcessor
+from src.core.result_cache import ResultCache
+from src.core.stats import Stats
 
 class TestLogProcessor(unittest.TestCase):
     def setUp(self):
@@ -63,5 +71,284 @@ class TestLogProcessor(unittest.TestCase):
         results = self.log_processor.search(r"\d{2}:\d{2}:\d{2}")
         self.assertEqual(len(results), 5)  # All lines have time stamps
 
+    def test_search_backends_agree(self):
+        self.log_processor.open_file(self.temp_file_path)
+        expected = self.log_processor.search(r"INFO|error")
+        for backend in ("thread", "process"):
+            processor = LogProcessor(search_backend=backend, max_workers=2)
+            self.assertTrue(processor.open_file(self.temp_file_path))
+            try:
+                self.assertEqual(processor.search(r"INFO|error"), expected)
+            finally:
+                processor.close()
+
+    def test_iter_search_streams_batches_with_progress(self):
+        self.log_processor.open_file(self.temp_file_path)
+        with patch.object(workers, 'MIN_CHUNK_BYTES', 60):
+            batches = list(self.log_processor.iter_search("INFO"))
+        self.assertGreater(len(batches), 1)
+        self.assertEqual([i for b in batches for i in b.line_numbers], [0, 3])
+        self.assertEqual(batches[-1].bytes_scanned, self.log_processor.file_size)
+        
+    def test_search_cancellation(self):
+        self.log_processor.open_file(self.temp_file_path)
+        with patch.object(workers, 'MIN_CHUNK_BYTES', 60):
+            first = self.log_processor.iter_search("INFO")
+            next(first)
+            # Starting another search cancels the first one
+            second = list(self.log_processor.iter_search("INFO"))
+            self.assertEqual(list(first), [])
+            self.assertEqual(second[-1].bytes_scanned, self.log_processor.file_size)
+            
+            token = workers.CancelToken()
+            token.cancel()
+            self.assertIsNone(self.log_processor.search("INFO", cancel=token))
+            
+            # Cancelled after matches were found, it still returns no partial list
+            token = workers.CancelToken()
+            iter_search = self.log_processor.iter_search
+            
+            def cancel_after_first(*args, **kwargs):
+                for batch in iter_search(*args, **kwargs):
+                    yield batch
+                    token.cancel()
+            
+            with patch.object(self.log_processor, 'iter_search', cancel_after_first):
+                self.assertIsNone(self.log_processor.search("INFO", cancel=token))
+            self.assertEqual([i for i, _ in self.log_processor.search("INFO")], [0, 3])
+
+    def test_byte_ranges_are_line_aligned(self):
+        self.log_processor.open_file(self.temp_file_path)
+        index = self.log_processor.line_index
+        with patch.object(workers, 'MIN_CHUNK_BYTES', 10):
+            ranges = workers.byte_ranges(index, 0, self.log_processor.file_size, 2)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], self.log_processor.file_size)
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+            self.assertIn(start, list(index.offsets))
+
+class TestBackgroundOpen(unittest.TestCase):
+    """Indexing in a thread, paused after the first step by a gate."""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.path = os.path.join(self.temp_dir, 'app.log')
+        with open(self.path, 'w') as f:
+            f.write("".join(f"line {i} {'ERROR' if i % 10 == 0 else 'INFO'}\n" for i in range(1000)))
+            f.write("no newline")
+        self.gate = threading.Event()
+        self.addCleanup(self.gate.set)
+        step = log_processor._index_step
+        
+        def gated_step(*args):
+            if threading.current_thread() is not threading.main_thread():
+                self.gate.wait(5)
+            step(*args)
+        
+        for target, value in (('FIRST_INDEX_STEP', 256), ('BLOCK_SIZE', 1024),
+                              ('_index_step', gated_step)):
+            patcher = patch.object(log_processor, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.cache = IndexCache(os.path.join(self.temp_dir, 'cache'), min_file_size=0)
+        self.processor = LogProcessor(index_cache=self.cache, search_backend='thread')
+        self.addCleanup(self.processor.close)
+    
+    def test_prefix_is_usable_while_indexing(self):
+        progress = []
+        self.assertTrue(self.processor.open_file(self.path, background=True,
+                                                 progress=lambda done, total: progress.append(done)))
+        self.assertTrue(self.processor.indexing)
+        prefix = self.processor.total_lines
+        self.assertTrue(0 < prefix < 1000)
+        self.assertEqual(self.processor.get_line(prefix - 1), f"line {prefix - 1} "
+                         f"{'ERROR' if (prefix - 1) % 10 == 0 else 'INFO'}")
+        self.assertEqual(self.processor.get_line(prefix), "")
+        found = [i for i, _ in self.processor.search("ERROR")]
+        self.assertEqual(found, list(range(0, prefix, 10)))
+        self.assertEqual(self.processor.refresh().kind, 'unchanged')
+        
+        self.gate.set()
+        self.assertTrue(self.processor.wait_indexed(5))
+        self.assertEqual(self.processor.total_lines, 1001)
+        self.assertEqual(self.processor.get_line(1000), "no newline")
+        self.assertEqual(self.processor.indexed_bytes, self.processor.file_size)
+        self.assertEqual(progress[-1], self.processor.file_size)
+        self.assertEqual(progress, sorted(progress))
+        self.assertEqual(len(self.processor.search("ERROR")), 100)
+        
+        # The finished index matches a direct build and is cached
+        reference = LogProcessor(index_cache=IndexCache(max_bytes=0))
+        reference.open_file(self.path)
+        self.assertEqual(list(self.processor.line_offsets), list(reference.line_offsets))
+        reference.close()
+        stats = Stats(enabled=True)
+        cached = LogProcessor(index_cache=self.cache, stats=stats)
+        cached.open_file(self.path, background=True)
+        self.assertFalse(cached.indexing)
+        self.assertEqual(stats.counters, {'index_cache.hit': 1})
+        cached.close()
+    
+    def test_opening_another_file_cancels_indexing(self):
+        self.processor.open_file(self.path, background=True)
+        self.assertTrue(self.processor.indexing)
+        other = os.path.join(self.temp_dir, 'other.log')
+        with open(other, 'w') as f:
+            f.write("first\nsecond\n")
+        self.gate.set()
+        self.assertTrue(self.processor.open_file(other, background=True))
+        self.assertFalse(self.processor.indexing)
+        self.assertEqual(self.processor.total_lines, 2)
+        self.assertEqual(self.processor.get_line(1), "second")
+
+    def test_read_error_while_indexing_is_reported(self):
+        def failing_step(*args):
+            if threading.current_thread() is not threading.main_thread():
+                raise OSError("Input/output error")
+            step(*args)
+        
+        step = log_processor._index_step
+        progress = []
+        with patch.object(log_processor, '_index_step', failing_step):
+            self.assertTrue(self.processor.open_file(self.path, background=True,
+                                                     progress=lambda done, total: progress.append(done)))
+            self.assertFalse(self.processor.wait_indexed(5))
+        self.assertFalse(self.processor.indexing)
+        self.assertEqual(self.processor.index_error, "Input/output error")
+        self.assertLess(self.processor.indexed_bytes, self.processor.file_size)
+        self.assertEqual(progress, [self.processor.indexed_bytes])
+        # Nothing half-built is cached, and the next open starts afresh
+        self.assertFalse(os.path.exists(self.cache.entry_path(self.processor.file_identity)))
+        self.gate.set()
+        self.assertTrue(self.processor.open_file(self.path, background=True))
+        self.assertIsNone(self.processor.index_error)
+        self.assertTrue(self.processor.wait_indexed(5))
+        self.assertEqual(self.processor.total_lines, 1001)
+
+class TestConcurrentReaders(unittest.TestCase):
+    """Paging, line reads and several searches at once, while the file changes."""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.path = os.path.join(self.temp_dir, 'app.log')
+        self.written = 0
+        self.pending = ""
+        self.append(3000)
+        patcher = patch.object(workers, 'MIN_CHUNK_BYTES', 4096)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.processor = LogProcessor(search_backend='thread', max_workers=4)
+        self.addCleanup(self.processor.close)
+        self.assertTrue(self.processor.open_file(self.path))
+        self.errors = []
+    
+    @staticmethod
+    def expected(i):
+        return f"line {i} {'ERROR' if i % 10 == 0 else 'INFO'} {'x' * (i % 50)}"
+    
+    def append(self, count):
+        # The file ends in the middle of a line, finished by the next append
+        text = self.pending + "".join(self.expected(i) + "\n"
+                                      for i in range(self.written, self.written + count))
+        with open(self.path, 'a') as f:
+            f.write(text[:-5])
+        self.pending = text[-5:]
+        self.written += count
+    
+    def run_threads(self, targets):
+        stop = threading.Event()
+        
+        def run(target):
+            try:
+                while not stop.is_set():
+                    target()
+            except Exception as e:
+                self.errors.append(e)
+        
+        threads = [threading.Thread(target=run, args=(target,)) for target in targets]
+        for thread in threads:
+            thread.start()
+        return stop, threads
+    
+    def page(self, allow_empty=False):
+        start = self.processor.total_lines // 2
+        for i, text in enumerate(self.processor.get_lines(start, start + 50), start):
+            if not (text and self.expected(i).startswith(text)) and not (allow_empty and not text):
+                raise AssertionError(f"line {i} read as {text!r}")
+        i = self.processor.total_lines - 1
+        text = self.processor.get_line(i)
+        if not self.expected(i).startswith(text) or not (text or allow_empty):
+            raise AssertionError(f"line {i} read as {text!r}")
+    
+    def search(self, pattern, query=False, case_sensitive=True):
+        found = []
+        for batch in self.processor.iter_search(pattern, case_sensitive, exclusive=False, query=query):
+            found.extend(batch.line_numbers)
+        if found != list(range(0, 10 * len(found), 10)):
+            raise AssertionError(f"{pattern!r} found {found[:20]}...")
+    
+    def test_reads_and_searches_while_growing(self):
+        stop, threads = self.run_threads([
+            self.page, self.page,
+            lambda: self.search("ERROR"),
+            lambda: self.search("error", case_sensitive=False),
+            lambda: self.search("ERROR AND NOT INFO", query=True)])
+        for _ in range(30):
+            self.append(200)
+            self.assertEqual(self.processor.refresh().kind, 'grown')
+        stop.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.errors, [])
+        self.assertEqual(self.processor.total_lines, self.written)
+        self.assertEqual(self.processor.get_line(self.written - 2), self.expected(self.written - 2))
+    
+    def test_blocking_searches_in_several_threads(self):
+        processor = LogProcessor(search_backend='thread', max_workers=4, result_cache=ResultCache(0))
+        self.addCleanup(processor.close)
+        self.assertTrue(processor.open_file(self.path))
+        
+        def search(pattern, count):
+            found = processor.search(pattern, True)
+            if len(found) != count:
+                raise AssertionError(f"{pattern!r} found {len(found)} lines, expected {count}")
+        
+        stop, threads = self.run_threads([lambda: search("ERROR", 300), lambda: search("INFO", 2700),
+                                          lambda: search("ERROR", 300)])
+        time.sleep(0.5)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.errors, [])
+    
+    def test_close_during_search(self):
+        raw_map = self.processor.raw_map
+        batches = self.processor.iter_search("ERROR", exclusive=False)
+        found = list(next(batches).line_numbers)
+        self.processor.close()
+        self.assertEqual(self.processor.get_line(0), "")
+        # The search goes on over the map it started on, which closes after it
+        self.assertFalse(raw_map.closed)
+        for batch in batches:
+            found.extend(batch.line_numbers)
+        self.assertEqual(found, list(range(0, 3000, 10)))
+        self.assertTrue(raw_map.closed)
+    
+    def test_reopen_under_readers(self):
+        stop, threads = self.run_threads([
+            lambda: self.page(allow_empty=True),
+            lambda: self.search("ERROR"),
+            lambda: self.search("error", case_sensitive=False)])
+        for _ in range(20):
+            self.processor.close()
+            self.assertTrue(self.processor.open_file(self.path))
+        stop.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.errors, [])
+
 if __name__ == "__main__":
     unittest.main()
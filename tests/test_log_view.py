@@ -0,0 +1,87 @@
+import os
+import sys
+import tempfile
+import unittest
+
+from PyQt5.QtGui import QColor
+from PyQt5.QtWidgets import QApplication
+
+from src.core.index_cache import IndexCache
+from src.core.log_processor import LogProcessor
+from src.core.query import Query
+from src.ui import log_view
+from src.ui.log_view import LogView
+
+app = QApplication.instance()
+if app is None:
+    app = QApplication(sys.argv)
+
+
+class TestLogView(unittest.TestCase):
+    def setUp(self):
+        fd, self.log_path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'w') as f:
+            for i in range(20000):
+                f.write(f"line {i}\n")
+            f.write("long " + "x" * (log_view.LONG_LINE_BYTES * 3) + " end\n")
+        self.addCleanup(os.remove, self.log_path)
+        self.processor = LogProcessor(index_cache=IndexCache(max_bytes=0))
+        self.assertTrue(self.processor.open_file(self.log_path))
+        self.addCleanup(self.processor.close)
+        self.view = LogView(self.processor)
+        self.view.resize(400, 300)
+        self.view.set_processor(self.processor)
+        self.addCleanup(self.view.deleteLater)
+
+    def test_scrollbar_spans_whole_file(self):
+        self.assertEqual(self.view.row_count, 20001)
+        self.view.scroll_to_end()
+        self.assertGreater(self.view.top_line, 19900)
+        self.assertEqual(self.view.row_text(self.view.top_line), f"line {self.view.top_line}")
+
+    def test_only_visible_rows_are_read(self):
+        for line in range(0, 20000, 500):
+            self.view.scroll_to_line(line)
+            self.view.repaint()
+        self.assertLessEqual(len(self.view._rows), log_view.ROW_CACHE_ROWS)
+        self.assertNotIn(0, self.view._rows)
+        self.assertIn(19500, self.view._rows)
+
+    def test_highlight_line_centers_it(self):
+        self.view.highlight_line(12345)
+        self.assertEqual(self.view.highlighted_line, 12345)
+        top = self.view.top_line
+        self.assertLess(top, 12345)
+        self.assertLess(12345, top + self.view.visible_rows())
+        self.view.highlight_line(12346)
+        self.assertEqual(self.view.top_line, top)  # already visible
+
+    def test_query_terms_are_marked(self):
+        self.view.set_highlighter(Query("line AND NOT 7").highlights)
+        image = self.view.viewport().grab().toImage()
+        char_width, row_height = self.view.char_width, self.view.row_height
+        self.assertEqual(image.pixelColor(char_width * 2, 1), QColor(log_view.TERM_COLORS[0]))
+        # Negated terms are not marked
+        self.assertNotIn(image.pixelColor(char_width * 5 + 1, row_height * 7 + 1).name(),
+                         log_view.TERM_COLORS)
+
+    def test_long_lines_are_read_lazily(self):
+        last = self.view.row_count - 1
+        self.assertEqual(len(self.view.row_text(last)), log_view.LONG_LINE_BYTES)
+        self.view.scroll_to_end()
+        column = len("long ") + log_view.LONG_LINE_BYTES * 3
+        self.assertEqual(self.view._visible_text(last, column, 10), " end")
+
+    def test_refresh_after_growth(self):
+        self.view.scroll_to_end()
+        self.view.repaint()
+        with open(self.log_path, 'a') as f:
+            f.write("appended\n")
+        change = self.processor.refresh()
+        self.view.refresh(change.first_line)
+        self.assertEqual(self.view.row_count, 20002)
+        self.assertEqual(self.view.row_text(20001), "appended")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from src.core import ngram_index
+from src.core.index_cache import IndexCache
+from src.core.log_processor import LogProcessor
+from src.core.ngram_index import NgramIndex, required_trigrams
+from src.core.search_engine import SearchPattern
+
+
+class TestNgramIndex(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.object(ngram_index, 'BLOCK_SIZE', 512)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.cache = IndexCache(os.path.join(self.temp_dir, 'cache'), min_file_size=0)
+        self.log_path = os.path.join(self.temp_dir, 'app.log')
+        lines = []
+        for i in range(2000):
+            level = 'ERROR' if i % 500 == 7 else 'INFO'
+            lines.append(b"2023-01-01 10:%02d:%02d %s worker-%d handled request %d" %
+                         (i // 60 % 60, i % 60, level.encode(), i % 4, i))
+        lines[1234] += b" Timeout contacting db-primary"
+        with open(self.log_path, 'wb') as f:
+            f.write(b"\n".join(lines) + b"\n")
+
+    def open_processor(self, **kwargs):
+        processor = LogProcessor(index_cache=self.cache, search_backend='thread', **kwargs)
+        self.assertTrue(processor.open_file(self.log_path))
+        self.addCleanup(processor.close)
+        return processor
+
+    def build_index(self, processor):
+        ready = threading.Event()
+        processor.start_ngram_index(lambda index: ready.set())
+        self.assertTrue(ready.wait(10))
+        return processor.ngram_index
+
+    def test_results_match_unindexed_search(self):
+        plain = self.open_processor()
+        indexed = self.open_processor()
+        self.build_index(indexed)
+        for pattern, case_sensitive in [("ERROR", True), ("error", False), ("timeout", False),
+                                        ("Timeout", True), (r"db-\w+mary", False),
+                                        (r"request 1(23|99)\d", True), (r"10:0\d:59", False),
+                                        ("no such text", False), ("a", False)]:
+            with self.subTest(pattern=pattern, case_sensitive=case_sensitive):
+                self.assertEqual(indexed.search(pattern, case_sensitive),
+                                 plain.search(pattern, case_sensitive))
+
+    def test_rare_terms_prune_blocks(self):
+        processor = self.open_processor()
+        index = self.build_index(processor)
+        self.assertEqual(len(processor.search("Timeout", True)), 1)
+        query = index.last_query
+        self.assertTrue(query['pruned'])
+        self.assertLess(query['candidate_bytes'] * 4, query['total_bytes'])
+
+        processor.search("a", False)
+        self.assertFalse(index.last_query['pruned'])
+
+    def test_unindexed_tail_is_searched(self):
+        processor = self.open_processor()
+        self.build_index(processor)
+        with open(self.log_path, 'ab') as f:
+            f.write(b"late Timeout\n")
+        self.assertEqual(processor.refresh().kind, 'grown')
+        self.assertEqual([i for i, _ in processor.search("timeout")], [1234, 2000])
+
+    def test_index_is_persisted(self):
+        processor = self.open_processor()
+        built = self.build_index(processor)
+        self.assertTrue(os.path.exists(self.cache.entry_path(processor.file_identity, 'ngram')))
+
+        loaded = NgramIndex.load(self.cache, processor.file_identity, processor.file_map)
+        self.assertIsNotNone(loaded)
+        self.assertEqual(list(loaded.bounds), list(built.bounds))
+        self.assertEqual(bytes(loaded.bitmaps), built.bitmaps)
+        del loaded
+
+        reopened = self.open_processor(ngram_index=True)
+        self.assertIsNotNone(reopened.ngram_index)
+        self.assertEqual(len(reopened.search("Timeout")), 1)
+
+    def test_required_trigrams(self):
+        def required(pattern, case_sensitive=True):
+            return required_trigrams(SearchPattern(pattern, case_sensitive))
+
+        self.assertEqual(required("ERROR"), required("error"))
+        self.assertEqual(required("ab"), set())
+        self.assertEqual(required("(foo|bar)"), set())
+        self.assertEqual(required("x?(?!secret)"), set())
+        self.assertEqual(required(r"db-\w+mary"), required("mary"))
+        self.assertTrue(required("conn(ection)+ lost") >= required("lost") | required("ection"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.core import query
+from src.core.log_processor import LogProcessor
+from src.core.query import Query
+from src.core.search_engine import scan_range
+
+LINES = [
+    "2023-01-01 10:00:00 ERROR db: connection timeout",
+    "2023-01-01 10:00:01 ERROR db: connection refused (healthcheck)",
+    "2023-01-01 10:00:02 INFO healthcheck ok",
+    "2023-01-01 10:00:03 error api: Refused by upstream",
+    "",
+    "2023-01-01 10:00:05 WARN api: took 1520ms",
+    "2023-01-01 10:00:06 ERROR api: Timeout after 30 s",
+]
+DATA = "\n".join(LINES).encode()
+
+
+def line_numbers(text, case_sensitive=False, data=DATA):
+    starts = scan_range(data, 0, len(data), Query(text, case_sensitive))
+    return [data.count(b'\n', 0, start) for start in starts]
+
+
+class TestParsing(unittest.TestCase):
+    def test_syntax(self):
+        q = Query('ERROR AND (timeout OR "connection refused") NOT /took \\d+ms/ ERROR')
+        self.assertEqual([term.pattern for term in q.terms],
+                         ['ERROR', 'timeout', 'connection refused', r'took \d+ms'])
+        self.assertEqual(q.root, ('and', [('term', 0), ('or', [('term', 1), ('term', 2)]),
+                                          ('not', ('term', 3)), ('term', 0)]))
+        self.assertEqual(Query('a OR b c').root, ('or', [('term', 0), ('and', [('term', 1), ('term', 2)])]))
+        # Terms with regex characters are still plain text
+        self.assertEqual(Query('db.Pool').terms[0].pattern, r'db\.Pool')
+
+    def test_errors(self):
+        for text in ('', '  ', '(ERROR', 'ERROR)', 'ERROR OR', 'NOT', '"unclosed', 'a AND AND b', '""'):
+            with self.subTest(text=text), self.assertRaises(ValueError):
+                Query(text)
+
+
+class TestEvaluation(unittest.TestCase):
+    def test_boolean_queries(self):
+        self.assertEqual(line_numbers("ERROR AND (timeout OR refused) AND NOT healthcheck"), [0, 3, 6])
+        self.assertEqual(line_numbers("ERROR AND (timeout OR refused) AND NOT healthcheck", True), [0])
+        self.assertEqual(line_numbers("timeout OR refused", True), [0, 1])
+        self.assertEqual(line_numbers("NOT error"), [2, 4, 5])
+        self.assertEqual(line_numbers('"connection refused"'), [1])
+        self.assertEqual(line_numbers("/took 1[0-9]{3}ms$/ OR /^$/"), [4, 5])
+        self.assertEqual(line_numbers("api NOT (WARN OR Timeout)", True), [3])
+
+    def test_plans_agree(self):
+        # Driving the scan by terms and checking every line find the same lines
+        rng = random.Random(4)
+        words = ["alpha", "Beta", "gamma", "delta", "x=1", "epsilon"]
+        data = "\n".join(" ".join(rng.choice(words) for _ in range(rng.randrange(5)))
+                         for _ in range(3000)).encode()
+        queries = ["alpha AND NOT beta", "(gamma OR delta) AND (alpha OR x=1)", "NOT (alpha OR beta)",
+                   "epsilon OR /^gam/", "alpha beta gamma delta epsilon", "delta OR x=1 OR Beta"]
+        for text in queries:
+            for case_sensitive in (False, True):
+                q = Query(text, case_sensitive)
+                expected = [i for i, line in enumerate(data.split(b'\n'))
+                            if q.matches(line, 0, len(line))]
+                for cost in (0.0, 1.0):
+                    with self.subTest(text=text, case_sensitive=case_sensitive, cost=cost), \
+                            patch.object(query, 'CANDIDATE_SECONDS', cost):
+                        self.assertEqual(line_numbers(text, case_sensitive, data), expected)
+
+    def test_checks_are_built_per_ordering(self):
+        # Terms are data, never code, whatever characters they hold
+        q = Query('"x) or (True" OR "__import__(\'os\')" AND NOT "\\""')
+        self.assertFalse(q.matches(b"True", 0, 4))
+        self.assertTrue(q.matches(b"x) or (True", 0, 11))
+        self.assertEqual(line_numbers("ERROR AND db AND NOT healthcheck", True), [0])
+        q = Query("ERROR AND db AND NOT healthcheck", True)
+        q.scan(DATA, 0, len(DATA))
+        q.scan(DATA, 0, len(DATA))
+        self.assertEqual(len(q._checks), 1)
+
+    def test_range_bounds(self):
+        q = Query("ERROR OR INFO", True)
+        start, end = DATA.index(b"2023-01-01 10:00:01"), DATA.index(b"2023-01-01 10:00:03")
+        self.assertEqual(list(scan_range(DATA, start, end, q)), [start, DATA.index(b"2023-01-01 10:00:02")])
+        q = Query("NOT ERROR", True)
+        self.assertEqual(list(scan_range(DATA, start, end, q)), [DATA.index(b"2023-01-01 10:00:02")])
+
+    def test_highlights_and_pickling(self):
+        q = Query("ERROR AND (timeout OR refused) AND NOT healthcheck")
+        text = LINES[1]
+        spans = q.highlights(text)
+        self.assertEqual([(text[start:end], term) for start, end, term in spans],
+                         [("ERROR", 0), ("refused", 2)])
+        copy = pickle.loads(pickle.dumps(q))
+        self.assertEqual(copy.root, q.root)
+        self.assertEqual(line_numbers(copy.pattern), [0, 3, 6])
+        self.assertEqual([term.pattern for term in q.required_terms()], ["ERROR"])
+
+
+class TestProcessorQueries(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.path = os.path.join(self.temp_dir, 'app.log')
+        with open(self.path, 'w') as f:
+            f.write("\n".join(LINES * 100) + "\n")
+        self.processor = LogProcessor(search_backend='thread')
+        self.addCleanup(self.processor.close)
+        self.processor.open_file(self.path)
+
+    def test_search_and_refine(self):
+        text = "ERROR AND (timeout OR refused) AND NOT healthcheck"
+        expected = [i for i in range(700) if i % 7 in (0, 3, 6)]
+        with patch('src.core.workers.MIN_CHUNK_BYTES', 4096):
+            found = [i for i, _ in self.processor.search(text, query=True)]
+        self.assertEqual(found, expected)
+        # Cached apart from a plain search for the same text
+        self.assertEqual(self.processor.search(text), [])
+        self.assertEqual([i for i, _ in self.processor.search(text, query=True)], expected)
+        self.assertEqual(list(self.processor.refine(range(0, 700, 2), "timeout OR api", query=True)),
+                         [i for i in range(0, 700, 2) if i % 7 in (0, 3, 5, 6)])
+        with self.assertRaises(ValueError):
+            self.processor.search("(ERROR", query=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
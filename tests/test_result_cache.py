@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import unittest
+from array import array
+
+from src.core.index_cache import IndexCache
+from src.core.log_processor import LogProcessor
+from src.core.result_cache import ENTRY_OVERHEAD, ResultCache
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.log_path = os.path.join(self.temp_dir, 'app.log')
+        lines = []
+        for i in range(500):
+            level = 'ERROR' if i % 10 == 3 else 'INFO'
+            detail = 'Timeout' if i % 20 == 3 else 'timeout' if i % 30 == 3 else 'ok'
+            lines.append("%s request %d %s" % (level, i, detail))
+        self.write("\n".join(lines) + "\n")
+        self.cache = ResultCache()
+        self.processor = LogProcessor(index_cache=IndexCache(max_bytes=0),
+                                      result_cache=self.cache)
+        self.assertTrue(self.processor.open_file(self.log_path))
+        self.addCleanup(self.processor.close)
+
+    def write(self, text, mode='w'):
+        with open(self.log_path, mode) as f:
+            f.write(text)
+
+    def uncached(self, pattern, case_sensitive=False, **kwargs):
+        processor = LogProcessor(index_cache=IndexCache(max_bytes=0), result_cache=ResultCache(0))
+        processor.open_file(self.log_path)
+        self.addCleanup(processor.close)
+        return processor.search(pattern, case_sensitive, **kwargs)
+
+    def test_repeated_search_is_served_from_cache(self):
+        first = self.processor.search("ERROR")
+        batches = list(self.processor.iter_search("ERROR"))
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(batches[0].bytes_scanned, batches[0].total_bytes)
+        self.assertEqual(list(batches[0].line_numbers), [i for i, _ in first])
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.processor.search("ERROR", start_line=100, end_line=200),
+                         self.uncached("ERROR", start_line=100, end_line=200))
+
+    def test_case_insensitive_results_are_refined(self):
+        self.processor.search("Timeout")
+        hits = self.cache.hits
+        self.assertEqual(self.processor.search("Timeout", True), self.uncached("Timeout", True))
+        self.assertEqual(self.cache.hits, hits + 1)  # the case-insensitive superset
+        self.assertEqual(len(self.cache), 2)
+
+    def test_negating_regexes_are_not_refined(self):
+        self.write("A\nb\nERROR x\nerror y\nok\n")
+        self.assertTrue(self.processor.open_file(self.log_path))
+        for pattern in ("^[^a]$", "^(?!error)"):
+            with self.subTest(pattern=pattern):
+                self.processor.search(pattern)
+                self.assertEqual(self.processor.search(pattern, True), self.uncached(pattern, True))
+        self.assertEqual([i for i, _ in self.processor.search("^[^a]$", True)], [0, 1])
+        self.assertEqual([i for i, _ in self.processor.search("^(?!error)", True)], [0, 1, 2, 4])
+
+    def test_refine_previous_results(self):
+        errors = array('I', (i for i, _ in self.processor.search("ERROR")))
+        refined = self.processor.refine(errors, r"request \d+ Timeout", True)
+        self.assertEqual([(i, self.processor.get_line(i)) for i in refined],
+                         self.uncached(r"ERROR.*Timeout", True))
+
+    def test_growth_reuses_covered_lines(self):
+        self.processor.search("ERROR")
+        self.write("ERROR late\nINFO later\nERROR par", mode='a')
+        self.assertEqual(self.processor.refresh().kind, 'grown')
+        self.assertEqual(self.processor.search("ERROR"), self.uncached("ERROR"))
+        self.assertEqual(self.cache.partial_hits, 1)
+
+        # The incomplete last line is not trusted once the file grows again
+        self.write("sing\n", mode='a')
+        self.processor.refresh()
+        self.assertEqual(self.processor.search("ERROR")[-1], (502, "ERROR parsing"))
+
+    def test_rewritten_file_invalidates_results(self):
+        self.processor.search("ERROR")
+        self.write("ERROR only\n")
+        self.assertEqual(self.processor.refresh().kind, 'truncated')
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.processor.search("ERROR"), [(0, "ERROR only")])
+
+    def test_memory_bound_evicts_least_recently_used(self):
+        identity = self.processor.file_identity
+        cache = ResultCache(max_bytes=2 * (ENTRY_OVERHEAD + 400))
+        for pattern in ("a", "b", "c"):
+            cache.store(identity, pattern, False, array('I', range(100)), 500)
+            cache.lookup(identity, self.processor.file_map, "a", False)
+        self.assertIsNotNone(cache.lookup(identity, self.processor.file_map, "a", False))
+        self.assertIsNone(cache.lookup(identity, self.processor.file_map, "b", False))
+        self.assertEqual(cache.stats()['bytes'], 2 * (ENTRY_OVERHEAD + 400))
+        cache.store(identity, "huge", False, array('I', range(1000)), 500)
+        self.assertEqual(len(cache), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import sys
+import tempfile
+import unittest
+from array import array
+
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import Qt
+
+from src.core.index_cache import IndexCache
+from src.core.log_processor import LogProcessor
+from src.ui import results_model
+from src.ui.results_model import ResultsModel, SessionResultsModel
+
+app = QApplication.instance()
+if app is None:
+    app = QApplication(sys.argv)
+
+
+class TestResultsModel(unittest.TestCase):
+    def setUp(self):
+        fd, self.log_path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'w') as f:
+            for i in range(5000):
+                f.write(f"line {i}\n")
+            f.write("x" * 300 + "\n")
+        self.addCleanup(os.remove, self.log_path)
+        self.processor = LogProcessor(index_cache=IndexCache(max_bytes=0))
+        self.assertTrue(self.processor.open_file(self.log_path))
+        self.addCleanup(self.processor.close)
+        self.model = ResultsModel(self.processor)
+
+    def test_rows_are_exposed_incrementally(self):
+        self.model.append(array('I', range(0, 5000, 2)))
+        self.assertEqual(len(self.model), 2500)
+        self.assertEqual(self.model.rowCount(), results_model.FETCH_ROWS)
+        self.assertTrue(self.model.canFetchMore())
+        self.model.append(array('I', [5000]))
+        self.assertEqual(self.model.rowCount(), results_model.FETCH_ROWS)
+        while self.model.canFetchMore():
+            self.model.fetchMore()
+        self.assertEqual(self.model.rowCount(), 2501)
+
+    def test_row_text_is_read_on_demand(self):
+        self.model.append(array('I', [7, 5000]))
+        self.assertEqual(self.model.data(self.model.index(0)), "Line 8: line 7")
+        self.assertEqual(self.model.data(self.model.index(0), Qt.UserRole), 7)
+        long_row = self.model.data(self.model.index(1))
+        self.assertEqual(long_row, "Line 5001: " + "x" * results_model.PREVIEW_CHARS + "...")
+        self.assertIsNone(self.model.data(self.model.index(2)))
+
+    def test_text_cache_is_bounded(self):
+        self.model.append(array('I', range(5000)))
+        while self.model.canFetchMore():
+            self.model.fetchMore()
+        for row in range(5000):
+            self.model.data(self.model.index(row))
+        self.assertEqual(len(self.model._text), results_model.TEXT_CACHE_ROWS)
+
+    def test_discard_from_line(self):
+        self.model.append(array('I', range(0, 3000, 3)))
+        self.model.discard_from(1500)
+        self.assertEqual(len(self.model), 500)
+        self.assertEqual(self.model.rowCount(), 500)
+        self.assertEqual(self.model.line_at(499), 1497)
+        self.model.clear()
+        self.assertEqual(self.model.rowCount(), 0)
+
+    def test_wide_line_numbers(self):
+        self.model.append(array('Q', [1, 2 ** 33]))
+        self.assertEqual(list(self.model.line_numbers), [1, 2 ** 33])
+
+
+class TestSessionResultsModel(unittest.TestCase):
+    def test_rows_group_back_by_file(self):
+        model = SessionResultsModel()
+        model.append(0, array('I', [3, 8]))
+        model.append(2, array('I', [1]))
+        self.assertEqual(model.rowCount(), 3)
+        self.assertEqual(model.columnCount(), 3)
+        self.assertEqual(model.headerData(0, Qt.Horizontal), "File")
+        model.set_results(array('I', [2, 0, 0]), array('Q', [1, 8, 3]))
+        self.assertEqual(model.result_at(0), (2, 1))
+        self.assertEqual(model.data(model.index(1, 0), Qt.UserRole), (0, 8))
+        self.assertEqual({f: list(lines) for f, lines in model.by_file().items()},
+                         {0: [3, 8], 2: [1]})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import re
+import unittest
+from unittest.mock import patch
+
+from src.core import search_engine
+from src.core.line_index import LineIndex
+from src.core.search_engine import SearchPattern, scan_range
+
+
+DATA = (
+    b"2023-01-01 12:00:00 INFO: System started\n"
+    b"ERROR\n"
+    b"  timeout while connecting\n"
+    b"\n"
+    b"error: retry 3 of 5 [worker-1]\n"
+    b"2023-01-01 12:04:00 WARNING: High memory usage"
+)
+
+
+def per_line(data, pattern, case_sensitive):
+    """Reference implementation: search each decoded line separately."""
+    flags = 0 if case_sensitive else re.IGNORECASE
+    try:
+        regex = re.compile(pattern.encode('utf-8'), flags)
+    except re.error:
+        regex = re.compile(re.escape(pattern).encode('utf-8'), flags)
+    return [i for i, line in enumerate(data.split(b'\n')) if regex.search(line)]
+
+
+class TestScanRange(unittest.TestCase):
+    def setUp(self):
+        self.index = LineIndex('array')
+        self.index.build(DATA, len(DATA))
+
+    def search(self, pattern, case_sensitive=False, start_line=0, end_line=None):
+        if end_line is None:
+            end_line = self.index.line_count
+        offsets = self.index.offsets
+        starts = scan_range(DATA, offsets[start_line], offsets[end_line],
+                            SearchPattern(pattern, case_sensitive))
+        return [self.index.line_at(offset) for offset in starts]
+
+    def test_matches_per_line_reference(self):
+        patterns = ["ERROR", "error", "INFO", r"\d+", r"ERROR\s+timeout", r"^$", r"^\s",
+                    r"usage$", "[worker-1]", "(unbalanced", r"e.*r", "^", "3 of 5"]
+        for pattern in patterns:
+            for case_sensitive in (False, True):
+                with self.subTest(pattern=pattern, case_sensitive=case_sensitive):
+                    self.assertEqual(self.search(pattern, case_sensitive),
+                                     per_line(DATA, pattern, case_sensitive))
+
+    def test_chunks_aligned_to_lines(self):
+        expected = self.search(r"o")
+        pieces = self.search(r"o", end_line=3) + self.search(r"o", start_line=3)
+        self.assertEqual(pieces, expected)
+
+    def test_literal_fast_path(self):
+        self.assertEqual(SearchPattern("ERROR", True).literal, b"ERROR")
+        self.assertEqual(SearchPattern("12:04", False).literal, b"12:04")
+        self.assertEqual(SearchPattern("ERROR", False).literal, b"error")
+        self.assertTrue(SearchPattern("ERROR", False).folded)
+        self.assertIsNone(SearchPattern(r"\d", True).literal)
+
+    def test_folded_literal_across_blocks(self):
+        expected = per_line(DATA, "E", False)
+        with patch.object(search_engine, 'FOLD_BLOCK_SIZE', 5):
+            self.assertEqual(self.search("E"), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
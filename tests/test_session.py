@@ -0,0 +1,143 @@
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from array import array
+from unittest.mock import patch
+
+from src.core.index_cache import IndexCache
+from src.core.log_processor import LogProcessor
+from src.core.session import LogSession, expand_paths
+
+
+class TestLogSession(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.cache = IndexCache(os.path.join(self.temp_dir, 'cache'), min_file_size=0)
+        # A rotated set: app.log.2.gz is the oldest, app.log the newest
+        self.contents = {}
+        for name, hour in [('app.log.2.gz', 8), ('app.log.1', 9), ('app.log', 10)]:
+            lines = []
+            for i in range(300):
+                level = 'ERROR' if i % 100 == 42 else 'INFO'
+                lines.append(f"2023-01-01 {hour:02d}:{i // 60:02d}:{i % 60:02d} {level} {name} event {i}")
+            self.write(name, lines)
+
+    def write(self, name, lines):
+        path = os.path.join(self.temp_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = ("\n".join(lines) + "\n").encode()
+        with open(path, 'wb') as f:
+            f.write(gzip.compress(data) if name.endswith('.gz') else data)
+        self.contents[name] = lines
+        return path
+
+    def open_session(self, *patterns, **kwargs):
+        session = LogSession(patterns, index_cache=self.cache, search_backend='thread',
+                             max_workers=2, **kwargs)
+        self.addCleanup(session.close)
+        self.assertTrue(session.open())
+        return session
+
+    def test_rotated_sets_are_ordered_oldest_first(self):
+        self.write('app.log.10', ["old"])
+        self.write('other.log', ["other"])
+        names = [os.path.basename(p) for p in expand_paths([self.temp_dir])]
+        self.assertEqual(names, ['app.log.10', 'app.log.2.gz', 'app.log.1', 'app.log', 'other.log'])
+        pattern = os.path.join(self.temp_dir, 'app.log*')
+        self.assertEqual(len(expand_paths([pattern, os.path.join(self.temp_dir, 'app.log')])), 4)
+
+    def test_search_in_file_order(self):
+        session = self.open_session(self.temp_dir)
+        self.assertEqual([member.name for member in session.files],
+                         ['app.log.2.gz', 'app.log.1', 'app.log'])
+        self.assertEqual(session.total_lines, 900)
+        hits = session.search("ERROR", True)
+        self.assertEqual(hits, [(f, line) for f in range(3) for line in (42, 142, 242)])
+        file_index, line = hits[4]
+        self.assertEqual(session.get_line(file_index, line), self.contents['app.log.1'][142])
+        # Queries are searched the same way, gzip member included
+        hits = session.search('ERROR AND NOT ("event 142" OR app.log.1)', True, query=True)
+        self.assertEqual(hits, [(f, line) for f in (0, 2) for line in (42, 242)])
+        with self.assertRaises(ValueError):
+            session.search('ERROR AND', query=True)
+
+    def test_search_error_is_raised(self):
+        session = self.open_session(self.temp_dir)
+        iter_search = LogProcessor.iter_search
+        
+        def failing_search(processor, *args, **kwargs):
+            if processor.file_path.endswith('app.log.1'):
+                raise OSError(5, "Input/output error")
+            return iter_search(processor, *args, **kwargs)
+        
+        found = []
+        with patch.object(LogProcessor, 'iter_search', failing_search), \
+                self.assertRaises(OSError) as caught:
+            for batch in session.iter_search("ERROR", True):
+                found.extend((batch.file_index, line) for line in batch.line_numbers)
+        # The files before it were searched; the failing one is named
+        self.assertEqual(found, [(0, line) for line in (42, 142, 242)])
+        self.assertEqual(caught.exception.filename, session.files[1].path)
+        with patch.object(LogProcessor, 'iter_search', failing_search), self.assertRaises(OSError):
+            session.search("ERROR", True)
+        self.assertEqual(len(session.search("ERROR", True)), 9)
+
+    def test_merge_by_time(self):
+        # Two hosts writing at interleaved times
+        self.write('host1/web.log', [f"2023-01-01 12:00:{s:02d} host1 request" for s in range(0, 60, 2)])
+        self.write('host2/web.log', [f"2023-01-01 12:00:{s:02d} host2 request" for s in range(1, 60, 2)]
+                   + ["  continuation without a timestamp"])
+        session = self.open_session(os.path.join(self.temp_dir, 'host*', 'web.log'))
+        self.assertEqual([member.name for member in session.files],
+                         [os.path.join('host1', 'web.log'), os.path.join('host2', 'web.log')])
+        hits = session.search("request", order='time')
+        self.assertEqual(hits, [(s % 2, s // 2) for s in range(60)])
+        times = session.search("o", order='time')
+        self.assertEqual(times[-1], (1, 30))  # takes the timestamp before it
+
+    def test_open_handles_are_bounded(self):
+        for host in range(8):
+            self.write(f'hosts/{host}.log', [f"host {host} line {i}" for i in range(50)] + ["needle"])
+        session = self.open_session(os.path.join(self.temp_dir, 'hosts'), max_open=2)
+        self.assertEqual(len(session), 8)
+        self.assertLessEqual(session.open_count, 2)
+        hits = session.search("needle")
+        self.assertEqual(hits, [(f, 50) for f in range(8)])
+        self.assertLessEqual(session.open_count, 2)
+        self.assertEqual(session.get_line(0, 3), "host 0 line 3")
+        with session.pinned(1) as processor:
+            with session.pinned(2), session.pinned(3):
+                self.assertEqual(session.open_count, 3)  # pinned files stay open
+            self.assertEqual(processor.get_line(50), "needle")
+        self.assertLessEqual(session.open_count, 2)
+
+    def test_progress_and_refine(self):
+        session = self.open_session(self.temp_dir)
+        batches = list(session.iter_search("ERROR", True))
+        self.assertEqual(batches[-1].bytes_scanned, batches[-1].total_bytes)
+        within = {0: array('I', [42, 142]), 2: array('I', [242])}
+        refined = [(b.file_index, list(b.line_numbers))
+                   for b in session.iter_search("event 1", True, within=within) if len(b.line_numbers)]
+        self.assertEqual(refined, [(0, [142])])
+
+    def test_unopenable_files_are_dropped(self):
+        self.write('empty.log', [])
+        with open(os.path.join(self.temp_dir, 'empty.log'), 'wb'):
+            pass
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            session = self.open_session(self.temp_dir, os.path.join(self.temp_dir, 'missing.log'))
+        self.assertEqual(len(session), 3)
+        self.assertNotIn('empty.log', [member.name for member in session.files])
+        # Reported on stderr, so nothing mixes with results on stdout
+        self.assertIn("empty.log", stderr.getvalue())
+        self.assertEqual(stdout.getvalue(), "")
+
+
+if __name__ == '__main__':
+    unittest.main()
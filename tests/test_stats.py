@@ -0,0 +1,122 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from src.core import stats
+from src.core.index_cache import IndexCache
+from src.core.log_processor import LogProcessor
+from src.core.result_cache import ResultCache
+from src.core.stats import Stats, format_stats
+
+
+class TestStats(unittest.TestCase):
+    def test_disabled_records_nothing(self):
+        collector = Stats(enabled=False)
+        with collector.phase('open') as span:
+            span.bytes = 100
+        collector.count('index_cache.hit')
+        self.assertEqual(list(collector.timed('search', iter([1, 2]))), [1, 2])
+        self.assertEqual(collector.snapshot()['phases'], {})
+        self.assertEqual(collector.snapshot()['counters'], {})
+        self.assertEqual(format_stats(collector.snapshot()), "Stats collection is off")
+
+    def test_phases_and_hit_rates(self):
+        collector = Stats(enabled=True)
+        for nbytes in (1000, 3000):
+            with collector.phase('index') as span:
+                span.bytes, span.lines = nbytes, 10
+        for name in ('hit', 'hit', 'hit', 'miss'):
+            collector.count('result_cache.' + name)
+        snapshot = collector.snapshot()
+        index = snapshot['phases']['index']
+        self.assertEqual((index['count'], index['bytes'], index['last_bytes'], index['lines']),
+                         (2, 4000, 3000, 20))
+        self.assertEqual(snapshot['hit_rates'], {'result_cache': 0.75})
+        self.assertIn("result_cache: 75% hits", format_stats(snapshot))
+        collector.reset()
+        self.assertEqual(collector.snapshot()['phases'], {})
+
+    def test_timed_excludes_caller_time(self):
+        collector = Stats(enabled=True)
+
+        def produce():
+            for i in range(3):
+                time.sleep(0.01)
+                yield i
+
+        for _ in collector.timed('search', produce(), lambda item: item * 100, lines=7):
+            time.sleep(0.05)
+        search = collector.snapshot()['phases']['search']
+        self.assertGreaterEqual(search['seconds'], 0.03)
+        self.assertLess(search['seconds'], 0.1)
+        self.assertEqual((search['bytes'], search['lines']), (200, 7))
+
+    def test_trace_file(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path = os.path.join(temp_dir, 'trace.json')
+        with patch.dict(os.environ, {stats.TRACE_ENV: path}), patch.object(stats, '_trace_events', []):
+            collector = Stats()
+            self.assertTrue(collector.enabled)
+            with collector.phase('open'):
+                pass
+            collector.chunk(0.5, 1024, time.perf_counter(), '12:34')
+            stats.write_trace()
+        with open(path) as f:
+            events = json.load(f)['traceEvents']
+        self.assertEqual([e['name'] for e in events], ['open', 'chunk'])
+        self.assertEqual((events[1]['pid'], events[1]['tid'], events[1]['dur']), (12, 34, 500000.0))
+
+
+class TestProcessorStats(unittest.TestCase):
+    def setUp(self):
+        fd, self.log_path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'w') as f:
+            f.write("".join(f"line {i} {'ERROR' if i % 100 == 0 else 'INFO'}\n" for i in range(200000)))
+        self.addCleanup(os.remove, self.log_path)
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def open_processor(self, collector):
+        processor = LogProcessor(index_cache=IndexCache(self.cache_dir, min_file_size=0),
+                                 search_backend='thread', max_workers=2,
+                                 result_cache=ResultCache(), stats=collector)
+        self.assertTrue(processor.open_file(self.log_path))
+        self.addCleanup(processor.close)
+        return processor
+
+    def test_search_records_phases_and_chunks(self):
+        collector = Stats(enabled=True)
+        processor = self.open_processor(collector)
+        self.assertEqual(len(processor.search("ERROR", True)), 2000)
+        self.assertEqual(len(processor.search("ERROR", True)), 2000)
+        snapshot = collector.snapshot()
+        self.assertEqual(snapshot['phases']['open']['lines'], 200000)
+        self.assertEqual(snapshot['phases']['index']['bytes'], processor.file_size)
+        self.assertEqual(snapshot['phases']['search']['count'], 2)
+        self.assertEqual(snapshot['phases']['search']['last_lines'], 200000)
+        self.assertEqual(snapshot['counters']['result_cache.miss'], 1)
+        self.assertEqual(snapshot['counters']['result_cache.hit'], 1)
+        # The cached repeat scans nothing, so the chunks are the first search's
+        self.assertEqual(collector.chunk_seconds, [])
+        processor.result_cache.invalidate(processor.file_identity)
+        processor.search("ERROR", True)
+        chunks = collector.snapshot()['chunks']
+        self.assertEqual(chunks['bytes'], processor.file_size)
+        self.assertGreaterEqual(chunks['skew'], 1.0)
+
+        self.open_processor(collector)
+        self.assertEqual(collector.snapshot()['hit_rates']['index_cache'], 0.5)
+
+    def test_disabled_search_is_unchanged(self):
+        processor = self.open_processor(Stats(enabled=False))
+        self.assertEqual(len(processor.search("ERROR", True)), 2000)
+        self.assertEqual(processor.stats.snapshot()['phases'], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
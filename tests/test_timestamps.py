@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from src.core import timestamps
+from src.core.log_processor import LogProcessor
+from src.core.timestamps import LineRange, detect_format, parse_time, strptime_format
+
+
+class TestTimestampFormats(unittest.TestCase):
+    def test_detects_common_formats(self):
+        samples = {
+            'iso8601': b"2023-01-01T12:00:00.123Z worker started",
+            'syslog': b"Jan  2 03:04:05 host sshd[42]: accepted",
+            'apache': b'127.0.0.1 - - [10/Oct/2000:13:55:36 -0700] "GET / HTTP/1.0" 200',
+            'epoch': b"1672574400.5 level=info msg=started",
+        }
+        for name, line in samples.items():
+            with self.subTest(name=name):
+                self.assertEqual(detect_format([line, b"no timestamp here"]).name, name)
+
+    def test_formats_agree_on_instant(self):
+        iso = detect_format([b"2000-10-10T20:55:36Z"]).extract(b"2000-10-10T20:55:36Z")
+        apache = detect_format([b"[10/Oct/2000:13:55:36 -0700]"]).extract(b"[10/Oct/2000:13:55:36 -0700]")
+        self.assertEqual(iso, apache)
+        self.assertEqual(parse_time("971211336", None), iso)
+
+    def test_strptime_format(self):
+        fmt = strptime_format("%d.%m.%Y %H:%M:%S")
+        self.assertEqual(fmt.extract(b"[01.02.2023 10:00:00] boot"),
+                         parse_time("2023-02-01 10:00:00", None))
+
+    def test_time_of_day_uses_first_day(self):
+        day = parse_time("2023-03-04 23:00:00", None)
+        self.assertEqual(parse_time("14:02", None, day), parse_time("2023-03-04 14:02:00", None))
+
+
+class TestFilterByTime(unittest.TestCase):
+    def setUp(self):
+        start = datetime(2023, 1, 1, 12, 0, 0)
+        lines = []
+        for i in range(300):
+            stamp = start + timedelta(seconds=i)
+            if i == 151:
+                stamp -= timedelta(seconds=3)  # mildly out of order
+            lines.append(f"{stamp:%Y-%m-%d %H:%M:%S} INFO event {i}")
+            if i % 10 == 0:
+                lines.append("    at continuation line")
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        self.processor = LogProcessor()
+        self.processor.open_file(self.path)
+        self.lines = lines
+
+    def tearDown(self):
+        self.processor.close()
+        os.unlink(self.path)
+
+    def expected(self, first_event, last_event):
+        first = self.lines.index(f"{datetime(2023, 1, 1, 12, 0, 0) + timedelta(seconds=first_event):%Y-%m-%d %H:%M:%S} INFO event {first_event}")
+        last = next(i for i, line in enumerate(self.lines) if line.endswith(f"event {last_event}"))
+        while last + 1 < len(self.lines) and self.lines[last + 1].startswith(" "):
+            last += 1
+        return first, last + 1
+
+    def test_range_matches_linear_scan(self):
+        for interval in (7, 1024):
+            with self.subTest(interval=interval), patch.object(timestamps, 'SAMPLE_INTERVAL', interval):
+                self.processor.timestamp_index = None
+                result = self.processor.filter_by_time("2023-01-01 12:01:00", "12:02:00")
+                self.assertIsInstance(result, LineRange)
+                self.assertEqual((result.start, result.end), self.expected(60, 120))
+
+    def test_out_of_range_and_bounds(self):
+        self.assertEqual(len(self.processor.filter_by_time("11:00", "11:30")), 0)
+        everything = self.processor.filter_by_time("00:00", "23:59:59")
+        self.assertEqual((everything.start, everything.end), (0, len(self.lines)))
+
+    def test_lazy_range_paging_and_search(self):
+        result = self.processor.filter_by_time("12:01:00", "12:02:00")
+        self.assertEqual(result[0], (result.start, self.lines[result.start]))
+        self.assertEqual(result.lines(1, 2), self.lines[result.start + 1:result.start + 3])
+        self.assertEqual(len(result[5:10]), 5)
+        matches = result.search(r"event \d+0$")
+        self.assertEqual([text[-8:] for _, text in matches][:2], ["event 60", "event 70"])
+        self.assertTrue(all(result.start <= line < result.end for line, _ in matches))
+
+    def test_file_without_timestamps(self):
+        with open(self.path, 'w') as f:
+            f.write("plain\nlines\n")
+        self.processor.open_file(self.path)
+        self.assertEqual(len(self.processor.filter_by_time("12:00", "13:00")), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
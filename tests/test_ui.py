@@ -1,10 +1,18 @@
+import os
+import shutil
+import tempfile
 import unittest
+from array import array
 from unittest.mock import MagicMock, patch
 import sys
+import threading
+import time
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtTest import QTest
 from PyQt5.QtCore import Qt
 
+from src.core import log_processor
+from src.core.stats import default_enabled
 from src.ui.main_window import MainWindow
 
 # Create QApplication instance for UI tests
@@ -68,5 +76,325 @@ class TestMainWindow(unittest.TestCase):
         self.window.show_previous_page()
         self.assertEqual(self.window.current_display_start, 10)
 
+class TestSessionWindow(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        for name in ("app.log.1", "app.log"):
+            with open(os.path.join(self.temp_dir, name), "w") as f:
+                f.write("".join(f"{name} line {i}\n" for i in range(50)))
+        self.window = MainWindow()
+        self.addCleanup(self.window.close)
+        
+    def open_session(self, patterns):
+        self.window._process_session_open(patterns)
+        self.wait_for_open()
+        
+    def wait_for_open(self):
+        deadline = time.monotonic() + 5
+        while self.window.session_open_thread is not None and time.monotonic() < deadline:
+            app.sendPostedEvents()
+            time.sleep(0.001)
+        self.assertIsNone(self.window.session_open_thread)
+        
+    def test_open_directory_as_session(self):
+        self.open_session([self.temp_dir])
+        self.assertIsNotNone(self.window.session)
+        self.assertEqual(self.window.file_list.count(), 2)
+        self.assertEqual(self.window.file_list.item(0).text(), "app.log.1")
+        self.assertIs(self.window.results_list.model(), self.window.session_model)
+        self.assertEqual(self.window.log_processor.get_line(3), "app.log.1 line 3")
+        
+        # Results stream in per file; the file column and counts follow
+        self.window.handle_session_results(1, array('I', [7, 9]))
+        self.window.finish_session_search(2)
+        self.assertEqual(self.window.file_list.item(0).text(), "app.log.1 (0 matches)")
+        self.assertEqual(self.window.file_list.item(1).text(), "app.log (2 matches)")
+        model = self.window.session_model
+        self.assertEqual(model.data(model.index(0, 0)), "app.log")
+        self.assertEqual(model.data(model.index(0, 1)), "8")
+        self.assertEqual(model.data(model.index(0, 2)), "app.log line 7")
+        
+        self.window.show_selected_result(model.index(1, 2))
+        self.assertEqual(self.window.session_file, 1)
+        self.assertEqual(self.window.log_display.highlighted_line, 9)
+        
+        self.window.close_session()
+        self.assertIsNone(self.window.session)
+        self.assertIs(self.window.results_list.model(), self.window.results_model)
+        
+    def test_session_search_error_is_reported(self):
+        self.open_session([self.temp_dir])
+        iter_search = log_processor.LogProcessor.iter_search
+        
+        def failing_search(processor, *args, **kwargs):
+            if processor.file_path.endswith('app.log'):
+                raise OSError(5, "Input/output error")
+            return iter_search(processor, *args, **kwargs)
+        
+        with patch.object(log_processor.LogProcessor, 'iter_search', failing_search):
+            self.window.start_session_search("line 1", True)
+            deadline = time.monotonic() + 5
+            while self.window.search_thread is not None and time.monotonic() < deadline:
+                app.sendPostedEvents()
+                time.sleep(0.001)
+        self.assertIsNone(self.window.search_thread)
+        path = os.path.join(self.temp_dir, 'app.log')
+        self.assertEqual(self.window.status_bar.currentMessage(),
+                         f"Search failed: [Errno 5] Input/output error: '{path}' (11 matches found before it)")
+        self.assertFalse(self.window.progress_bar.isVisible())
+        
+    def test_session_opens_in_background(self):
+        opening = threading.Event()
+        release = threading.Event()
+        real_open = log_processor.LogProcessor.open_file
+        
+        def slow_open(processor, *args, **kwargs):
+            opening.set()
+            release.wait(5)
+            return real_open(processor, *args, **kwargs)
+        
+        with patch.object(log_processor.LogProcessor, 'open_file', slow_open):
+            self.window._process_session_open([self.temp_dir])
+            # The window is still responsive while the files are indexed
+            self.assertTrue(opening.wait(5))
+            self.assertIsNone(self.window.session)
+            self.assertIsNotNone(self.window.session_open_thread)
+            release.set()
+            self.wait_for_open()
+        self.assertEqual(self.window.file_list.count(), 2)
+        self.assertEqual(self.window.file_list.item(1).text(), "app.log")
+        self.assertEqual(self.window.log_processor.get_line(3), "app.log.1 line 3")
+
+class TestStatsPanel(unittest.TestCase):
+    def setUp(self):
+        fd, self.log_path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'w') as f:
+            f.write("".join(f"line {i}\n" for i in range(500)))
+        self.addCleanup(os.remove, self.log_path)
+        self.window = MainWindow()
+        self.addCleanup(self.window.close)
+        
+    def test_panel_collects_stats(self):
+        self.assertFalse(self.window.stats_dock.isVisible())
+        self.window.show()
+        self.window.stats_dock.setVisible(True)
+        self.assertTrue(self.window.stats.enabled)
+        self.window._process_file_open(self.log_path)
+        self.assertIn("[index", self.window.status_bar.currentMessage())
+        self.window.handle_search_results(array('I', [1, 2, 3]))
+        self.window.refresh_stats()
+        text = self.window.stats_view.toPlainText()
+        self.assertIn("open", text)
+        self.assertIn("ui.results", text)
+        
+        self.window.copy_stats()
+        self.assertIn('"lines": 500', QApplication.clipboard().text())
+        self.window.stats_dock.setVisible(False)
+        self.assertEqual(self.window.stats.enabled, default_enabled())
+
+class TestBackgroundOpen(unittest.TestCase):
+    def setUp(self):
+        fd, self.log_path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'w') as f:
+            f.write("".join(f"line {i}\n" for i in range(2000)))
+        self.addCleanup(os.remove, self.log_path)
+        # Indexing stops after its first step until the gate opens
+        self.gate = threading.Event()
+        self.addCleanup(self.gate.set)
+        step = log_processor._index_step
+        
+        def gated_step(*args):
+            if threading.current_thread() is not threading.main_thread():
+                self.gate.wait(5)
+            step(*args)
+        
+        for target, value in (('FIRST_INDEX_STEP', 1024), ('BLOCK_SIZE', 4096),
+                              ('_index_step', gated_step)):
+            patcher = patch.object(log_processor, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.window = MainWindow()
+        self.window.log_processor.index_cache.max_bytes = 0
+        self.addCleanup(self.window.close)
+        
+    def wait_until(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition() and time.monotonic() < deadline:
+            # Queued signals only; timers left by other tests stay pending
+            app.sendPostedEvents()
+            time.sleep(0.001)
+        self.assertTrue(condition())
+        
+    def test_first_page_shows_before_indexing_finishes(self):
+        self.window._process_file_open(self.log_path)
+        processor = self.window.log_processor
+        self.assertTrue(processor.indexing)
+        prefix = processor.total_lines
+        self.assertTrue(0 < prefix < 2000)
+        self.assertEqual(self.window.log_display.row_count, prefix)
+        self.assertIn(f"/{prefix}", self.window.page_info_label.text())
+        self.assertIn("lines so far", self.window.status_bar.currentMessage())
+        
+        # A search covers the indexed lines, then follows the index
+        self.window.search_input.setText("line 1")
+        self.window.search_logs()
+        self.wait_until(lambda: self.window.search_thread is None)
+        self.assertEqual(len(self.window.results_model),
+                         sum(1 for i in range(prefix) if str(i).startswith("1")))
+        
+        self.gate.set()
+        self.wait_until(lambda: not self.window.index_pending and self.window.search_thread is None)
+        self.assertEqual(self.window.log_display.row_count, 2000)
+        self.assertIn("/2000", self.window.page_info_label.text())
+        self.assertEqual(list(self.window.results_model.line_numbers),
+                         [i for i in range(2000) if str(i).startswith("1")])
+
+    @patch('src.ui.main_window.QMessageBox.critical')
+    def test_index_error_is_reported(self, critical):
+        def failing_step(*args):
+            if threading.current_thread() is not threading.main_thread():
+                raise OSError("Input/output error")
+            step(*args)
+        
+        step = log_processor._index_step
+        with patch.object(log_processor, '_index_step', failing_step):
+            self.window._process_file_open(self.log_path)
+            self.wait_until(lambda: not self.window.index_pending)
+        message = f"Failed to open file: {self.log_path} (Input/output error)"
+        self.assertEqual(self.window.status_bar.currentMessage(), message)
+        critical.assert_called_once_with(self.window, "Error", message)
+        self.assertIsNone(self.window.current_file)
+        self.assertEqual(self.window.log_display.row_count, 0)
+        self.assertEqual(self.window.page_info_label.text(), "Lines: 0/0")
+
+class TestFieldsPanel(unittest.TestCase):
+    def setUp(self):
+        fd, self.log_path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'w') as f:
+            f.write("".join(f"2023-01-01 10:00:00 {'ERROR' if i % 5 == 0 else 'INFO'} "
+                            f"[{'main' if i % 2 else 'pool'}] event {i}\n" for i in range(100)))
+        self.addCleanup(os.remove, self.log_path)
+        self.window = MainWindow()
+        self.window.log_processor.index_cache.max_bytes = 0
+        self.addCleanup(self.window.close)
+        self.window._process_file_open(self.log_path)
+
+    def facet(self, name, value):
+        for i in range(self.window.facet_tree.topLevelItemCount()):
+            field_item = self.window.facet_tree.topLevelItem(i)
+            for j in range(field_item.childCount()):
+                item = field_item.child(j)
+                if item.data(0, Qt.UserRole) == (name, value):
+                    return item
+        return None
+
+    def test_filter_by_field_values(self):
+        self.window.extract_fields()
+        deadline = time.monotonic() + 5
+        while self.window.field_thread is not None and time.monotonic() < deadline:
+            app.sendPostedEvents()
+            time.sleep(0.001)
+        self.assertIsNone(self.window.field_thread)
+        self.assertEqual(self.facet('level', 'ERROR').text(1), "20")
+        self.assertEqual(self.facet('thread', 'main').text(1), "50")
+
+        self.facet('level', 'ERROR').setCheckState(0, Qt.Checked)
+        self.assertEqual(list(self.window.results_model.line_numbers), list(range(0, 100, 5)))
+        self.window.populate_facets()
+        self.assertEqual(self.facet('level', 'ERROR').checkState(0), Qt.Checked)
+        self.assertEqual(self.facet('thread', 'main').text(1), "10")
+
+        self.facet('thread', 'main').setCheckState(0, Qt.Checked)
+        self.assertEqual(list(self.window.results_model.line_numbers), list(range(5, 100, 10)))
+        self.window.clear_field_filter()
+        self.assertEqual(len(self.window.results_model), 0)
+        self.assertEqual(self.window.field_filters, {})
+
+
+class TestQuerySearch(unittest.TestCase):
+    def setUp(self):
+        fd, self.log_path = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(fd, 'w') as f:
+            f.write("".join(f"{'ERROR' if i % 3 == 0 else 'INFO'} request {i} "
+                            f"{'timeout' if i % 2 else 'ok'}\n" for i in range(60)))
+        self.addCleanup(os.remove, self.log_path)
+        self.window = MainWindow()
+        self.window.log_processor.index_cache.max_bytes = 0
+        self.addCleanup(self.window.close)
+        self.window._process_file_open(self.log_path)
+        self.window.query_checkbox.setChecked(True)
+
+    def test_query_search(self):
+        self.window.search_input.setText("ERROR AND (timeout")
+        self.window.search_logs()
+        self.assertIsNone(self.window.search_thread)
+        self.assertIn("Invalid query", self.window.status_bar.currentMessage())
+
+        self.window.search_input.setText("ERROR AND NOT timeout")
+        self.window.search_logs()
+        deadline = time.monotonic() + 5
+        while self.window.search_thread is not None and time.monotonic() < deadline:
+            app.sendPostedEvents()
+            time.sleep(0.001)
+        self.assertEqual(list(self.window.results_model.line_numbers), list(range(0, 60, 6)))
+        self.assertEqual(self.window.last_search, ("ERROR AND NOT timeout", False, True))
+        self.assertEqual(self.window.log_display.highlighter("ERROR x"), [(0, 5, 0)])
+
+        self.window.query_checkbox.setChecked(False)
+        self.window.search_input.setText("request 1")
+        self.window.search_logs()
+        self.assertIsNone(self.window.log_display.highlighter)
+
+    def test_search_error_is_reported(self):
+        def failing_search(*args, **kwargs):
+            yield from ()
+            raise OSError(5, "Input/output error")
+        
+        with patch.object(self.window.log_processor, 'iter_search', failing_search):
+            self.window.search_input.setText("ERROR")
+            self.window.search_logs()
+            deadline = time.monotonic() + 5
+            while self.window.search_thread is not None and time.monotonic() < deadline:
+                app.sendPostedEvents()
+                time.sleep(0.001)
+        self.assertIsNone(self.window.search_thread)
+        self.assertEqual(self.window.status_bar.currentMessage(), "Search failed: [Errno 5] Input/output error")
+        self.assertTrue(self.window.progress_bar.isHidden())
+        self.assertIsNone(self.window.last_search)
+
+
+
+class TestExportResults(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.log_path = os.path.join(self.temp_dir, 'app.log')
+        self.lines = [f"{'ERROR' if i % 10 == 0 else 'INFO'} event {i}" for i in range(100)]
+        with open(self.log_path, 'w') as f:
+            f.write("\n".join(self.lines) + "\n")
+        self.window = MainWindow()
+        self.window.log_processor.index_cache.max_bytes = 0
+        self.addCleanup(self.window.close)
+        self.window._process_file_open(self.log_path)
+        self.window.results_model.append(array('I', [10, 11, 50]))
+
+    @patch('src.ui.main_window.QInputDialog.getInt', return_value=(1, True))
+    @patch('src.ui.main_window.QFileDialog.getSaveFileName')
+    def test_export_with_context(self, save_dialog, _):
+        path = os.path.join(self.temp_dir, 'matches.log')
+        save_dialog.return_value = (path, "")
+        self.window.export_results()
+        deadline = time.monotonic() + 5
+        while self.window.export_thread is not None and time.monotonic() < deadline:
+            app.sendPostedEvents()
+            time.sleep(0.001)
+        self.assertIsNone(self.window.export_thread)
+        self.assertIn("Exported 3 matches (7 lines)", self.window.status_bar.currentMessage())
+        with open(path) as f:
+            self.assertEqual(f.read().splitlines(),
+                             self.lines[9:13] + ["--"] + self.lines[49:52])
+
+
 if __name__ == "__main__":
     unittest.main()